@@ -203,7 +203,8 @@ class Article:
 
     def save_pt(self, save_path):
         """
-        Save article as pt files so that it can be loaded later
+        Save article as pt files so that it can be loaded later.
+        Text is stored once with offset arrays, see `chempp.serialize`, articles with `grouped_anno` are pickled
 
         Parameters
         ----------
@@ -213,13 +214,17 @@ class Article:
         -------
         self
         """
-        with open(save_path, 'wb') as handle:
-            pickle.dump(self, handle, protocol=pickle.HIGHEST_PROTOCOL)
+        from .serialize import fits_compact, save_article
+        if fits_compact(self):
+            save_article(self, save_path)
+        else:
+            with open(save_path, 'wb') as handle:
+                pickle.dump(self, handle)
         return self
 
     def load_pt(self, load_path):
         """
-        Load article element from pt files
+        Load article element from pt files, pickled files of older versions are also accepted
 
         Parameters
         ----------
@@ -229,13 +234,18 @@ class Article:
         -------
         self
         """
-        with open(load_path, 'rb') as handle:
-            article = pickle.load(handle)
+        from .serialize import is_article_file, load_article
+        if is_article_file(load_path):
+            article = load_article(load_path)
+        else:
+            with open(load_path, 'rb') as handle:
+                article = pickle.load(handle)
         self.doi = article.doi
         self.title = article.title
         self.publisher = article.publisher
         self.abstract = article.abstract
         self.sections = article.sections
+        return self
 
     def save_html(self,
                   save_path,
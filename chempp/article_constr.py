@@ -1,6 +1,7 @@
+import html
 import os
 import re
-from typing import Tuple
+from typing import Optional, Tuple
 
 from bs4 import BeautifulSoup
 try:
@@ -615,6 +616,31 @@ class ArticleFunctions:
         return article, article_component_check
 
 
+def _publisher_from_meta(name: str, content: str) -> Tuple[Optional[str], bool]:
+    """publisher given by a meta tag, and whether the search should stop there"""
+    name_lower = name.lower()
+    if name_lower == 'dc.publisher' and content == 'Springer':
+        return 'springer', True
+    elif name_lower == 'dc.publisher' and content == 'Nature Publishing Group':
+        return 'nature', True
+    elif name_lower == 'citation_publisher' and 'John Wiley & Sons, Ltd' in content:
+        return 'wiley', True
+    elif name_lower == 'dc.publisher' and \
+            (content == 'American Institute of PhysicsAIP' or ('AIP Publishing' in content)):
+        return 'aip', True
+    elif name_lower == 'dc.publisher' and content.strip() == 'American Chemical Society':
+        return 'acs', True
+    elif name_lower == 'dc.publisher' and content.strip() == 'The Royal Society of Chemistry':
+        return 'rsc', True
+    elif name_lower == 'dc.publisher' and content.strip() == 'American Association for the Advancement of Science':
+        return 'aaas', True
+    elif name_lower == 'dc.publisher' and content.strip() == 'World Scientific Publishing Company':
+        return 'cjps', False
+    elif name == 'citation_springer_api_url':
+        return 'springer', True
+    return None, False
+
+
 def check_html_publisher(soup: bs4.BeautifulSoup):
     publisher = None
     try:
@@ -629,42 +655,13 @@ def check_html_publisher(soup: bs4.BeautifulSoup):
         pub_web = title[0].text.strip().split(' - ')[-1]
     for meta in metas:
         try:
-            if meta['name'].lower() == 'dc.publisher' and \
-                    meta['content'] == 'Springer':
-                publisher = 'springer'
-                break
-            elif meta['name'].lower() == 'dc.publisher' and \
-                    meta['content'] == 'Nature Publishing Group':
-                publisher = 'nature'
-                break
-            elif meta['name'].lower() == 'citation_publisher' and \
-                    'John Wiley & Sons, Ltd' in meta['content']:
-                publisher = 'wiley'
-                break
-            elif meta['name'].lower() == 'dc.publisher' and \
-                    (meta['content'] == 'American Institute of PhysicsAIP' or ('AIP Publishing' in meta['content'])):
-                publisher = 'aip'
-                break
-            elif meta['name'].lower() == 'dc.publisher' and \
-                    meta['content'].strip() == 'American Chemical Society':
-                publisher = 'acs'
-                break
-            elif meta['name'].lower() == 'dc.publisher' and \
-                    meta['content'].strip() == 'The Royal Society of Chemistry':
-                publisher = 'rsc'
-                break
-            elif meta['name'].lower() == 'dc.publisher' and \
-                    meta['content'].strip() == 'American Association for the Advancement of Science':
-                publisher = 'aaas'
-                break
-            elif meta['name'].lower() == 'dc.publisher' and \
-                    meta['content'].strip() == 'World Scientific Publishing Company':
-                publisher = 'cjps'
-            elif meta['name'] == 'citation_springer_api_url':
-                publisher = 'springer'
-                break
+            meta_publisher, stop = _publisher_from_meta(meta['name'], meta['content'])
         except KeyError:
-            pass
+            continue
+        if meta_publisher:
+            publisher = meta_publisher
+        if stop:
+            break
     if not publisher and pub_web.lower() == 'sciencedirect':
         publisher = 'elsevier'
     if not publisher:
@@ -673,6 +670,63 @@ def check_html_publisher(soup: bs4.BeautifulSoup):
     return publisher
 
 
+HEAD_SCAN_CHARS = 1 << 20 # only scanned when a page has no </head>
+head_end_pattern = re.compile(r'</head\s*>', re.I)
+tag_name_pattern = re.compile(r'<\w+')
+html_tag_pattern = re.compile(r'<html\b[^>]*>', re.I)
+meta_tag_pattern = re.compile(r'<meta\b[^>]*>', re.I)
+title_tag_pattern = re.compile(r'<title\b[^>]*>(.*?)</title\s*>', re.I | re.S)
+attr_pattern = re.compile(r"""([^\s"'<>/=]+)\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'=<>`]+))""")
+
+
+def _tag_attrs(tag: str) -> dict:
+    """attributes of a start tag, names lowered and values unescaped as BeautifulSoup does, first one wins"""
+    attrs = {}
+    for match in attr_pattern.finditer(tag, tag_name_pattern.match(tag).end()):
+        name, *values = match.groups()
+        attrs.setdefault(name.lower(), html.unescape(next(v for v in values if v is not None)))
+    return attrs
+
+
+def scan_html_doi_publisher(contents: str) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Find publisher and doi with regular expressions over the <head> of raw html, no tree is built.
+    Publisher follows the rules of `check_html_publisher`, doi comes from the `citation_doi` meta tag if any.
+    Publisher is None when the head alone cannot decide it.
+    """
+    head_end = head_end_pattern.search(contents)
+    head = contents[:head_end.start()] if head_end else contents[:HEAD_SCAN_CHARS]
+
+    publisher = None
+    html_tag = html_tag_pattern.search(head)
+    if html_tag and _tag_attrs(html_tag.group()).get('xmlns:rsc') == 'urn:rsc.org':
+        publisher = 'rsc'
+    doi = None
+    decided = False
+    for meta in meta_tag_pattern.finditer(head):
+        attrs = _tag_attrs(meta.group())
+        if 'name' not in attrs or 'content' not in attrs:
+            continue
+        if doi is None and attrs['name'].lower() == 'citation_doi':
+            doi = attrs['content'].strip().lower()
+        if not decided:
+            meta_publisher, stop = _publisher_from_meta(attrs['name'], attrs['content'])
+            publisher = meta_publisher or publisher
+            decided = stop
+
+    if not decided:
+        # check_html_publisher also reads meta tags of the body, leave those pages to it
+        if head_end is None or meta_tag_pattern.search(contents, head_end.end()):
+            return doi, None
+        if not publisher:
+            title = title_tag_pattern.search(head)
+            if title and html.unescape(title.group(1)).strip().split(' - ')[-1].lower() == 'sciencedirect':
+                publisher = 'elsevier'
+    if doi and doi.startswith('https://doi.org/'):
+        doi = doi[len('https://doi.org/'):]
+    return doi, publisher
+
+
 def check_xml_publisher(root: ET.Element):
     publisher = None
 
@@ -757,7 +811,8 @@ def search_xml_doi_publisher(root, publisher=None):
 
 
 def parse_html(file_path: Optional[str] = None,
-               html_content: Optional[str] = None) -> Tuple[Article, ArticleComponentCheck]:
+               html_content: Optional[str] = None,
+               lenient_builder: str = 'html5lib') -> Tuple[Article, ArticleComponentCheck]:
     """
     Parse html files
 
@@ -765,6 +820,8 @@ def parse_html(file_path: Optional[str] = None,
     ----------
     file_path: File name
     html_content: html content. Cannot pass values to both file_path and html_content
+    lenient_builder: tree builder for elsevier and rsc pages, which need illegal nested <p> and <span> handled,
+        'html5lib' or the much faster 'lxml' if installed
 
     Returns
     -------
@@ -779,16 +836,27 @@ def parse_html(file_path: Optional[str] = None,
     else:
         contents = html_content
 
-    soup = BeautifulSoup(contents, 'html.parser')
-
-    # get publisher and doi
-    doi, publisher = search_html_doi_publisher(soup)
+    # the head is usually enough to know the publisher, so the tree is built only once
+    head_doi, publisher = scan_html_doi_publisher(contents)
+    soup = None
+    if publisher is None:
+        soup = BeautifulSoup(contents, 'html.parser')
+        publisher = check_html_publisher(soup)
 
     if publisher in ['elsevier', 'rsc']:
         # allow illegal nested <p>
-        # soup = BeautifulSoup(contents, 'html.parser')
         # allow nested <span>
-        soup = BeautifulSoup(contents, 'html5lib')
+        soup = BeautifulSoup(contents, lenient_builder)
+    elif soup is None:
+        soup = BeautifulSoup(contents, 'html.parser')
+
+    # get doi
+    try:
+        doi, publisher = search_html_doi_publisher(soup, publisher)
+    except (IndexError, AttributeError):
+        if not head_doi:
+            raise
+        doi = head_doi
 
     article_construct_func = getattr(ArticleFunctions, f'article_construct_html_{publisher}')
     article, component_check = article_construct_func(soup=soup, doi=doi)
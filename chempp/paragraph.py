@@ -1,6 +1,8 @@
 import copy
+import bisect
 import logging
 import functools
+from array import array
 from typing import Optional, List, Union, Dict, Callable, Tuple
 from collections import OrderedDict
 
@@ -12,7 +14,27 @@ logger = logging.getLogger(__name__)
 DEFAULT_ANNO_SOURCE = '<DEFAULT>'
 
 
-class Sentence:
+class _Slotted:
+    """pickling of classes with `__slots__`, state of older pickles saved with `__dict__` is accepted too"""
+    __slots__ = ()
+
+    def __getstate__(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__ if hasattr(self, slot)}
+
+    def __setstate__(self, state):
+        if isinstance(state, tuple): # (dict state, slot state)
+            state = {**(state[0] or {}), **(state[1] or {})}
+        self._init_lazy()
+        for key, value in state.items():
+            if key in self.__slots__:
+                setattr(self, key, value)
+
+    def _init_lazy(self):
+        pass
+
+
+class Sentence(_Slotted):
+    __slots__ = ('_text', '_tokens', '_anno', 'start_idx', 'end_idx', 'grouped_anno', '_word_tokenizer')
 
     def __init__(
             self,
@@ -42,7 +64,12 @@ class Sentence:
             self._anno = {DEFAULT_ANNO_SOURCE: self._anno}
         if self.grouped_anno is None:
             self.grouped_anno = list()
-        self._tokens = self.word_tokenizer() if not self._word_tokenizer else self._word_tokenizer(self._text)
+        # tokenized on first access
+        self._tokens = None
+
+    def _init_lazy(self):
+        self._tokens = None
+        self._word_tokenizer = None
 
     def word_tokenizer(self, text=None) -> List[str]:
         if text is None:
@@ -64,6 +91,8 @@ class Sentence:
 
     @property
     def tokens(self):
+        if self._tokens is None:
+            self._tokens = self.word_tokenizer() if not self._word_tokenizer else self._word_tokenizer(self._text)
         return self._tokens
 
     @tokens.setter
@@ -147,7 +176,9 @@ class Sentence:
         return self
 
 
-class Paragraph:
+class Paragraph(_Slotted):
+    __slots__ = ('_text', '_tokens', '_anno', 'sentences', 'grouped_anno', '_sent_starts', '_sent_tokenizer')
+
     def __init__(self,
                  text: Optional[str] = None,
                  sentences: Optional[List["Sentence"]] = None,
@@ -166,11 +197,12 @@ class Paragraph:
 
         self.sentences = sentences
         self.grouped_anno = grouped_anno if grouped_anno is not None else list()
-        self.char_idx_to_sent_idx = dict()
+        self._sent_starts = None
         self._sent_tokenizer = sent_tokenizer
         self._post_init()
 
     def _post_init(self):
+        self._sent_starts = None
         if self.sentences is None:
             sents = self.sentence_tokenizer() if self._sent_tokenizer is None else self._sent_tokenizer(self._text)
             self.sentences = list()
@@ -196,21 +228,25 @@ class Paragraph:
 
             self.update_paragraph_anno()
 
-        self._tokens = [s.tokens for s in self.sentences]
+        # tokens and the sentence lookup are built on first access
+        self._tokens = None
 
-        if not self.char_idx_to_sent_idx:
-            self._set_char_idx_to_sent_idx()
+    def _init_lazy(self):
+        self._tokens = None
+        self._sent_starts = None
+        self._sent_tokenizer = None
 
-    def _set_char_idx_to_sent_idx(self):
-        sent_idx = 0
-        for char_idx in range(len(self.text)):
-            if self.sentences[sent_idx].start_idx <= char_idx < self.sentences[sent_idx].end_idx:
-                self.char_idx_to_sent_idx[char_idx] = sent_idx
-            elif char_idx == self.sentences[sent_idx].end_idx:
-                sent_idx += 1
+    def char_idx_to_sent_idx(self, char_idx: int) -> int:
+        """index of the sentence covering `char_idx`, KeyError for characters between sentences"""
+        if self._sent_starts is None:
+            self._sent_starts = array('q', (sent.start_idx for sent in self.sentences))
+        sent_idx = bisect.bisect_right(self._sent_starts, char_idx) - 1
+        if sent_idx < 0 or not char_idx < self.sentences[sent_idx].end_idx:
+            raise KeyError(char_idx)
+        return sent_idx
 
     def get_sentence_by_char_idx(self, char_idx: int):
-        sent_idx = self.char_idx_to_sent_idx[char_idx]
+        sent_idx = self.char_idx_to_sent_idx(char_idx)
         return self.sentences[sent_idx]
 
     # noinspection PyTypeChecker
@@ -234,6 +270,8 @@ class Paragraph:
 
     @property
     def tokens(self):
+        if self._tokens is None:
+            self._tokens = [s.tokens for s in self.sentences]
         return self._tokens
 
     @tokens.setter
@@ -306,16 +344,13 @@ class Paragraph:
         return self
 
     def update_sentence_anno(self):
-        if not self.char_idx_to_sent_idx:
-            self._set_char_idx_to_sent_idx()
-
         for src, anno in self.anno.items():
             for (s, e), v in anno.items():
-                sent_idx = self.char_idx_to_sent_idx[s]
+                sent_idx = self.char_idx_to_sent_idx(s)
                 sent_s = s - self[sent_idx].start_idx
                 sent_e = e - self[sent_idx].start_idx
 
-                if src not in self[sent_idx]:
+                if src not in self[sent_idx].anno:
                     self[sent_idx].anno[src] = dict()
 
                 if sent_e > self[sent_idx].end_idx:
@@ -0,0 +1,262 @@
+"""
+Compact article file used by `Article.save_pt` and `Article.load_pt`
+
+layout: MAGIC | uint32 index length | json index | blob
+- every string is utf-8 in the blob once, the index refers to it by [byte offset, byte length]
+- sentence boundaries and annotation spans are little-endian uint32 arrays in the blob, referred to by [byte offset, count]
+- annotation labels are ids into a label table of the index
+- tables are a json document in the blob, decoded only when the table is read
+Paragraph and sentence annotations of every source are stored as they are. `grouped_anno` is not stored,
+articles having any are pickled instead, see `fits_compact`. Files of version 1 did not store sentence annotations,
+they are aligned from the paragraph annotations on load.
+"""
+
+import json
+import mmap
+import struct
+import sys
+from array import array
+from typing import Optional, List
+
+from .article import Article, ArticleElement, ArticleElementType
+from .paragraph import Paragraph, Sentence, DEFAULT_ANNO_SOURCE
+from .table import Table, TableRow, TableCell
+
+MAGIC = b'CHEMPPA1'
+HEADER = struct.Struct('<8sI')
+VERSION = 2
+
+
+def _to_le(values: array) -> bytes:
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+class _BlobBuilder:
+    def __init__(self):
+        self.chunks = list()
+        self.size = 0
+        self.labels = dict()
+
+    def add_bytes(self, data: bytes) -> List[int]:
+        self.chunks.append(data)
+        self.size += len(data)
+        return [self.size - len(data), len(data)]
+
+    def add_text(self, text: str) -> List[int]:
+        return self.add_bytes(text.encode('utf-8'))
+
+    def add_uint32(self, values) -> List[int]:
+        values = array('I', values)
+        return [self.add_bytes(_to_le(values))[0], len(values)]
+
+    def add_anno(self, anno: dict) -> dict:
+        record = dict()
+        for src, spans in anno.items():
+            label_ids = [self.labels.setdefault(label, len(self.labels)) for label in spans.values()]
+            record[src] = [self.add_uint32(i for span in spans for i in span), label_ids]
+        return record
+
+    def add_sentence(self, sentence: Sentence) -> dict:
+        return {'text': self.add_text(sentence.text), 'anno': self.add_anno(sentence.anno)}
+
+    def add_paragraph(self, paragraph: Paragraph) -> dict:
+        return {
+            'text': self.add_text(paragraph.text),
+            'sents': self.add_uint32(i for sent in paragraph.sentences for i in (sent.start_idx, sent.end_idx)),
+            'anno': self.add_anno(paragraph.anno),
+            'sent_anno': [self.add_anno(sent.anno) for sent in paragraph.sentences],
+        }
+
+    def add_table(self, table: Table) -> dict:
+        rows = [
+            [[cell.text, int(cell.width), int(cell.height), bool(cell.linked_top), bool(cell.linked_left)] for cell in row.cells]
+            for row in table.rows
+        ]
+        doc = {'label': table._label, 'id': table._id, 'caption': table._caption, 'rows': rows, 'footnotes': table._footnotes}
+        return {'table': self.add_text(json.dumps(doc, ensure_ascii=False))}
+
+
+def _sentences(article: Article):
+    if isinstance(article.title, Sentence):
+        yield article.title
+    paragraphs = [article.abstract] + [section.content for section in article.sections]
+    for paragraph in paragraphs:
+        if isinstance(paragraph, Paragraph):
+            yield paragraph
+            yield from paragraph.sentences
+
+
+def fits_compact(article: Article) -> bool:
+    """whether the compact format keeps everything of `article`, `grouped_anno` is not stored"""
+    return not any(getattr(element, 'grouped_anno', None) for element in _sentences(article))
+
+
+def save_article(article: Article, save_path: str):
+    """write `article` in the compact format, check `fits_compact` first"""
+    blob = _BlobBuilder()
+    sections = list()
+    for section in article.sections:
+        record = {'type': section.type.value, 'title_size': section.title_size}
+        if isinstance(section.content, Paragraph):
+            record.update(blob.add_paragraph(section.content))
+        elif isinstance(section.content, Table):
+            record.update(blob.add_table(section.content))
+        else:
+            record['text'] = blob.add_text(str(section.content))
+        sections.append(record)
+    index = {
+        'doi': article.doi,
+        'publisher': article.publisher,
+        'title': blob.add_sentence(article.title) if article.title else None,
+        'abstract': blob.add_paragraph(article.abstract) if isinstance(article.abstract, Paragraph) else None,
+        'sections': sections,
+        'labels': list(blob.labels),
+        'version': VERSION,
+    }
+    index = json.dumps(index, ensure_ascii=False).encode('utf-8')
+    with open(save_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(index)))
+        f.write(index)
+        for chunk in blob.chunks:
+            f.write(chunk)
+
+
+def is_article_file(path: str) -> bool:
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+class ArticleReader:
+    """
+    Memory-mapped reader of a compact article file, sections are decoded only when asked for
+
+    Examples
+    --------
+    >>> with ArticleReader('article.pt') as reader:
+    ...     abstract = reader.abstract
+    ...     tables = reader.tables()
+    """
+
+    def __init__(self, path: str):
+        self._file = open(path, 'rb')
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, index_len = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f'{path} is not a compact article file')
+        self._index = json.loads(self._mm[HEADER.size: HEADER.size + index_len])
+        self._base = HEADER.size + index_len
+        self._labels = self._index['labels']
+        self._exact = self._index.get('version', 1) >= 2 # annotations of every source and sentence are stored
+
+    def close(self):
+        if getattr(self, '_mm', None) is not None:
+            self._mm.close()
+            self._mm = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _text(self, ref: List[int]) -> str:
+        offset, length = ref
+        return self._mm[self._base + offset: self._base + offset + length].decode('utf-8')
+
+    def _uint32(self, ref: List[int]) -> array:
+        offset, count = ref
+        values = array('I')
+        values.frombytes(self._mm[self._base + offset: self._base + offset + 4 * count])
+        if sys.byteorder == 'big':
+            values.byteswap()
+        return values
+
+    def _anno(self, record: dict) -> dict:
+        anno = dict() if self._exact else {DEFAULT_ANNO_SOURCE: dict()}
+        for src, (ref, label_ids) in record.items():
+            spans = self._uint32(ref)
+            anno[src] = {(spans[2 * i], spans[2 * i + 1]): self._labels[label_id] for i, label_id in enumerate(label_ids)}
+        return anno
+
+    def _sentence(self, record: dict) -> Sentence:
+        return Sentence(self._text(record['text']), anno=self._anno(record['anno']))
+
+    def _paragraph(self, record: dict) -> Paragraph:
+        text = self._text(record['text'])
+        bounds = self._uint32(record['sents'])
+        sent_annos = record.get('sent_anno')
+        sentences = list()
+        for i in range(0, len(bounds), 2):
+            sentence = Sentence.__new__(Sentence)
+            sentence.__setstate__({
+                '_text': text[bounds[i]: bounds[i + 1]],
+                '_anno': self._anno(sent_annos[i // 2]) if sent_annos is not None else {DEFAULT_ANNO_SOURCE: dict()},
+                'start_idx': bounds[i], 'end_idx': bounds[i + 1], 'grouped_anno': list(),
+            })
+            sentences.append(sentence)
+        paragraph = Paragraph.__new__(Paragraph)
+        paragraph.__setstate__({'_text': text, 'sentences': sentences, '_anno': self._anno(record['anno']), 'grouped_anno': list()})
+        if sent_annos is None: # version 1
+            paragraph.update_sentence_anno()
+        return paragraph
+
+    def _table(self, record: dict) -> Table:
+        doc = json.loads(self._text(record['table']))
+        rows = [TableRow([TableCell(*cell) for cell in row]) for row in doc['rows']]
+        return Table(label=doc['label'], idx=doc['id'], caption=doc['caption'], rows=rows, footnotes=doc['footnotes'])
+
+    @property
+    def doi(self) -> Optional[str]:
+        return self._index['doi']
+
+    @property
+    def publisher(self) -> Optional[str]:
+        return self._index['publisher']
+
+    @property
+    def title(self) -> Optional[Sentence]:
+        record = self._index['title']
+        return self._sentence(record) if record else None
+
+    @property
+    def abstract(self) -> Optional[Paragraph]:
+        record = self._index['abstract']
+        return self._paragraph(record) if record else None
+
+    def __len__(self):
+        return len(self._index['sections'])
+
+    def section(self, idx: int) -> ArticleElement:
+        record = self._index['sections'][idx]
+        element_type = ArticleElementType(record['type'])
+        if 'table' in record:
+            content = self._table(record)
+        elif 'sents' in record:
+            content = self._paragraph(record)
+        else:
+            content = self._text(record['text'])
+        return ArticleElement(type=element_type, content=content, title_size=record['title_size'])
+
+    def sections(self, types: Optional[List[ArticleElementType]] = None) -> List[ArticleElement]:
+        """sections of the given types, all of them by default"""
+        values = None if types is None else {t.value for t in types}
+        return [self.section(i) for i, record in enumerate(self._index['sections']) if values is None or record['type'] in values]
+
+    def tables(self) -> List[Table]:
+        return [section.content for section in self.sections([ArticleElementType.TABLE])]
+
+    def paragraphs(self) -> List[Paragraph]:
+        return [section.content for section in self.sections([ArticleElementType.PARAGRAPH])]
+
+    def to_article(self) -> Article:
+        return Article(doi=self.doi, publisher=self.publisher, title=self.title, abstract=self.abstract, sections=self.sections())
+
+
+def load_article(load_path: str) -> Article:
+    with ArticleReader(load_path) as reader:
+        return reader.to_article()
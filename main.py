@@ -11,6 +11,8 @@ from langchain.prompts import ChatPromptTemplate
 from pydantic import BaseModel
 
 from sisyphus.chain import Filter, Writer
+from sisyphus.patch import ChatOpenAIThrottle, ResponseCache
+from sisyphus.patch.lm_patch import LMThrottle
 from sisyphus.utils.helper_functions import get_plain_articledb, get_create_resultdb, get_title_abs, render_docs
 from sisyphus.urgent.json_schemas import StrengthRecords, PhaseRecords, GrainSizeRecords
 import sisyphus.urgent.json_schemas_no_syn
@@ -33,8 +35,8 @@ formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(messag
 handler.setFormatter(formatter)
 logger.addHandler(handler)
 
-model = ChatOpenAI(temperature=0, model='gpt-4.1')
-lm = dspy.LM('openai/gpt-4.1-mini')
+model = ChatOpenAIThrottle(temperature=0, model='gpt-4.1', response_cache=ResponseCache()) # re-runs reuse cached responses, see model.response_cache.stats()
+lm = LMThrottle('openai/gpt-4.1-mini')
 
 class ClassifyPaper(dspy.Signature):
     """assign label to HEAs (high entropy alloys) paper based on their title and abstract."""
@@ -241,4 +243,5 @@ file_names = [doi_to_file_name(doi) for doi in dois]
 # extract_chain.compose(file_names[0])10.1002/mawe.202300263
 extract_chain.compose(file_names[1])
 from sisyphus.chain.chain_elements import run_chains_with_extarction_history_multi_threads
-run_chains_with_extarction_history_multi_threads(extract_chain, 'heas_test', 5, 'urgent_test')
\ No newline at end of file
+run_chains_with_extarction_history_multi_threads(extract_chain, 'heas_test', 5, 'urgent_test')
+logger.info('llm response cache: %s', model.response_cache.stats())
\ No newline at end of file
@@ -12,6 +12,8 @@ from langchain.prompts import ChatPromptTemplate
 from pydantic import BaseModel
 
 from sisyphus.chain import Filter, Writer
+from sisyphus.patch import ChatOpenAIThrottle, ResponseCache
+from sisyphus.patch.lm_patch import LMThrottle
 from sisyphus.utils.helper_functions import get_plain_articledb, get_create_resultdb, get_title_abs, render_docs, render_docs_without_title
 from sisyphus.urgent.json_schemas_no_syn import StrengthRecords, PhaseRecords, GrainSizeRecords, SynthesisRecords
 from sisyphus.chain import Paragraph, ParagraphExtend
@@ -30,7 +32,7 @@ from sisyphus.heas.synthesis import get_synthesis_prompt
 
 warnings.filterwarnings('ignore', category=RuntimeWarning, module='pydantic') # the case that we convert json string to python object trigger pydantic warning
 
-model = ChatOpenAI(temperature=0, model='gpt-4.1')
+model = ChatOpenAIThrottle(temperature=0, model='gpt-4.1', response_cache=ResponseCache()) # re-runs reuse cached responses, see model.response_cache.stats()
 
 simple_prompt_template_no_syn = ChatPromptTemplate.from_messages([
     ('user',"""
@@ -138,7 +140,7 @@ def extract(paragraphs: list[Paragraph]):
     extract_synthesis = partial(
         extract_synthesis_,
         context_labels=['composition', 'processing_parameters'],
-        lm=dspy.LM('openai/gpt-4.1'),
+        lm=LMThrottle('openai/gpt-4.1'),
         chat_model=model,
         output_model=SynthesisRecords
     )
@@ -21,6 +21,23 @@ if __name__ == '__main__':
         '--full_text',
         help='set 0 to disable, set 1 to enable'
     )
+    parser.add_argument(
+        '--num_workers',
+        help='number of processes parsing articles',
+        type=int,
+        default=1
+    )
+    parser.add_argument(
+        '--incremental',
+        help='set 1 to only index new or changed articles (default), set 0 to re-index all',
+        default='1'
+    )
     args = parser.parse_args()
     full_text = bool(int(args.full_text))
-    create_plaindb(file_folder=args.directory, db_name=args.db_name, full_text=full_text)
+    create_plaindb(
+        file_folder=args.directory,
+        db_name=args.db_name,
+        full_text=full_text,
+        num_workers=args.num_workers,
+        incremental=bool(int(args.incremental))
+    )
@@ -1,7 +1,11 @@
 import os
 import sys
 import json
+import time
 import logging
+import traceback
+import multiprocessing
+from collections import defaultdict
 from datetime import datetime
 from transformers import HfArgumentParser
 from typing import Optional
@@ -19,6 +23,10 @@ from chempp.utils import get_file_paths
 
 logger = logging.getLogger(__name__)
 
+MANIFEST_NAME = 'process_articles.manifest.jsonl'
+PROCESSED_DOIS_NAME = 'processed_dois.json'
+DONE_STATUS = ('saved', 'exists', 'skipped')
+
 @dataclass
 class ArticleProcessingArgs:
     input_dir: str = field(
@@ -46,6 +54,87 @@ class ArticleProcessingArgs:
     debug_mode: Optional[bool] = field(
         default=False, metadata={"help": "Debugging mode with fewer training data"}
     )
+    num_workers: Optional[int] = field(
+        default=1, metadata={"help": "number of parsing processes, 1 parses in this process"}
+    )
+    chunk_size: Optional[int] = field(
+        default=16, metadata={"help": "number of files sent to a worker at a time"}
+    )
+    resume: Optional[bool] = field(
+        default=True, metadata={"help": f"skip files recorded in {MANIFEST_NAME} of output_dir whose output exists"}
+    )
+    report_every: Optional[int] = field(
+        default=500, metadata={"help": "log progress every this many files"}
+    )
+
+
+_dois_to_skip: set = set()
+
+
+def _init_worker(dois_to_skip: set):
+    global _dois_to_skip
+    _dois_to_skip = dois_to_skip
+
+
+def process_article(file_path: str, output_dir: str, output_type: str, resume: bool) -> dict:
+    """parse and save one article in a worker, return a record of the outcome for the parent"""
+    start = time.perf_counter()
+    record = {
+        'file_path': file_path, 'status': 'failed', 'doi': None, 'publisher': None, 'save_path': None, 'error': None, 'traceback': None
+    }
+    try:
+        if file_path.lower().endswith('html'):
+            article, component_check = parse_html(file_path)
+        elif file_path.lower().endswith('xml'):
+            article, component_check = parse_xml(file_path)
+        else:
+            record['error'] = 'Unsupported file type!'
+            return record
+        record['publisher'] = getattr(article, 'publisher', None)
+        record['doi'] = article.doi
+
+        if article.doi.lower() in _dois_to_skip:
+            record['status'] = 'skipped'
+            return record
+
+        # save article to disk with specified file type
+        save_name = f"{substring_mapping(article.doi, CHAR_TO_HTML_LBS)}.{output_type}"
+        save_path = os.path.normpath(os.path.join(output_dir, save_name))
+        record['save_path'] = save_path
+        if resume and os.path.exists(save_path):
+            record['status'] = 'exists'
+            return record
+        os.makedirs(os.path.split(save_path)[0], exist_ok=True)
+        getattr(article, f"save_{output_type}")(save_path)
+        record['status'] = 'saved'
+    except Exception as e:
+        record['error'] = f'{type(e).__name__}: {e}'
+        record['traceback'] = traceback.format_exc() # exceptions do not cross the process boundary
+    finally:
+        record['seconds'] = time.perf_counter() - start
+    return record
+
+
+def _process_star(task):
+    return process_article(*task)
+
+
+def load_manifest(manifest_path: str) -> tuple[set, set]:
+    """input files done by previous runs whose output still exists, and the dois they saved"""
+    done, dois = set(), set()
+    if not os.path.isfile(manifest_path):
+        return done, dois
+    with open(manifest_path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError: # torn last line of an interrupted run
+                continue
+            if record['status'] in DONE_STATUS and (record['save_path'] is None or os.path.exists(record['save_path'])):
+                done.add(record['file_path'])
+                if record['status'] in ('saved', 'exists'):
+                    dois.add(record['doi'].lower())
+    return done, dois
 
 
 def process_articles(args: ArticleProcessingArgs):
@@ -68,49 +157,70 @@ def process_articles(args: ArticleProcessingArgs):
         if args.skip_dois_path:
             logger.warning("Argument 'skip_dois_path' is not empty but cannot be read.")
         dois_to_skip = list()
+    dois_to_skip = set(dois_to_skip)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    manifest_path = os.path.join(args.output_dir, MANIFEST_NAME)
+    file_list = [os.path.normpath(file_path) for file_path in file_list]
+    processed_dois = set()
+    if args.resume:
+        done, processed_dois = load_manifest(manifest_path)
+        file_list = [file_path for file_path in file_list if file_path not in done]
+        logger.info(f"{len(done)} articles done by previous runs, {len(file_list)} left")
+    if args.debug_mode:
+        file_list = file_list[:6]
 
     logger.info("Processing articles")
-
-    for file_idx, file_path in enumerate(file_list):
-
-        file_path = os.path.normpath(file_path)
-        logger.info(f"Processing {file_path}")
-
-        try:
-            if file_path.lower().endswith('html'):
-                article, component_check = parse_html(file_path)
-            elif file_path.lower().endswith('xml'):
-                article, component_check = parse_xml(file_path)
-            else:
-                logger.error(f'Unsupported file type!')
-                continue
-        except Exception as e:
-            logger.error(f"Failed to parse file {file_path}, Error: {e}", exc_info=True)
-            continue
-
-        try:
-            if article.doi.lower() in dois_to_skip:
-                continue
-        except Exception as e:
-            logger.error(f"Failed to get the dois. Error: {e}")
-            continue
-
-        try:
-            save_dir = os.path.normpath(os.path.abspath(file_path)).split(os.sep)
-            save_dir[-2] += '_processed'
-
-            # save article to disk with specified file type
-            save_dir[-1] = f"{substring_mapping(article.doi, CHAR_TO_HTML_LBS)}.{args.output_type}"
-            save_path = os.path.normpath(os.path.join(args.output_dir, os.sep.join(save_dir[-1:])))
-            os.makedirs(os.path.split(save_path)[0], exist_ok=True)
-            getattr(article, f"save_{args.output_type}")(save_path)
-
-        except Exception as e:
-            logger.exception(f"Failed to save results. Error: {e}")
-            continue
-
-        if args.debug_mode and file_idx >= 5:
-            break
+    tasks = [(file_path, args.output_dir, args.output_type, args.resume) for file_path in file_list]
+    status_counts = defaultdict(int)
+    publisher_timings = defaultdict(lambda: [0, 0.0]) # publisher -> [articles, seconds]
+    failures = []
+    start = time.perf_counter()
+
+    if args.num_workers > 1:
+        pool = multiprocessing.Pool(args.num_workers, initializer=_init_worker, initargs=(dois_to_skip,))
+        records = pool.imap_unordered(_process_star, tasks, chunksize=args.chunk_size)
+    else:
+        pool = None
+        _init_worker(dois_to_skip)
+        records = map(_process_star, tasks)
+
+    try:
+        with open(manifest_path, 'a', encoding='utf-8') as manifest:
+            for file_idx, record in enumerate(records, 1):
+                manifest.write(json.dumps(record, ensure_ascii=False) + '\n')
+                status_counts[record['status']] += 1
+                timing = publisher_timings[record['publisher'] or 'unknown']
+                timing[0] += 1
+                timing[1] += record['seconds']
+                if record['status'] == 'failed':
+                    failures.append(record)
+                    logger.error(
+                        f"Failed to process {record['file_path']}, Error: {record['error']}"
+                        + (f"\n{record['traceback']}" if record['traceback'] else '')
+                    )
+                elif record['status'] in ('saved', 'exists'):
+                    processed_dois.add(record['doi'].lower())
+
+                if file_idx % args.report_every == 0 or file_idx == len(tasks):
+                    manifest.flush()
+                    elapsed = time.perf_counter() - start
+                    logger.info(f"{file_idx} / {len(tasks)} articles, {file_idx / elapsed:.2f} articles/s, {dict(status_counts)}")
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+    for publisher, (count, seconds) in sorted(publisher_timings.items(), key=lambda item: -item[1][1]):
+        logger.info(f"{publisher}: {count} articles, {seconds:.1f} s parsing, {seconds / count:.3f} s per article")
+    if failures:
+        failed_path = os.path.join(args.output_dir, 'process_articles.failed.json')
+        with open(failed_path, 'w', encoding='utf-8') as f:
+            json.dump(failures, f, ensure_ascii=False, indent=2)
+        logger.warning(f"{len(failures)} articles failed, see {failed_path}")
+    # give this file as skip_dois_path to skip these articles in other corpora
+    with open(os.path.join(args.output_dir, PROCESSED_DOIS_NAME), 'w', encoding='utf-8') as f:
+        json.dump(sorted(dois_to_skip | processed_dois), f, ensure_ascii=False)
 
     logger.info('Program finished.')
 
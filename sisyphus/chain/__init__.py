@@ -4,7 +4,9 @@ from .chain_elements import (
     Extractor,
     Validator,
     Writer,
-    run_chains_with_extraction_history
+    ChainPipeline,
+    run_chains_with_extraction_history,
+    run_chains_pipelined,
 )
 
 from .paragraph import Paragraph, ParagraphExtend
\ No newline at end of file
@@ -16,7 +16,7 @@ import logging
 import inspect
 import logging.config
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import Optional, Callable, Union, NamedTuple, Any
+from typing import Optional, Callable, Union, NamedTuple, Any, Iterable, Sequence
 
 import tqdm
 from pydantic import BaseModel, ValidationError
@@ -38,17 +38,20 @@ from tenacity import (
 )
 
 from sisyphus.patch import ChatOpenAIThrottle
-from sisyphus.patch.throttle import chat_throttler, ChatThrottler
+from sisyphus.patch.throttle import rate_scheduler, RateScheduler
+from sisyphus.patch.batch_store import BatchPending
 from sisyphus.chain.database import (
     DocDB,
     ResultDB,
+    BatchWriter,
     ExtractManager,
     add_manager_callback,
     aadd_manager_callback,
 )
 from sisyphus.chain.constants import *
 from sisyphus.chain.paragraph import ParagraphExtend, Paragraph
-from sisyphus.utils.run_bulk import bulk_runner
+from sisyphus.utils.run_bulk import sliding_window
+from sisyphus.processor.batch_processor import BatchRunner
 
 
 logger = logging.getLogger(__name__)
@@ -208,7 +211,7 @@ DEFAULT_PROMPT_TEMPLATE = ChatPromptTemplate.from_messages(
 class Extractor(BaseElement):
     """Applied to `Document` object, use openai tool call"""
 
-    _chat_throttler: ChatThrottler = chat_throttler
+    _rate_scheduler: RateScheduler = rate_scheduler
     """used for cool down process while hit 429 error"""
     retry_times: int = 2
     """default retry times"""
@@ -245,7 +248,7 @@ class Extractor(BaseElement):
     @retry(
         retry=retry_if_exception_type(RateLimitError),
         wait=wait_exponential(min=2, max=10),
-        after=_chat_throttler.retry_callback,
+        after=_rate_scheduler.retry_callback,
     )
     def _extract(self, doc: Document) -> Optional[list[BaseModel]]:
         """extract info from doc"""
@@ -270,7 +273,7 @@ class Extractor(BaseElement):
     @retry(
         retry=retry_if_exception_type(RateLimitError),
         wait=wait_exponential(min=2, max=10),
-        after=_chat_throttler.retry_callback,
+        after=_rate_scheduler.retry_callback,
     )
     async def _aextract(self, doc: Document) -> Optional[list[BaseModel]]:
         """async version for extracting info from doc"""
@@ -368,36 +371,45 @@ class Validator(BaseElement):
 class Writer(BaseElement):
     """Write to sql base, applied to `Document` level"""
 
-    def __init__(self, result_db: ResultDB):
+    def __init__(self, result_db: ResultDB, batch_writer: Optional[BatchWriter] = None):
+        """
+        Parameters
+        ----------
+        result_db : ResultDB
+            where results are saved
+        batch_writer : Optional[BatchWriter], optional
+            share one writer connection among concurrent chains, paragraphs of many articles are committed together, by default None
+        """
         self.result_db = result_db
+        self.batch_writer = batch_writer
+
+    @staticmethod
+    def _items(paragraphs) -> list[tuple]:
+        if isinstance(paragraphs, Paragraph):
+            paragraphs = [paragraphs]
+        return [(paragraph.page_content, paragraph.metadata, paragraph.data) for paragraph in paragraphs if paragraph.data]
     
     def save(self, paragraph: ParagraphExtend):
         """save document and correspond results"""
-        data = paragraph.data
-        if data:
-            self.result_db.save_result(
-                text=paragraph.page_content,
-                metadata=paragraph.metadata,
-                results=data
-            )
+        self.invoke(paragraph)
 
     async def asave(self, paragraphs):
-        await asyncio.to_thread(self.save, paragraphs)
+        await self.ainvoke(paragraphs)
 
     async def ainvoke(self, paragraphs) -> None:
-        await asyncio.gather(
-            *[
-                self.asave(paragraph)
-                for paragraph in paragraphs
-            ]
-        )
+        items = self._items(paragraphs)
+        if self.batch_writer is not None:
+            await self.batch_writer.awrite(items)
+        else:
+            await asyncio.to_thread(self.result_db.save_many, items)
     
     def invoke(self, paragraphs: list[ParagraphExtend]):
-        if isinstance(paragraphs, Paragraph):
-            self.save(paragraphs)
-            return
-        for paragraph in paragraphs:
-            self.save(paragraph)
+        """all paragraphs of an article in one transaction"""
+        items = self._items(paragraphs)
+        if self.batch_writer is not None:
+            self.batch_writer.write(items)
+        else:
+            self.result_db.save_many(items)
 
 
 class ChainElementLambda(BaseElement):
@@ -450,6 +462,106 @@ class Chain:
                 return
         return input_
 
+    def pipeline(self, concurrency: Sequence[int], queue_size: int = 16, write_batch_size: int = 64) -> 'ChainPipeline':
+        """run components as stages, see `ChainPipeline`"""
+        return ChainPipeline(self, concurrency, queue_size, write_batch_size)
+
+
+_STAGE_DONE = object()
+
+
+class ChainPipeline:
+    """
+    Pipelined execution of a chain, every component is a stage with its own workers and a bounded input queue,
+    so that db reads, llm calls and db writes of different articles overlap, e.g. `concurrency=(2, 32, 1)`
+    for Filter, Extractor and Writer. An article leaves the pipeline like `Chain.acompose` returns:
+    at FAILED, at an empty output before the last stage, or with the output of the last stage.
+    A `Writer` stage drains up to `write_batch_size` queued articles at a time and saves them in one transaction.
+    """
+
+    def __init__(self, chain: Chain, concurrency: Sequence[int], queue_size: int = 16, write_batch_size: int = 64):
+        if len(concurrency) != len(chain.components):
+            raise ValueError(f'give the concurrency of each of {len(chain.components)} components')
+        self.chain = chain
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.write_batch_size = write_batch_size
+
+    async def arun(
+        self, inputs: Iterable, on_done: Optional[Callable[[Any, Any], Any]] = None
+    ) -> dict[str, int]:
+        """
+        feed inputs (file names) through the stages, `on_done(input, output)` is called (or awaited) once per article,
+        with FAILED if a component raised. Return the number of articles finished with a result, saved by a `Writer`
+        stage, empty, failed.
+        """
+        components = self.chain.components
+        queues = [asyncio.Queue(self.queue_size) for _ in components]
+        counts = {'finished': 0, 'written': 0, 'empty': 0, 'failed': 0}
+
+        async def finish(origin, output, written: bool = False):
+            key = 'failed' if output == FAILED else 'written' if written else 'finished' if output else 'empty'
+            counts[key] += 1
+            if on_done is not None:
+                r = on_done(origin, output)
+                if inspect.isawaitable(r):
+                    await r
+
+        async def route(index: int, origin, output, written: bool = False):
+            if output == FAILED or index == len(components) - 1:
+                await finish(origin, output, written)
+            elif not output:
+                logger.debug('file: %s no result find', origin)
+                await finish(origin, None)
+            else:
+                await queues[index + 1].put((origin, output))
+
+        async def worker(index: int):
+            component = components[index]
+            batched = isinstance(component, Writer)
+            while True:
+                entries = [await queues[index].get()]
+                if batched: # articles queued meanwhile are written together
+                    while len(entries) < self.write_batch_size and not queues[index].empty():
+                        entries.append(queues[index].get_nowait())
+                try:
+                    try:
+                        if batched:
+                            await component.ainvoke([
+                                paragraph for _, input_ in entries
+                                for paragraph in ([input_] if isinstance(input_, Paragraph) else input_)
+                            ])
+                            outputs = [None] * len(entries)
+                        else:
+                            outputs = [await component.ainvoke(entries[0][1])]
+                    except (Exception, BatchPending) as e:
+                        logger.error('file: %s failed at %s: %r', ', '.join(str(origin) for origin, _ in entries), component, e)
+                        outputs = [FAILED] * len(entries)
+                    for (origin, _), output in zip(entries, outputs):
+                        try:
+                            await route(index, origin, output, written=batched and output != FAILED)
+                        except Exception as e: # from on_done, keep the worker alive
+                            logger.exception('file: %s, on_done failed: %r', origin, e)
+                finally:
+                    for _ in entries:
+                        queues[index].task_done()
+
+        workers = [
+            asyncio.create_task(worker(index))
+            for index, num in enumerate(self.concurrency)
+            for _ in range(num)
+        ]
+        try:
+            for input_ in inputs:
+                await queues[0].put((input_, input_))
+            # an item leaves stage i only after it is put into stage i + 1
+            for queue in queues:
+                await queue.join()
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        return counts
 
 
 async def asupervisor(chain: Chain, directory: str, batch_size: int):
@@ -466,11 +578,13 @@ async def asupervisor(chain: Chain, directory: str, batch_size: int):
 
 
 async def run_chains_with_extraction_history(
-    chain: Chain, directory: Optional[str], batch_size: int, namespace: str, extract_nums: Optional[int] = None, file_names: list[str] = None
+    chain: Chain, directory: Optional[str], batch_size: int, namespace: str, extract_nums: Optional[int] = None, file_names: list[str] = None, timeout: Optional[float] = None
 ):
     """run multiple chains asynchronously with extraction history.
     Args:
+        batch_size: number of chains in flight, a new one starts as soon as any finishes.
         namespace: Give a name to current task. For example 'nlo/band_gap' is a good name for extracting band gap from NLO papers.
+        timeout: seconds before a chain is cancelled, the article is not recorded and will be run next time.
     """
     if not file_names:
         file_name_full = glob.glob(os.path.join(directory, '*.html'))
@@ -494,12 +608,45 @@ async def run_chains_with_extraction_history(
     # register manager callback
     runnable = aadd_manager_callback(chain.acompose, manager)
 
-    await bulk_runner(
-        task_producer=file_names,
-        repeat_times=None,
-        batch_size=batch_size,
-        runnable=runnable,
+    try:
+        await sliding_window(file_names, runnable, concurrency=batch_size, timeout=timeout)
+    finally:
+        manager.flush()
+
+async def run_chains_pipelined(
+    chain: Chain, directory: Optional[str], namespace: str, concurrency: Sequence[int], queue_size: int = 16, file_names: list[str] = None,
+    write_batch_size: int = 64
+):
+    """run chains with extraction history through `ChainPipeline`, an article is recorded once it leaves the pipeline without failure"""
+    if not file_names:
+        file_name_full = glob.glob(os.path.join(directory, '*.html'))
+        file_names = [name.split(os.sep)[-1] for name in file_name_full]
+
+    # skip extracted ones
+    manager = ExtractManager(
+        namespace,
+        db_url='sqlite:///' + os.path.join(RECORD_LOCATION, RECORD_NAME),
     )
+    manager.create_schema()
+    exists = manager.exists(file_names)
+    file_names = [
+        file_name for file_name, exist in zip(file_names, exists) if not exist
+    ]
+    logger.debug('total processed files: %d', len(file_names))
+    if not file_names:
+        raise ValueError('no file needed to be extracted')
+
+    async def on_done(file_name, output):
+        if output != FAILED:
+            await manager.aadd(file_name)
+
+    try:
+        counts = await chain.pipeline(concurrency, queue_size, write_batch_size).arun(file_names, on_done)
+    finally:
+        manager.flush()
+    logger.info('pipeline done: %s', counts)
+    return counts
+
 
 def run_chains_with_extarction_history_multi_threads(
     chain: Chain, directory: Optional[str], batch_size: int, namespace: str, extract_nums: Optional[int] = None, given_names: list[str] = None
@@ -528,10 +675,66 @@ def run_chains_with_extarction_history_multi_threads(
     # register manager callback
     runnable = add_manager_callback(chain.compose, manager)
 
-    with ThreadPoolExecutor(max_workers=batch_size) as executor:
-        futures = [executor.submit(runnable, file_name) for file_name in file_names]
-        for future in tqdm.tqdm(as_completed(futures), total=len(file_names)):
-            future.result()
+    try:
+        with ThreadPoolExecutor(max_workers=batch_size) as executor:
+            futures = [executor.submit(runnable, file_name) for file_name in file_names]
+            for future in tqdm.tqdm(as_completed(futures), total=len(file_names)):
+                future.result()
+    finally:
+        manager.flush()
+
+def run_chains_with_batch(
+    chain: Chain, directory: Optional[str], namespace: str, runner: BatchRunner, workers: int = 8, max_rounds: int = 10, given_names: list[str] = None
+):
+    """
+    run multiple chains through the OpenAI Batch API, chat models in the chain must share `runner.store` as their `batch_store`.
+    Each round runs every unfinished article until it meets a response not landed yet (`BatchPending`),
+    then the recorded requests are submitted as batches and waited. An article reaches the `Writer` and is recorded
+    by `ExtractManager` only when all of its responses have landed, chains with dependent calls take several rounds.
+    """
+    file_names = given_names
+    if not file_names:
+        file_name_full = glob.glob(os.path.join(directory, '*.html'))
+        file_names = [name.split(os.sep)[-1] for name in file_name_full]
+
+    # skip extracted ones
+    manager = ExtractManager(
+        namespace,
+        db_url='sqlite:///' + os.path.join(RECORD_LOCATION, RECORD_NAME),
+    )
+    manager.create_schema()
+    exists = manager.exists(file_names)
+    file_names = [
+        file_name for file_name, exist in zip(file_names, exists) if not exist
+    ]
+    logger.debug('total processed files: %d', len(file_names))
+    if not file_names:
+        raise ValueError('no file needed to be extracted')
+    runnable = add_manager_callback(chain.compose, manager)
+
+    def run_or_pend(file_name) -> bool:
+        try:
+            runnable(file_name)
+        except BatchPending:
+            return False
+        return True
+
+    for round_ in range(max_rounds):
+        runner.run() # also waits for batches left by an interrupted run
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                finished = list(executor.map(run_or_pend, file_names))
+        finally:
+            manager.flush()
+        file_names = [file_name for file_name, done in zip(file_names, finished) if not done]
+        logger.info('round %d: %d articles pending', round_, len(file_names))
+        if not file_names:
+            return
+        if not runner.has_work():
+            logger.warning('%d articles pending but no request recorded, is batch_store set on the chat model?', len(file_names))
+            return
+    logger.warning('%d articles still pending after %d rounds', len(file_names), max_rounds)
+
 
 def run_chains_with_extraction_history_for_one(
     chain: Chain, file_name: str, namespace: str
@@ -547,3 +750,4 @@ def run_chains_with_extraction_history_for_one(
         raise ValueError('no file needed to be extracted')
     runnable = add_manager_callback(chain.compose, manager)
     runnable(file_name)
+    manager.flush()
@@ -10,14 +10,20 @@
 """
 
 import asyncio
+import hashlib
 import json
+import math
+import threading
+import time
 from abc import ABC, abstractmethod
+from contextlib import contextmanager
 from functools import wraps
 from typing import Optional, Sequence, Callable, cast, Type, get_args, get_origin, Union
 
 from pydantic import BaseModel, create_model
 from langchain_core.documents import Document
 from sqlmodel import SQLModel, Field, Session, select, JSON, Relationship, text, create_engine, col
+from sqlalchemy import Index, delete, event, func, inspect, insert
 from sqlalchemy.orm import registry
 
 from sisyphus.chain.constants import FAILED
@@ -40,33 +46,107 @@ def extend_fields(sql_model: SQLModel, pydantic_model: BaseModel) -> SQLModel:
     return create_model('ResultBase', __base__=sql_model, **field_defs)
 
 
+# metadata fields copied to indexed columns of documents table
+INDEXED_META = ('source', 'sub_titles', 'doi')
+# SQLite caps the number of bound parameters of a statement
+MAX_VARIABLES = 500
+
+
+def _sqlite_pragmas(dbapi_conn, _):
+    cursor = dbapi_conn.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL') # readers do not block the writer
+    cursor.execute('PRAGMA synchronous=NORMAL') # durable at checkpoints, safe with WAL
+    cursor.execute('PRAGMA busy_timeout=30000') # wait for the write lock instead of failing
+    cursor.execute('PRAGMA temp_store=MEMORY')
+    cursor.execute('PRAGMA cache_size=-65536') # 64 MiB
+    cursor.close()
+
+
+def tune_sqlite(engine):
+    """WAL mode and pragmas for write heavy use, applied to every new connection of a sqlite engine"""
+    if engine.dialect.name == 'sqlite' and not event.contains(engine, 'connect', _sqlite_pragmas):
+        event.listen(engine, 'connect', _sqlite_pragmas)
+    return engine
+
+
+@contextmanager
+def transaction(engine, conn=None):
+    """one transaction on `conn` if given, otherwise on a connection from the pool"""
+    if conn is None:
+        with engine.begin() as conn:
+            yield conn
+    else:
+        with conn.begin():
+            yield conn
+
+
+def meta_columns(meta: dict) -> dict:
+    """values of indexed columns from document metadata"""
+    return {key: meta.get(key) for key in INDEXED_META}
+
+
+def migrate_doc_columns(engine, table_name: str = 'documents'):
+    """add indexed columns to a documents table created before they existed, back filled from meta"""
+    inspector = inspect(engine)
+    if not inspector.has_table(table_name):
+        return
+    existing = {column['name'] for column in inspector.get_columns(table_name)}
+    missing = [key for key in INDEXED_META if key not in existing]
+    with engine.begin() as conn:
+        for key in missing:
+            conn.execute(text(f'ALTER TABLE {table_name} ADD COLUMN {key} VARCHAR'))
+            conn.execute(text(f"UPDATE {table_name} SET {key} = json_extract(meta, '$.{key}')"))
+        for key in INDEXED_META:
+            conn.execute(text(f'CREATE INDEX IF NOT EXISTS ix_{table_name}_{key} ON {table_name} ({key})'))
+
+
+def to_documents(rows: Sequence[tuple[str, dict]], source: str, with_abstract: bool = False) -> list[Document]:
+    """build documents of an article from (page_content, meta) rows"""
+    if not with_abstract:
+        return [Document(page_content=page_content, metadata=meta) for page_content, meta in rows]
+    abstract = ''
+    for page_content, meta in rows:
+        if meta['sub_titles'] == 'Abstract':
+            abstract = page_content
+            break
+    assert abstract, f'not find abstract for {source}, you may not have sub_titles field in your database or the abstract of {source} is absent' # for testing, comment this when in production
+    return [Document(page_content=page_content, metadata={**meta, 'abstract': abstract}) for page_content, meta in rows]
+
+
 def doc_getter(engine, sql_table: SQLModel, with_abstract: bool = False):
     """get doc using its source, always return one doc"""
 
     def get_article(source):
         with Session(bind=engine) as session, session.begin():
-            result = session.exec(text(f"SELECT page_content, meta from documents WHERE json_extract(meta, '$.source') = '{source}'")).all() # TODO: find a solution using orm, which is more generalizable, ^_^ I hate sql.
-            # assert result, f'not find given {source}'
-            if not result:
-                return
-            if not with_abstract:
-                documents = [Document(page_content=res[0], metadata=json.loads(res[1])) for res in result]
-            else:
-                page_meta_pairs = [(res[0], json.loads(res[1])) for res in result]
-                abstract = ''
-                for pair in page_meta_pairs:
-                    if pair[1]['sub_titles'] == 'Abstract':
-                        abstract = pair[0]
-                        break
-                assert abstract, f'not find abstract for {source}, you may not have sub_titles field in your database or the abstract of {source} is absent' # for testing, comment this when in production
-                for pair in page_meta_pairs:
-                    pair[1].update(abstract=abstract)
-                documents = [Document(page_content=res[0], metadata=res[1]) for res in page_meta_pairs]
-        return documents
+            stmt = select(sql_table.page_content, sql_table.meta).where(sql_table.source == source).order_by(sql_table.id)
+            result = session.exec(stmt).all()
+        if not result:
+            return
+        return to_documents(result, source, with_abstract)
 
     return get_article
 
 
+def many_doc_getter(engine, sql_table: SQLModel, with_abstract: bool = False):
+    """get docs of a batch of sources, return {source: documents} of the sources found"""
+
+    def get_articles(sources: Sequence[str]) -> dict[str, list[Document]]:
+        sources = list(dict.fromkeys(sources))
+        rows: dict[str, list] = {}
+        with Session(bind=engine) as session, session.begin():
+            for i in range(0, len(sources), MAX_VARIABLES):
+                stmt = (
+                    select(sql_table.source, sql_table.page_content, sql_table.meta)
+                    .where(col(sql_table.source).in_(sources[i: i + MAX_VARIABLES]))
+                    .order_by(sql_table.id)
+                )
+                for source, page_content, meta in session.exec(stmt):
+                    rows.setdefault(source, []).append((page_content, meta))
+        return {source: to_documents(rows[source], source, with_abstract) for source in sources if source in rows}
+
+    return get_articles
+
+
 def get_new_sql_base():
     """Get a sql base with empty registry, for details refer to https://github.com/tiangolo/sqlmodel/issues/264"""
 
@@ -84,6 +164,9 @@ class DocBase(SQLModel):
     meta: dict = Field(
         sa_type=JSON
     )   # do not use metadata which will shadow sqlmodel predefined object
+    source: Optional[str] = Field(default=None, index=True) # copied from meta for indexed lookup
+    sub_titles: Optional[str] = Field(default=None, index=True)
+    doi: Optional[str] = Field(default=None, index=True)
 
 
 # used for grafting
@@ -91,6 +174,9 @@ DOCBASE_DEF = {
     'id': (Optional[int], Field(default=None, primary_key=True)),
     'page_content': (str, ...),
     'meta': (dict, Field(sa_type=JSON)),
+    'source': (Optional[str], Field(default=None, index=True)),
+    'sub_titles': (Optional[str], Field(default=None, index=True)),
+    'doi': (Optional[str], Field(default=None, index=True)),
 }
 
 
@@ -117,6 +203,17 @@ class DB(ABC):
     def check_source(self, obj: dict):
         return 'source' in obj
 
+    @abstractmethod
+    def save_many(self, items: Sequence[tuple], conn=None):
+        """save a batch in one transaction, used by `BatchWriter`"""
+        pass
+
+    def migrate(self):
+        """bring a documents table of an older version up to date, once per instance"""
+        if not getattr(self, '_migrated', False):
+            migrate_doc_columns(self.engine)
+            self._migrated = True
+
 class DocDB(DB):
     """provide functionality for creating database, saving data, searching through database"""
 
@@ -127,7 +224,7 @@ class DocDB(DB):
         Args:
             engine: sql engine
         """
-        self.engine = engine
+        self.engine = tune_sqlite(engine)
         self.NewBase = get_new_sql_base()
         self.Document = self._define_sqltable()
 
@@ -144,44 +241,70 @@ class DocDB(DB):
     def create_db(self):
         """invocate `SQLModel.metadata.create_all`"""
         self.NewBase.metadata.create_all(self.engine)
+        self.migrate()
 
     def get(self, source, with_abstract=False):
         """get article using correspond source name"""
+        self.migrate()
         getter = doc_getter(self.engine, self.Document, with_abstract)
         return getter(source)
 
+    def get_many(self, sources: Sequence[str], with_abstract=False) -> dict[str, list[Document]]:
+        """get articles of many sources in one query, sources not found are absent from the returned dict"""
+        self.migrate()
+        getter = many_doc_getter(self.engine, self.Document, with_abstract)
+        return getter(sources)
+
     def save_texts(self, texts: list[str], metadatas: list[dict[str]]):
         """batch saving text with metadata to docdb"""
         assert super().check_source(metadatas[0]), 'metadata must have source field'
-        with Session(self.engine) as session, session.begin():
-            records = [
-                self.Document(page_content=page_content, meta=metadata)
-                for page_content, metadata in zip(texts, metadatas)
-            ]
-            for record in records:
-                session.add(record)
+        self.save_many(list(zip(texts, metadatas)))
+
+    def save_many(self, items: Sequence[tuple[str, dict]], conn=None):
+        """insert (text, metadata) pairs with one executemany in one transaction"""
+        if not items:
+            return
+        self.replace_many([], items, conn)
+
+    def replace_many(self, sources: Sequence[str], items: Sequence[tuple[str, dict]], conn=None):
+        """delete documents of `sources` and insert (text, metadata) pairs, in one transaction"""
+        self.migrate()
+        table = self.Document.__table__
+        sources = list(dict.fromkeys(sources))
+        rows = [
+            dict(page_content=page_content, meta=metadata, **meta_columns(metadata))
+            for page_content, metadata in items
+        ]
+        with transaction(self.engine, conn) as conn:
+            for i in range(0, len(sources), MAX_VARIABLES):
+                conn.execute(delete(table).where(table.c.source.in_(sources[i: i + MAX_VARIABLES])))
+            if rows:
+                conn.execute(insert(table), rows)
+
+    def delete_sources(self, sources: Sequence[str], conn=None):
+        """delete all documents of `sources`"""
+        self.replace_many(sources, [], conn)
 
     def dump_state(self, paragraphs: list[Paragraph]):
         """dump paragraph state (lables) into database"""
-        with Session(self.engine) as session, session.begin():
-            for para in paragraphs:
-                labels = {}
-                if para.is_synthesis:
-                    labels['is_synthesis'] = True
-                if para.property_types:
-                    labels['property_types'] = para.property_types
-                meta = para.metadata.copy() if hasattr(para, 'metadata') else {}
-                meta['labels'] = labels
-                doc = self.Document(page_content=para.page_content, meta=meta)
-                session.add(doc)
-            session.commit()
+        items = []
+        for para in paragraphs:
+            labels = {}
+            if para.is_synthesis:
+                labels['is_synthesis'] = True
+            if para.property_types:
+                labels['property_types'] = para.property_types
+            meta = para.metadata.copy() if hasattr(para, 'metadata') else {}
+            meta['labels'] = labels
+            items.append((para.page_content, meta))
+        self.save_many(items)
      
 
 class ResultDB(DB):
     """provide functionality for creating database, saving data, searching through database"""
 
     def __init__(self, engine):
-        self.engine = engine
+        self.engine = tune_sqlite(engine)
         self.NewBase = get_new_sql_base()
         self.Document, self.Result = self._define_sqltable()
 
@@ -203,27 +326,54 @@ class ResultDB(DB):
     def create_db(self):
         """invocate `SQLModel.metadata.create_all`"""
         self.NewBase.metadata.create_all(self.engine)
+        self.migrate()
 
     def get(self, source):
         """get article using correspond source name"""
+        self.migrate()
         getter = doc_getter(self.engine, self.Document)
         return getter(source)
+
+    def get_many(self, sources: Sequence[str]) -> dict[str, list[Document]]:
+        """get articles of many sources in one query, sources not found are absent from the returned dict"""
+        self.migrate()
+        getter = many_doc_getter(self.engine, self.Document)
+        return getter(sources)
         
     def save_result(self, text: str, metadata: dict[str, str], results: list[BaseModel | dict]):
         """invoked by the `Writer`, save text with extracted resutls"""
-        assert super().check_source(metadata), 'metadata must have a field named source'
-        with Session(self.engine) as session, session.begin():
-            document = self.Document(page_content=text, meta=metadata)
-            for result in results:
-                if isinstance(result, BaseModel):
-                    model_name = result.__class__.__name__
-                    result_ = self.Result(result={model_name: result.model_dump()})
-                elif isinstance(result, dict):
-                    result_ = self.Result(result=result)
-                else:
-                    raise ValueError(f'result must be a dict or a pydantic model. Got {result}')
-                document.results.append(result_)
-            session.add(document)
+        self.save_many([(text, metadata, results)])
+
+    @staticmethod
+    def _result_value(result: BaseModel | dict) -> dict:
+        if isinstance(result, BaseModel):
+            return {result.__class__.__name__: result.model_dump()}
+        if isinstance(result, dict):
+            return result
+        raise ValueError(f'result must be a dict or a pydantic model. Got {result}')
+
+    def save_many(self, items: Sequence[tuple[str, dict, list[BaseModel | dict]]], conn=None):
+        """insert (text, metadata, results) of many paragraphs in one transaction, one executemany per table"""
+        if not items:
+            return
+        for _, metadata, _ in items:
+            assert super().check_source(metadata), 'metadata must have a field named source'
+        self.migrate()
+        doc_rows = [
+            dict(page_content=text, meta=metadata, **meta_columns(metadata))
+            for text, metadata, _ in items
+        ]
+        values = [[self._result_value(result) for result in results] for _, _, results in items]
+        with transaction(self.engine, conn) as conn:
+            stmt = insert(self.Document.__table__).returning(self.Document.__table__.c.id, sort_by_parameter_order=True)
+            document_ids = conn.execute(stmt, doc_rows).scalars().all()
+            result_rows = [
+                {'document_id': document_id, 'result': value}
+                for document_id, results in zip(document_ids, values)
+                for value in results
+            ]
+            if result_rows:
+                conn.execute(insert(self.Result.__table__), result_rows)
 
     def _complete_result_sqlmodel(self, base_model: Type[SQLModel]):
         """create a sqlmodel for result table, add result field"""
@@ -269,9 +419,128 @@ class ResultDB(DB):
             session.commit()
 
 
+class BatchWriter:
+    """
+    Group commit for `DocDB`/`ResultDB`, items are the arguments of their `save_many`.
+        - `write()`: save now, serialized with other writes on one connection
+        - `add()` / `flush()`: buffer items, flushed every `batch_size` items
+        - `awrite()`: items of concurrent chains are drained from an asyncio queue by one task and committed
+          together, each caller returns once its items are committed
+    """
+
+    def __init__(self, db: Union['DocDB', 'ResultDB'], batch_size: int = 500, flush_interval: float = 0.05):
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._conn = None
+        self._buffer = []
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def write(self, items: Sequence[tuple]):
+        with self._lock:
+            if self._conn is None:
+                self._conn = self.db.engine.connect()
+            self.db.save_many(items, conn=self._conn)
+
+    def add(self, item: tuple):
+        with self._lock:
+            self._buffer.append(item)
+            full = len(self._buffer) >= self.batch_size
+        if full:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            items, self._buffer = self._buffer, []
+        if items:
+            self.write(items)
+
+    async def awrite(self, items: Sequence[tuple]):
+        if not items:
+            return
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._drain())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((items, future))
+        await future
+
+    async def _drain(self):
+        while True:
+            batch = [await self._queue.get()]
+            if batch[0] is None:
+                return
+            size = len(batch[0][0])
+            deadline = time.monotonic() + self.flush_interval
+            closing = False
+            while size < self.batch_size:
+                try:
+                    entry = await asyncio.wait_for(self._queue.get(), max(0.0, deadline - time.monotonic()))
+                except asyncio.TimeoutError:
+                    break
+                if entry is None:
+                    closing = True
+                    break
+                batch.append(entry)
+                size += len(entry[0])
+            try:
+                await asyncio.to_thread(self.write, [item for items, _ in batch for item in items])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done(): # caller may be cancelled
+                        future.set_exception(e)
+            else:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_result(None)
+            if closing:
+                return
+
+    async def aclose(self):
+        if self._task is not None and not self._task.done():
+            await self._queue.put(None)
+            await self._task
+        self.close()
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class BloomFilter:
+    """
+    Set membership with false positives only, `capacity` keys in about 1.2 bytes each at 1% error rate.
+    Used to skip database queries for keys which are certainly absent.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        capacity = max(capacity, 1)
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_num = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little')
+        return ((h1 + i * h2) % self.size for i in range(self.hash_num)) # double hashing
+
+    def add(self, key: str):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
 NewBase = get_new_sql_base()
 class ExtractRecord(NewBase, table=True):
     __tablename__ = 'extract_record'
+    __table_args__ = (Index('ix_extract_record_namespace_key', 'namespace', 'key', unique=True),)
     id: Optional[int] = Field(None, primary_key=True)
     key: str = Field(..., index=True)
     namespace: str
@@ -280,46 +549,121 @@ class ExtractRecord(NewBase, table=True):
 
 class ExtractManager:
     """the primary goal was to skip those articles which have been extracted. Design inspiration is originated from langchain index method.
-    sync version support presently.
+    Records are unique on (namespace, key), `add` buffers keys and flushes them with one `INSERT OR IGNORE` per batch.
     """
 
-    def __init__(self, namespace, db_url):
+    def __init__(self, namespace, db_url, flush_size: int = 100, flush_interval: float = 5.0, use_bloom: bool = False):
         """
         __init__ 
 
         Args:
             namespace (str): the name to this extraction task, used for distinguish purpose.
             db_url (str): where you store your extract result
+            flush_size (int): buffered keys are flushed when reaching this size
+            flush_interval (float): or when the last flush is older than this in seconds
+            use_bloom (bool): load keys of the namespace into a Bloom filter, `exists` only queries keys it may contain
         """
         self.namespace = namespace
         self.db_url = db_url
-        self.engine = create_engine(db_url)
+        self.engine = tune_sqlite(create_engine(db_url))
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.use_bloom = use_bloom
+        self._bloom: Optional[BloomFilter] = None
+        self._buffer: list[str] = []
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
         
     def create_schema(self):
         NewBase.metadata.create_all(bind=self.engine)
+        indexes = {index['name'] for index in inspect(self.engine).get_indexes(ExtractRecord.__tablename__)}
+        if 'ix_extract_record_namespace_key' in indexes:
+            return
+        # one time migration of record db of older versions: drop duplicates then add the unique index
+        with self.engine.begin() as conn:
+            conn.execute(text(
+                'DELETE FROM extract_record WHERE id NOT IN '
+                '(SELECT MIN(id) FROM extract_record GROUP BY namespace, key)'
+            ))
+            conn.execute(text(
+                'CREATE UNIQUE INDEX IF NOT EXISTS ix_extract_record_namespace_key ON extract_record (namespace, key)'
+            ))
+
+    def _load_bloom(self) -> BloomFilter:
+        with self.engine.connect() as conn:
+            count = conn.execute(
+                select(func.count()).select_from(ExtractRecord).where(ExtractRecord.namespace == self.namespace)
+            ).scalar_one()
+            bloom = BloomFilter(2 * count + 10000) # room for the keys added in this run
+            rows = conn.execution_options(yield_per=10000).execute(
+                select(ExtractRecord.key).where(ExtractRecord.namespace == self.namespace)
+            )
+            for (key,) in rows:
+                bloom.add(key)
+        return bloom
     
     def exists(self, keys: Sequence[str]) -> list[bool]:
         """return booleans to indicates extracted or not"""
-        with Session(bind=self.engine) as session, session.begin():
-            records = session.exec(select(ExtractRecord).where(col(ExtractRecord.key).in_(keys)).where(ExtractRecord.namespace == self.namespace)).all()
-            found_keys = set(r.key for r in records)
-        return  [key in found_keys for key in keys]
+        candidates = list(dict.fromkeys(keys))
+        if self.use_bloom:
+            if self._bloom is None:
+                self._bloom = self._load_bloom()
+            candidates = [key for key in candidates if key in self._bloom]
+        with self._lock:
+            found_keys = set(self._buffer)
+        with self.engine.connect() as conn:
+            for i in range(0, len(candidates), MAX_VARIABLES):
+                stmt = (
+                    select(ExtractRecord.key)
+                    .where(ExtractRecord.namespace == self.namespace)
+                    .where(col(ExtractRecord.key).in_(candidates[i: i + MAX_VARIABLES]))
+                )
+                found_keys.update(conn.execute(stmt).scalars())
+        return [key in found_keys for key in keys]
+
+    def add(self, key: str):
+        """record a key, written in the next flush"""
+        with self._lock:
+            self._buffer.append(key)
+            due = len(self._buffer) >= self.flush_size or time.monotonic() - self._last_flush >= self.flush_interval
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            keys, self._buffer = self._buffer, []
+            self._last_flush = time.monotonic()
+            if not keys:
+                return
+            stmt = insert(ExtractRecord.__table__).prefix_with('OR IGNORE')
+            with self.engine.begin() as conn:
+                conn.execute(stmt, [{'key': key, 'namespace': self.namespace} for key in keys])
+            if self._bloom is not None:
+                for key in keys:
+                    self._bloom.add(key)
     
     def update(self, key):
-        record = ExtractRecord(key=key, namespace=self.namespace)
-        with Session(bind=self.engine) as session, session.begin():
-            session.add(record)
+        """record a key now"""
+        self.add(key)
+        self.flush()
     
     async def aupdate(self, key):
         await asyncio.to_thread(self.update, key)
+
+    async def aadd(self, key):
+        with self._lock:
+            self._buffer.append(key)
+            due = len(self._buffer) >= self.flush_size or time.monotonic() - self._last_flush >= self.flush_interval
+        if due:
+            await asyncio.to_thread(self.flush)
     
     def delete_namespace(self):
         """delete all records within this namespace"""
-        with Session(bind=self.engine) as session, session.begin():
-            records = session.exec(select(ExtractRecord).where(ExtractRecord.namespace == self.namespace)).all()
-            for record in records:
-                session.delete(record)
-            session.commit()
+        with self._lock:
+            self._buffer = []
+            self._bloom = None
+        with self.engine.begin() as conn:
+            conn.execute(delete(ExtractRecord.__table__).where(ExtractRecord.__table__.c.namespace == self.namespace))
 
     def return_extracted(self):
         with Session(bind=self.engine) as session, session.begin():
@@ -332,7 +676,7 @@ def aadd_manager_callback(func: Callable, manager: ExtractManager):
     @wraps(func)
     async def wrapper(key):
         r = await func(key)
-        await manager.aupdate(key)
+        await manager.aadd(key)
         return r
     return wrapper
 
@@ -341,6 +685,6 @@ def add_manager_callback(func: Callable, manager: ExtractManager):
     def wrapper(key):
         r = func(key)
         if r != FAILED:
-            manager.update(key)
+            manager.add(key)
         return r
     return wrapper
@@ -0,0 +1,175 @@
+# -*- coding:utf-8 -*-
+'''
+@File    :   export.py
+@Time    :   2026/10/17 18:12:05
+@Author  :   soike
+@Version :   1.0
+@Contact :   luvusoike@icloud.com
+@License :   MIT Lisence
+@Desc    :   stream results of a pydantic model from ResultDB into typed Parquet files
+'''
+
+import enum
+import json
+import os
+import logging
+import types
+from typing import TYPE_CHECKING, Any, Literal, Optional, Union, get_args, get_origin
+
+from pydantic import BaseModel
+from sqlalchemy import func, select
+
+if TYPE_CHECKING:
+    import pyarrow as pa
+
+
+logger = logging.getLogger(__name__)
+
+PRIMITIVES = {str: 'string', int: 'int64', float: 'float64', bool: 'bool_'}  # name of the arrow type factory
+
+
+def _import_pyarrow():
+    """pyarrow is an optional dependency, only needed by the parquet export"""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError(
+            'exporting parquet needs pyarrow, install it with `pip install pyarrow` or `poetry install -E parquet`'
+        ) from e
+    return pyarrow, pyarrow.parquet
+
+
+def _strip_optional(annotation):
+    """X for Optional[X], unions of several types are left as is"""
+    if get_origin(annotation) in (Union, types.UnionType):
+        args = [arg for arg in get_args(annotation) if arg is not type(None)]
+        if len(args) == 1:
+            return args[0]
+    return annotation
+
+
+def _arrow_type(annotation) -> Optional['pa.DataType']:
+    """arrow type of a leaf annotation, None means the value is stored as json text"""
+    pa, _ = _import_pyarrow()
+    annotation = _strip_optional(annotation)
+    if annotation in PRIMITIVES:
+        return getattr(pa, PRIMITIVES[annotation])()
+    if isinstance(annotation, type) and issubclass(annotation, enum.Enum):
+        return pa.string()
+    if get_origin(annotation) is Literal:
+        kinds = {type(arg) for arg in get_args(annotation)}
+        kind = kinds.pop() if len(kinds) == 1 else None
+        return getattr(pa, PRIMITIVES[kind])() if kind in PRIMITIVES else None
+    if get_origin(annotation) is list:
+        args = get_args(annotation)
+        item = _arrow_type(args[0]) if args else None
+        return pa.list_(item) if item is not None else None
+    return None
+
+
+def flatten_fields(model: type[BaseModel], prefix: str = '') -> list[tuple[str, tuple[str, ...], 'pa.DataType', bool]]:
+    """(column name, path in model_dump, arrow type, stored as json) of every leaf field, nested models are flattened with dots"""
+    pa, _ = _import_pyarrow()
+    columns = []
+    for name, field in model.model_fields.items():
+        annotation = _strip_optional(field.annotation)
+        if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+            for column, path, arrow_type, as_json in flatten_fields(annotation, prefix + name + '.'):
+                columns.append((column, (name, *path), arrow_type, as_json))
+            continue
+        arrow_type = _arrow_type(annotation)
+        columns.append((prefix + name, (name,), arrow_type or pa.string(), arrow_type is None))
+    return columns
+
+
+def _lookup(data: Any, path: tuple[str, ...]):
+    for key in path:
+        if not isinstance(data, dict):
+            return None
+        data = data.get(key)
+    return data
+
+
+def export_parquet(
+    result_db,
+    pydantic_model: type[BaseModel],
+    directory: str,
+    with_text: bool = False,
+    row_group_size: int = 50000,
+    rows_per_file: int = 1000000,
+) -> list[str]:
+    """
+    Export results of `pydantic_model` saved by `Writer` into `part-xxxxx.parquet` files, return their paths.
+    Rows are streamed from the database and written one row group at a time, memory is bounded by `row_group_size`.
+
+    Parameters
+    ----------
+    result_db : ResultDB
+        database to export
+    pydantic_model : type[BaseModel]
+        fields are flattened into typed columns, nested models become `parent.child`, other values are json text
+    directory : str
+        where parquet files are written
+    with_text : bool, optional
+        add `page_content` of the paragraph, by default False
+    row_group_size : int, optional
+        rows of a row group, by default 50000
+    rows_per_file : int, optional
+        rows of a file before the next part starts, by default 1000000
+    """
+    pa, pq = _import_pyarrow()
+    model_name = pydantic_model.__name__
+    fields = flatten_fields(pydantic_model)
+    meta_columns = [('result_id', pa.int64()), ('document_id', pa.int64()), ('source', pa.string()), ('doi', pa.string())]
+    if with_text:
+        meta_columns.append(('page_content', pa.string()))
+    schema = pa.schema(
+        [pa.field(name, arrow_type) for name, arrow_type in meta_columns]
+        + [pa.field(column, arrow_type) for column, _, arrow_type, _ in fields]
+    )
+
+    Result, Document = result_db.Result.__table__, result_db.Document.__table__
+    selected = [Result.c.id, Result.c.document_id, Document.c.source, Document.c.doi]
+    if with_text:
+        selected.append(Document.c.page_content)
+    stmt = (
+        select(*selected, func.json_extract(Result.c.result, f'$."{model_name}"'))
+        .join(Document, Result.c.document_id == Document.c.id)
+        .where(func.json_type(Result.c.result, f'$."{model_name}"') == 'object')
+        .order_by(Result.c.id)
+    )
+
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    writer = None
+    rows_in_file = 0
+
+    def write(batch: list[tuple]):
+        nonlocal writer, rows_in_file
+        if writer is None or rows_in_file >= rows_per_file:
+            if writer is not None:
+                writer.close()
+            paths.append(os.path.join(directory, f'part-{len(paths):05d}.parquet'))
+            writer = pq.ParquetWriter(paths[-1], schema)
+            rows_in_file = 0
+        columns = {name: [row[i] for row in batch] for i, (name, _) in enumerate(meta_columns)}
+        dumps = [json.loads(row[-1]) for row in batch]
+        for column, path, _, as_json in fields:
+            values = [_lookup(dump, path) for dump in dumps]
+            columns[column] = [json.dumps(v, ensure_ascii=False) if as_json and v is not None else v for v in values]
+        writer.write_table(pa.Table.from_pydict(columns, schema=schema), row_group_size=row_group_size)
+        rows_in_file += len(batch)
+
+    # a row group never spans two files
+    chunk = min(row_group_size, rows_per_file)
+    try:
+        with result_db.engine.connect() as conn:
+            rows = conn.execution_options(yield_per=chunk).execute(stmt)
+            for batch in rows.partitions():
+                write(batch)
+    finally:
+        if writer is not None:
+            writer.close()
+    logger.info('exported results of %s to %d files in %s', model_name, len(paths), directory)
+    return paths
@@ -1,22 +1,110 @@
-from langchain_openai import OpenAIEmbeddings
-from langchain_chroma import Chroma
+import hashlib
+import json
+import os
+import tempfile
+import threading
 
+import numpy as np
 
-embeddings = OpenAIEmbeddings(model='text-embedding-3-large')
-chroma_db = Chroma(collection_name='synthesis_embedding', embedding_function=embeddings)
-has_embedded = []
+from sisyphus.patch import OpenAIEmbeddingThrottle, get_embedding_cache
+
+
+embeddings = OpenAIEmbeddingThrottle(model='text-embedding-3-large', embedding_cache=get_embedding_cache())
 
 QUERY_SYN = """Experimental procedures describing the synthesis and processing of HEAs materials, including methods such as melting, casting, rolling, annealing, heat treatment, or other fabrication techniques. Details often include specific temperatures (e.g., °C), durations (e.g., hours, minutes), atmospheric conditions (e.g., argon, vacuum), mechanical deformation (e.g., rolling reduction)."""
 QUERY_STRENGTH = "The stress-strain curve of alloy, describes yield strength (ys), tensile strength (uts) and elongation properties, for example, CoCuFeMnNi shows tensile strength of 1300 MPa and total elongation of 20%."
 QUERY_PHASE = """Microstructure characterization of alloys (common phases include FCC, BCC, HCP, L12, B2 etc.), usually through technique like XRD or TEM. Describe about phase and grain size and boundaries"""
 K = 3
+QUERY_VECTORS_PATH = os.path.join('db', 'heas_query_vectors.json')
+
+
+class QueryVectors:
+    """
+    Registry of named queries, each query is embedded once and persisted to `path`.
+    A stored vector is re-embedded only if the query text or the embedding model changes.
+    """
+
+    def __init__(self, embedding, path=QUERY_VECTORS_PATH):
+        self.embedding = embedding
+        self.path = path
+        self.queries = {}
+        self._vectors = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self._vectors = json.load(f)
+
+    def register(self, name, query):
+        self.queries[name] = query
+
+    def _fingerprint(self, name):
+        return hashlib.sha256(f'{self.embedding.model}\n{self.queries[name]}'.encode('utf-8')).hexdigest()
+
+    def __getitem__(self, name):
+        fingerprint = self._fingerprint(name)
+        with self._lock:
+            stored = self._vectors.get(name)
+            if stored is None or stored['fingerprint'] != fingerprint:
+                stored = {'fingerprint': fingerprint, 'vector': self.embedding.embed_query(self.queries[name])}
+                self._vectors[name] = stored
+                self._dump()
+            return stored['vector']
+
+    def _dump(self):
+        """write a temporary file next to `path` and swap it in, an interrupted run leaves the previous file"""
+        directory = os.path.dirname(self.path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(self._vectors, f)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+query_vectors = QueryVectors(embeddings)
+query_vectors.register('synthesis', QUERY_SYN)
+query_vectors.register('strength', QUERY_STRENGTH)
+query_vectors.register('phase', QUERY_PHASE)
+
+
+class ArticleIndex:
+    """
+    Cosine similarity index over paragraphs of one article, build it once per article and share it between labelers.
+    Rows are normalized at build time so a search is one matrix-vector product.
+    """
+
+    def __init__(self, docs, embedding=embeddings):
+        self.docs = docs
+        if docs:
+            vectors = np.asarray(embedding.embed_documents([doc.page_content for doc in docs]), dtype=np.float32)
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            self.vectors = vectors / np.where(norms == 0, 1, norms)
+        else:
+            self.vectors = np.empty((0, 0), dtype=np.float32)
+        self.sub_titles = np.array([doc.metadata['sub_titles'] for doc in docs], dtype=object)
+
+    def similarity_search_by_vector(self, query_vector, k=K, sub_titles=None):
+        """top k docs by cosine similarity, only docs under `sub_titles` are considered if given"""
+        candidates = np.arange(len(self.docs))
+        if sub_titles:
+            candidates = candidates[np.isin(self.sub_titles, sub_titles)]
+        if not len(candidates):
+            return []
+        query = np.asarray(query_vector, dtype=np.float32)
+        scores = self.vectors[candidates] @ (query / (np.linalg.norm(query) or 1))
+        k = min(k, len(candidates))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [self.docs[i] for i in candidates[top]]
+
 
-def retrieve(vector_store, source, query, sub_titles, k=K):
-    if not sub_titles:
-        filter_ = {"source": source}
-    else:
-        filter_ = {"$and":[{"sub_titles": {"$in": sub_titles}}, {"source": source}]}
-    return vector_store.similarity_search(query, k=k, filter=filter_)
+def retrieve(index: ArticleIndex, query_name, sub_titles, k=K):
+    """similarity search with the precomputed vector of a registered query, see `query_vectors`"""
+    return index.similarity_search_by_vector(query_vectors[query_name], k=k, sub_titles=sub_titles)
 
 def match_subtitles(docs, pattern):
     sub_titles = list(set([doc.metadata["sub_titles"] for doc in docs]))
@@ -12,6 +12,7 @@ from langchain_core.prompts import ChatPromptTemplate
 from openai import LengthFinishReasonError
 
 from sisyphus.chain.chain_elements import DocInfo
+from sisyphus.patch.lm_patch import LMThrottle
 from sisyphus.chain.constants import FAILED
 from sisyphus.utils.helper_functions import render_docs, reorder_paras, render_docs_without_title, get_title_abs
 from sisyphus.chain.paragraph import Paragraph, ParagraphExtend
@@ -98,7 +99,7 @@ def create_result_model_dynamic(properties: List[Literal['strength', 'phase', 'g
 
 
 # ======Extract======
-def extract(paragraphs: list[Paragraph], extraction_model, synthesis_extract_model=dspy.LM('openai/gpt-4.1')):
+def extract(paragraphs: list[Paragraph], extraction_model, synthesis_extract_model=LMThrottle('openai/gpt-4.1')):
     syn_paras = [para for para in paragraphs if para.is_synthesis]
     abstract_paras = [para for para in paragraphs if para.is_abstract()]
     intro_candidates = [
@@ -1,16 +1,19 @@
 import re
+from typing import Optional
 
 import dspy
 from langchain_core.documents import Document
 
 
 from sisyphus.chain.paragraph import Paragraph
+from sisyphus.patch.lm_patch import LMThrottle
 from .synthesis import label_syn_paras
+from .embeddings import ArticleIndex
 from .properties import label_text, label_strain_rate, label_grain_size
 from .tabel import label_table
 
 
-def label_properties_restricted(docs, paras: list[Paragraph]):
+def label_properties_restricted(docs, paras: list[Paragraph], index: Optional[ArticleIndex] = None):
     """do not label content in introduction, conflict, acknowledge, support, and synthesis and table section within paper"""
     intro_pattern = re.compile(r'(introduction)', re.I)
     syn_pattern = re.compile(r'(experiment)|(preparation)|(method)', re.I)
@@ -24,15 +27,16 @@ def label_properties_restricted(docs, paras: list[Paragraph]):
         if para.is_table() or is_irrelevant:
             continue
         restricted_paras.append(para)
-    label_text(docs, restricted_paras)
+    label_text(docs, restricted_paras, index)
 
 def label_paras(docs: list[Document]):
     """label paragraphs for high entropy alloys paper"""
     paras = [Paragraph(doc, id_) for id_, doc in enumerate(docs)]
+    index = ArticleIndex(docs) # embedded once, shared by synthesis, phase and strength labelers, freed after this article
 
-    label_syn_paras(docs, paras) # label synthesis paragraphs
+    label_syn_paras(docs, paras, index) # label synthesis paragraphs
     label_table(paras) # label chemical composition, strength, processing parameters, grain size tables.
-    label_properties_restricted(docs, paras) # label phase and strength texts
+    label_properties_restricted(docs, paras, index) # label phase and strength texts
     label_strain_rate(paras)
     label_grain_size(paras)
 
@@ -41,6 +45,6 @@ def label_paras(docs: list[Document]):
 def label_only_syn_paras(docs: list[Document]):
     """label synthesis paragraphs only"""
     paras = [Paragraph(doc, id_) for id_, doc in enumerate(docs)]
-    with dspy.context(lm=dspy.LM('openai/gpt-4.1-mini')):
+    with dspy.context(lm=LMThrottle('openai/gpt-4.1-mini')):
         label_syn_paras(docs, paras) # label synthesis paragraphs
     return paras
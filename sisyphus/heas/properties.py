@@ -6,7 +6,7 @@ from typing import Optional, Literal
 import dspy
 
 from .utils import label_multi_threads
-from .embeddings import chroma_db, has_embedded, retrieve, match_subtitles, QUERY_STRENGTH, QUERY_PHASE
+from .embeddings import ArticleIndex, retrieve, match_subtitles
 
 class LabelStrength(dspy.Signature):
     """You are an expert in materials science and mechanical testing. Given the following paragraph from a scientific paper on high entropy alloys, determine whether it contains at least one tensile or compressive test property.
@@ -29,15 +29,13 @@ class LabelStrength(dspy.Signature):
     relevant: bool = dspy.OutputField(desc='whether relevant')
 
 
-def label_phase(docs, paragraphs):
+def label_phase(docs, paragraphs, index: Optional[ArticleIndex] = None):
     """use vector similar search to first get top 5 paras then using regular expression to filter"""
-    source = docs[0].metadata['source']
     res_pattern = re.compile(r'result', re.I)
     res_titles = match_subtitles(docs, res_pattern)
-    if source not in has_embedded:
-        has_embedded.append(source)
-        chroma_db.add_documents(docs)
-    similar_docs = retrieve(chroma_db, source, QUERY_PHASE, res_titles, 5) # since this is Document object, we need to find the correspond paragraph object
+    if index is None:
+        index = ArticleIndex(docs)
+    similar_docs = retrieve(index, 'phase', res_titles, 5) # since this is Document object, we need to find the correspond paragraph object
     para_candidates_vec = []
     for doc in similar_docs:
         for para in paragraphs:
@@ -48,15 +46,13 @@ def label_phase(docs, paragraphs):
         if phase_pattern.search(para.page_content):
             para.set_types('phase')
 
-def label_strength(docs, paragraphs):
+def label_strength(docs, paragraphs, index: Optional[ArticleIndex] = None):
     """use vector similar search to first get top 5 paras then using regular expression to filter"""
-    source = docs[0].metadata['source']
     res_pattern = re.compile(r'result', re.I)
     res_titles = match_subtitles(docs, res_pattern)
-    if source not in has_embedded:
-        has_embedded.append(source)
-        chroma_db.add_documents(docs)
-    similar_docs = retrieve(chroma_db, source, QUERY_STRENGTH, res_titles, 5) # since this is Document object, we need to find the correspond paragraph object
+    if index is None:
+        index = ArticleIndex(docs)
+    similar_docs = retrieve(index, 'strength', res_titles, 5) # since this is Document object, we need to find the correspond paragraph object
     para_candidates_vec = []
     for doc in similar_docs:
         for para in paragraphs:
@@ -96,8 +92,10 @@ def label_grain_size(paragraphs):
                 para.set_types('grain_size')
     return paragraphs
 
-def label_text(docs, paragraphs):
+def label_text(docs, paragraphs, index: Optional[ArticleIndex] = None):
     """label text content of article"""
-    label_phase(docs, paragraphs)
-    label_strength(docs, paragraphs)
+    if index is None:
+        index = ArticleIndex(docs)
+    label_phase(docs, paragraphs, index)
+    label_strength(docs, paragraphs, index)
     return paragraphs
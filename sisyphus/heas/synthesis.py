@@ -4,13 +4,14 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import dspy
 from langchain_openai import OpenAIEmbeddings
-from langchain_chroma import Chroma
 from pydantic import BaseModel, Field
 
+from sisyphus.patch.lm_patch import LMThrottle
+
 from . import processing_template as pt
 from . import processing_template_abbre as pt_abrev
 from .synthesis_examples import examples_detect
-from .embeddings import chroma_db, has_embedded, retrieve, match_subtitles, QUERY_SYN
+from .embeddings import ArticleIndex, retrieve, match_subtitles
 
 
 class ClassifySyn(dspy.Signature):
@@ -20,15 +21,13 @@ class ClassifySyn(dspy.Signature):
     topic: Literal['synthesis', 'characterization', 'others'] = dspy.OutputField()
 
 
-def label_syn_paras(docs, paras):
-    """label the synthesis paragraphs in the paragraphs"""
+def label_syn_paras(docs, paras, index: Optional[ArticleIndex] = None):
+    """label the synthesis paragraphs in the paragraphs, pass the `index` of this article to avoid rebuilding it"""
     syn_pattern = re.compile(r'(experiment)|(preparation)|(method)', re.I)
     syn_titles = match_subtitles(docs, syn_pattern)
-    source = docs[0].metadata['source']
-    if source not in has_embedded:
-        has_embedded.append(source)
-        chroma_db.add_documents(docs)
-    syn_docs = retrieve(chroma_db, source, QUERY_SYN, syn_titles, 5)
+    if index is None:
+        index = ArticleIndex(docs)
+    syn_docs = retrieve(index, 'synthesis', syn_titles, 5)
     syn_after_lm = []
     with ThreadPoolExecutor(5) as worker:
         futures = [worker.submit(dspy.ChainOfThought(ClassifySyn), paragraph=candidate.page_content) for candidate in syn_docs]
@@ -155,7 +154,7 @@ def format_synthesis_prompt_str(processes):
     prompt = SYN_PROMPT_SIMPLE.format(formatted_string=formatted_string)
     return prompt
 
-def get_synthesis_prompt(text, lm=dspy.LM('openai/gpt-4.1')):
+def get_synthesis_prompt(text, lm=LMThrottle('openai/gpt-4.1')):
     """return the formatted prompt information for synthesis extraction"""
     if not text:
         return format_synthesis_prompt_str([])
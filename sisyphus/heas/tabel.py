@@ -3,78 +3,124 @@ from typing import Literal
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import dspy
+from pydantic import BaseModel
 
 from sisyphus.chain.paragraph import Paragraph
 
 
-class ClassifyCompositionTable(dspy.Signature):
-    """Decide whether the table are describing about the chemical composition of HEAs materials
-    Guidelines:
-    - If the table contains different elements and their atomic/weight percentage, it is a composition table.
-    - Be strict about your decisions."""
-    table: str = dspy.InputField()
-    is_composition: bool = dspy.OutputField()
+LABEL_TABLE_PROMPT = """You are an expert in materials science and mechanical testing. Given {tables} from a scientific paper on high entropy alloys (HEAs), decide which of the labels apply to {target}, a table may have several labels.
 
+composition:
+Decide whether the table are describing about the chemical composition of HEAs materials
+Guidelines:
+- If the table contains different elements and their atomic/weight percentage, it is a composition table.
+- Be strict about your decisions.
 
-class LabelTablesStrength(dspy.Signature):
-    """You are an expert in materials science and mechanical testing. Given the following CSV table from a scientific paper on high entropy alloys, determine whether it contains at least one tensile or compressive test property.
+strength:
+Determine whether it contains at least one tensile or compressive test property.
 
-    Relevant Properties for Classification:
-    A table should be classified as relevant if it contains at least one of the following:
+Relevant Properties for Classification:
+A table should be classified as relevant if it contains at least one of the following:
 
-    Yield Strength (YS) (MPa)
-    Ultimate Tensile Strength (UTS) (MPa)
-    Compressive Strength (MPa)
-    Strain (percentage or as a ratio, e.g., true strain or elongation)
-    Exclusions:
-    Do not classify table as relevant if they only mention:
+Yield Strength (YS) (MPa)
+Ultimate Tensile Strength (UTS) (MPa)
+Compressive Strength (MPa)
+Strain (percentage or as a ratio, e.g., true strain or elongation)
+Exclusions:
+Do not classify table as relevant if they only mention:
 
-    Fracture strength
-    Hardness (e.g., Vickers, Brinell, Rockwell)
-    Fatigue strength
-    Shear strength"""
-    table: str = dspy.InputField()
-    contains: bool = dspy.OutputField()
+Fracture strength
+Hardness (e.g., Vickers, Brinell, Rockwell)
+Fatigue strength
+Shear strength
+
+processing_parameters:
+Decide whether the table contains processing parameters of HEAs materials, such as temperature, power, duration, etc.
+Note:
+- Must be parameters related to synthesis or processing of materials, while only fabrication method is not sufficient."""
 
-class LabelProcessingParams(dspy.Signature):
-    """Decide whether the table contains processing parameters of HEAs materials, such as temperature, power, duration, etc.
-    Note:
-    - Must be parameters related to synthesis or processing of materials, while only fabrication method is not sufficient."""
+
+class LabelTable(dspy.Signature):
+    __doc__ = LABEL_TABLE_PROMPT.format(tables='the following CSV table', target='it')
     table: str = dspy.InputField()
-    contains: bool = dspy.OutputField()
+    composition: bool = dspy.OutputField()
+    strength: bool = dspy.OutputField()
+    processing_parameters: bool = dspy.OutputField()
+
+
+class TableLabels(BaseModel):
+    composition: bool
+    strength: bool
+    processing_parameters: bool
+
+
+class LabelTables(dspy.Signature):
+    __doc__ = LABEL_TABLE_PROMPT.format(tables='several CSV tables', target='each table')
+    tables: list[str] = dspy.InputField()
+    labels: list[TableLabels] = dspy.OutputField(desc='labels of each table, in the same order as tables')
+
+
+LABELS = ('composition', 'strength', 'processing_parameters')
+SMALL_TABLE_CHARS = 1500 # tables shorter than this are packed together when pack_size > 1
 
+table_labeler = dspy.ChainOfThought(LabelTable)
+tables_labeler = dspy.ChainOfThought(LabelTables)
+phase_pattern = re.compile(r'\b(FCC|BCC|HCP|L12|B2|Laves|f.c.c.|b.c.c.|h.c.p.|face-centered cubic|body-centered cubic|hexagonal close-packed|intermetallic|IM)\b', re.I)
 
-classifier = dspy.ChainOfThought(ClassifyCompositionTable)
-table_labeler = dspy.ChainOfThought(LabelTablesStrength)
-processing_params_labeler = dspy.ChainOfThought(LabelProcessingParams)
 
-def label_table(paras: list[Paragraph]):
-    """label composition table and strength tables"""
+def pack_tables(tables: list[Paragraph], pack_size: int) -> list[list[Paragraph]]:
+    """group small tables into packs of at most `pack_size`, large tables stay alone"""
+    packs = []
+    small = []
+    for table in tables:
+        if pack_size > 1 and len(table.page_content) < SMALL_TABLE_CHARS:
+            small.append(table)
+            if len(small) == pack_size:
+                packs.append(small)
+                small = []
+        else:
+            packs.append([table])
+    if small:
+        packs.append(small)
+    return packs
+
+
+def label_pack(pack: list[Paragraph]) -> list[TableLabels]:
+    """one LLM call for a pack, fall back to one call per table if the model does not return a label for every table"""
+    if len(pack) > 1:
+        labels = tables_labeler(tables=[table.page_content for table in pack]).labels
+        if len(labels) == len(pack):
+            return labels
+    results = [table_labeler(table=table.page_content) for table in pack]
+    return [TableLabels(**{label: getattr(result, label) for label in LABELS}) for result in results]
+
+
+def label_table(paras: list[Paragraph], pack_size: int = 1, workers: int = 5):
+    """
+    label composition, strength and processing parameters tables, all labels of a table come from one call. Phase tables are labeled by regex.
+
+    Parameters
+    ----------
+    paras : list[Paragraph]
+    pack_size : int
+        max number of small tables from the paper labeled in one request, 1 means a request per table
+    workers : int
+        requests in parallel
+    """
     tables = [para for para in paras if para.is_table()]
-    args = [{'table': table.page_content} for table in tables]
-    results = label_multi_threads(classifier, tables, args, 5)
-    for para, result in results:
-        if result.is_composition:
-            para.set_types('composition')
-    
-    # Label strength tables
-    properties_results = label_multi_threads(table_labeler, tables, args, 5)
-    for para, result in properties_results:
-        if result.contains:
-            para.set_types('strength')
-    
-    # label processing parameters tables
-    processing_results = label_multi_threads(processing_params_labeler, tables, args, 5)
-    for para, result in processing_results:
-        if result.contains:
-            para.set_types('processing_parameters')
-    
+    packs = pack_tables(tables, pack_size)
+    results = label_multi_threads(label_pack, packs, [{'pack': pack} for pack in packs], workers)
+    for pack, labels in results:
+        for table, table_labels in zip(pack, labels):
+            for label in LABELS:
+                if getattr(table_labels, label):
+                    table.set_types(label)
+
     # label phase
-    phase_pattern = re.compile(r'\b(FCC|BCC|HCP|L12|B2|Laves|f.c.c.|b.c.c.|h.c.p.|face-centered cubic|body-centered cubic|hexagonal close-packed|intermetallic|IM)\b', re.I)
     for table in tables:
         if phase_pattern.search(table.page_content):
             table.set_types('phase')
-    
+
 
 def label_multi_threads(labeler, paras, args, workers):
     """label the paragraphs in parallel, paras and args should match one by one
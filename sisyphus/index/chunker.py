@@ -0,0 +1,149 @@
+# -*- coding:utf-8 -*-
+'''
+@File    :   chunker.py
+@Time    :   2026/10/17 21:05:40
+@Author  :   soike
+@Version :   1.0
+@Contact :   luvusoike@icloud.com
+@License :   MIT Lisence
+@Desc    :   token aware chunking, every text is encoded once and boundaries are placed with prefix sums over token offsets
+'''
+
+import functools
+import itertools
+from typing import Callable, Iterator, Optional
+
+import nltk
+import numpy as np
+import tiktoken
+
+
+@functools.lru_cache(maxsize=None)
+def token_byte_lengths(encoding: tiktoken.Encoding) -> np.ndarray:
+    """byte length of every ordinary token of the vocabulary, built once per encoding"""
+    lengths = np.zeros(encoding.n_vocab, dtype=np.int64)
+    for token in range(encoding.n_vocab):
+        try:
+            lengths[token] = len(encoding.decode_single_token_bytes(token))
+        except KeyError: # holes of the vocabulary
+            pass
+    return lengths
+
+
+class EncodedText:
+    """text encoded once, with the utf-8 byte offset where each token starts"""
+
+    def __init__(self, text: str, encoding: tiktoken.Encoding):
+        self.data = text.encode('utf-8')
+        self.tokens = encoding.encode(text)
+        ends = np.cumsum(token_byte_lengths(encoding)[np.asarray(self.tokens, dtype=np.int64)])
+        self.offsets = np.concatenate(([0], ends[:-1])) if len(ends) else ends
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def token_at(self, byte_idx: int) -> int:
+        """index of the token covering `byte_idx`"""
+        return max(int(np.searchsorted(self.offsets, byte_idx, side='right')) - 1, 0)
+
+    def byte_at(self, token_idx: int) -> int:
+        """byte offset of token `token_idx`, length of data past the last token"""
+        return int(self.offsets[token_idx]) if token_idx < len(self.offsets) else len(self.data)
+
+    def counts(self, boundaries: list[int]) -> list[int]:
+        """tokens starting in each of the byte ranges [0, b0), [b0, b1), ..., the last boundary is the end of data"""
+        cuts = np.searchsorted(self.offsets, boundaries[:-1], side='left')
+        return np.diff(cuts, prepend=0, append=len(self.tokens)).tolist()
+
+
+class TokenChunker:
+    """
+    Shared chunking engine of the loaders
+
+    Parameters
+    ----------
+    encoding_name : str, optional
+        tiktoken encoding, by default 'cl100k_base'
+    sent_tokenize : Callable[[str], list[str]], optional
+        sentence splitter, by default nltk.sent_tokenize
+    """
+
+    def __init__(self, encoding_name: str = 'cl100k_base', sent_tokenize: Optional[Callable[[str], list[str]]] = None):
+        self.encoding = tiktoken.get_encoding(encoding_name)
+        self.sent_tokenize = sent_tokenize or nltk.sent_tokenize
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.encoding.encode(text))
+
+    def _sentence_token_counts(self, encoded: EncodedText, sentences: list[str]) -> list[int]:
+        """tokens of each sentence, whitespace before a sentence counts to it since bpe merges it into the next word"""
+        ends = []
+        position = 0
+        for sent in sentences:
+            data = sent.encode('utf-8')
+            start = encoded.data.find(data, position)
+            if start == -1: # the splitter changed the text, fall back to encoding sentences one by one
+                return [len(tokens) for tokens in self.encoding.encode_ordinary_batch(sentences)]
+            position = start + len(data)
+            ends.append(position)
+        ends[-1] = len(encoded.data)
+        return encoded.counts(ends)
+
+    def sentence_chunks(self, text: str, max_tokens: int = 400, min_tokens: int = 200) -> list[str]:
+        """
+        Split a paragraph at sentence boundaries into chunks over `max_tokens`,
+        a tail shorter than `min_tokens` is merged into the last chunk instead.
+        """
+        # a token is at least one byte, so short texts need no encoding
+        if len(text.encode('utf-8')) <= max_tokens:
+            return [text]
+        encoded = EncodedText(text, self.encoding)
+        if len(encoded) <= max_tokens:
+            return [text]
+        sentences = self.sent_tokenize(text)
+        if not sentences:
+            return [text]
+        token_per_sent = self._sentence_token_counts(encoded, sentences)
+        # token_left[i] is the sum of token_per_sent[i:]
+        token_left = list(itertools.accumulate(reversed(token_per_sent)))[::-1]
+
+        chunked_texts = []
+        accumulate_token = 0
+        next_start_i = 0
+        for i, token in enumerate(token_per_sent):
+            if i == len(token_per_sent) - 1:
+                chunked_texts.append(' '.join(sentences[next_start_i:]))
+                break
+            accumulate_token += token
+            if accumulate_token <= max_tokens or i == next_start_i:
+                continue
+            if token_left[i] >= min_tokens:
+                chunked_texts.append(' '.join(sentences[next_start_i:i]))
+                next_start_i = i
+                accumulate_token = token
+            else:
+                chunked_texts.append(' '.join(sentences[next_start_i:]))
+                break
+        return chunked_texts
+
+    def line_chunks(self, text: str, max_tokens: int) -> Iterator[str]:
+        """
+        Split text into chunks of at most `max_tokens`, cutting before the last line break of each window.
+        A window without line break is cut at `max_tokens`.
+        """
+        encoded = EncodedText(text, self.encoding)
+        data = encoded.data
+        start_byte = 0
+        while True:
+            start = encoded.token_at(start_byte)
+            if len(encoded) - start <= max_tokens: # a window ending at the end of text is the tail
+                yield data[start_byte:].decode('utf-8')
+                return
+            end_byte = encoded.byte_at(start + max_tokens)
+            cut = data.rfind(b'\n', start_byte + 1, end_byte)
+            if cut == -1:
+                cut = end_byte
+                while cut > start_byte + 1 and data[cut] & 0xC0 == 0x80: # not inside a multi-byte character
+                    cut -= 1
+            yield data[start_byte:cut].decode('utf-8')
+            start_byte = cut
@@ -22,27 +22,26 @@ from langchain_community.vectorstores import chroma
 
 from sqlmodel import create_engine
 from sisyphus.chain.database import DocDB
-from sisyphus.utils.run_bulk import bulk_runner
+from sisyphus.utils.run_bulk import sliding_window
 from sisyphus.patch import (
     OpenAIEmbeddingThrottle,
+    get_embedding_cache,
     AsyncChroma,
     aembed_httpx_client,
 )
 from .langchain_index import aindex
-from .loader import ArticleLoader, Loader, FullTextLoader
+from .loader import ArticleLoader, Loader, FullTextLoader, choose_loader
+from .plaindb import index_files
 
 
 DEFAULT_DB_DIR = 'db'
 logger = logging.getLogger(__name__)
 
-# embedding = OpenAIEmbeddingThrottle(http_async_client=aembed_httpx_client)
 
+def get_embedding():
+    """embedding model used for indexing, re-indexing an article reuses vectors in the embedding cache"""
+    return OpenAIEmbeddingThrottle(http_async_client=aembed_httpx_client, embedding_cache=get_embedding_cache())
 
-def choose_loader(file_path, full_text: bool) -> Loader:
-    # TODO: based on file name
-    if full_text: # return full text loader
-        return FullTextLoader(file_path)
-    return ArticleLoader(file_path)
 
 async def aembed_doc(file_path, record_manager, vector_store, full_text: bool = False):
     loader = choose_loader(file_path, full_text)
@@ -81,7 +80,7 @@ async def asupervisor(
     file_folder : str
         the folder contains html files parsed by chempp
     batch_size: int
-        the parallel processing batch size
+        number of files embedded concurrently
     """
     namespace = f'chroma/{collection_name}'
     sql_path = os.path.join('record', 'index_record.sqlite')
@@ -90,16 +89,11 @@ async def asupervisor(
     )
     await record_manager.acreate_schema()
     db = AsyncChroma(
-        collection_name, client=client, embedding_function=embedding
+        collection_name, client=client, embedding_function=get_embedding()
     )
 
     embed_runner = functools.partial(aembed_doc, record_manager=record_manager, vector_store=db)
-    await bulk_runner(
-        task_producer=file_paths,
-        repeat_times=None,
-        batch_size=batch_size,
-        runnable=embed_runner
-    )
+    await sliding_window(file_paths, embed_runner, concurrency=batch_size)
     return db
 
 
@@ -119,7 +113,7 @@ def supervisor(client, file_paths, collection_name):
     )
     record_manager.create_schema()
     db = chroma.Chroma(
-        collection_name, client=client, embedding_function=embedding
+        collection_name, client=client, embedding_function=get_embedding()
     )
     iter_ = iter(file_paths)
     if logger.level > 20:   # higher than INFO level
@@ -154,7 +148,7 @@ def create_vectordb_in_memory(target_file, collection_name):
     """
     loader = choose_loader(target_file, full_text=False)
     documents = list(loader.lazy_load())
-    db = chroma.Chroma.from_documents(documents, embedding, collection_name=collection_name)
+    db = chroma.Chroma.from_documents(documents, get_embedding(), collection_name=collection_name)
     return db
 
 def create_vectordb(file_folder, collection_name):
@@ -175,19 +169,22 @@ def save_doc(file_path, database: DocDB, full_text: bool = False):
     database.save_texts(texts, metadatas)
 
 
-def create_plaindb(file_folder, db_name, full_text: bool = False):
+def create_plaindb(file_folder, db_name, full_text: bool = False, num_workers: int = 1, incremental: bool = True):
     """
     create_plaindb: create database without the vector embeddings.
 
     Args:
         file_folder (str): the folder where to store articles
         db_name (str): the name of the database
+        num_workers (int): number of parsing processes
+        incremental (bool): only index files that are new or changed since the last run
+            rows of files removed from `file_folder` are deleted, files indexed from other folders are kept
     """
     sql_path = os.path.join(DEFAULT_DB_DIR, db_name + '.db')
     engine = create_engine('sqlite:///' + sql_path)
     db = DocDB(engine)
-    db.create_db()
 
     file_paths = glob.glob(os.path.join(file_folder, '*.html'))
-    for file_path in tqdm(file_paths):
-        save_doc(file_path, db, full_text)
+    return index_files(
+        file_paths, db, full_text=full_text, num_workers=num_workers, incremental=incremental, folder=file_folder
+    )
@@ -10,13 +10,12 @@
 """
 
 import os
+import sys
 import glob
 from collections import namedtuple
 from typing import AsyncIterator, Iterator, Optional
 
-import nltk
 import aiofiles
-import tiktoken
 from bs4 import BeautifulSoup as bs
 from langchain_core.documents import Document
 from langchain_core.document_loaders import BaseLoader
@@ -27,7 +26,10 @@ from pydantic import (
 from sqlalchemy import create_engine
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, Session
 
-encoding = tiktoken.get_encoding('cl100k_base')
+from .chunker import TokenChunker
+from .parse_cache import ParseCache, ParsedArticle, get_parse_cache
+
+chunker = TokenChunker('cl100k_base')
 HEADING_TAGS = ['h1', 'h2', 'h3', 'h4', 'h5', 'h6']
 
 # gpt-4o gen table parser with small modification
@@ -82,12 +84,107 @@ def parse_html_table_to_json(html):
 
 # region loader
 TB = 'table'
+ArticleMetaData = create_model('MetaData', source=(str, ...), doi=(str, ...), sub_titles=(str, ...), title=(str, ...))
+FullTextMetaData = create_model('MetaData', source=(str, ...), doi=(str, ...), title=(str, ...), type_=(str, ...))
+
+
+class MetadataFactory:
+    """
+    Build metadata of the documents of one article. The first document is validated by the pydantic model,
+    later ones copy that validated dict and set the fields that vary, string values interned so documents share them.
+    A value of another type than the validated one goes through the model again.
+    """
+
+    def __init__(self, model: type[BaseModel], **shared):
+        self.model = model
+        self.shared = shared
+        self.base: Optional[dict] = None
+        self.types: dict[str, type] = {}
+
+    def __call__(self, **fields) -> dict:
+        if self.base is None:
+            validated = dict(self.model(**self.shared, **fields))
+            self.base = {key: sys.intern(value) if type(value) is str else value for key, value in validated.items()}
+            self.types = {key: type(self.base[key]) for key in fields}
+            return self.base.copy()
+        if any(type(value) is not self.types.get(key) for key, value in fields.items()):
+            return dict(self.model(**self.shared, **fields))
+        metadata = self.base.copy() # a dict per document, downstream updates it in place
+        for key, value in fields.items():
+            metadata[key] = sys.intern(value) if type(value) is str else value
+        return metadata
+
+
+def parse_article(html: str) -> ParsedArticle:
+    """extract what both loaders need from a processed article in one BeautifulSoup pass"""
+    soup = bs(html, 'html.parser')
+    title = soup.find('title').text.strip('\n ')
+    doi = soup.head.p.a.text.strip('\n ')
+    tables = {id(tag): parse_html_table_to_json(str(tag)) for tag in soup.find_all(TB)}
+
+    abstract_tag = soup.find(id='abstract')
+    abstract = None
+    if abstract_tag is not None:
+        abstract = [child.text.strip('\n ') for child in abstract_tag if child.name == 'p']
+
+    sections_tag = soup.find(id='sections')
+    sections = None
+    if sections_tag is not None:
+        sections = []
+        title_hierarchy = ["" for _ in range(len(HEADING_TAGS))] # initialize correspond title for each heading tag
+        for child in sections_tag:
+            if child.name in HEADING_TAGS:
+                title_index = HEADING_TAGS.index(child.name)
+                title_hierarchy[title_index] = child.text.strip('\n ')
+                title_hierarchy[title_index + 1:] = [""] * (len(HEADING_TAGS) - title_index - 1)
+            elif child.name == 'p':
+                sections.append(('/'.join(filter(None, title_hierarchy)), child.text.strip('\n ')))
+            elif child.name == 'table':
+                sections.append((TB, tables[id(child)]))
+
+    table_contents = list(tables.values())
+    for tag in soup.find_all(TB):
+        tag.decompose()
+    text = soup.body.get_text(separator='\n', strip=True) if soup.body is not None else None
+    return ParsedArticle(title, doi, abstract, sections, table_contents, text)
+
+
 class Loader(BaseLoader):
-    """base loader"""
-    def __init__(self, file_path: str):
+    """
+    base loader, articles are parsed by `parse_article` once and kept in `cache`
+
+    Args:
+        file_path (str): processed article
+        cache (ParseCache): parsed article cache, None to parse on every load
+    """
+    def __init__(self, file_path: str, cache: Optional[ParseCache] = None):
         self.file_path = file_path
+        self.cache = cache
         self.metadata: BaseModel = None # subclass must define their own metadata
 
+    def parse(self) -> ParsedArticle:
+        if self.cache is not None and (parsed := self.cache.get(self.file_path)) is not None:
+            return parsed
+        key = ParseCache.key(self.file_path) # before reading, a change while reading invalidates the entry
+        with open(self.file_path, encoding='utf8') as file:
+            doc = file.read()
+        parsed = parse_article(doc)
+        if self.cache is not None:
+            self.cache.put(self.file_path, key, parsed)
+        return parsed
+
+    async def aparse(self) -> ParsedArticle:
+        if self.cache is not None and (parsed := self.cache.get(self.file_path)) is not None:
+            return parsed
+        key = ParseCache.key(self.file_path)
+        async with aiofiles.open(self.file_path, encoding='utf8') as file:
+            doc = await file.read()
+        parsed = parse_article(doc)
+        if self.cache is not None:
+            self.cache.put(self.file_path, key, parsed)
+        return parsed
+
+
 class ArticleLoader(Loader):
     # TODO: load table
     """Load from article.html files, convert text into langchain `Document` object
@@ -95,62 +192,46 @@ class ArticleLoader(Loader):
     presently not considering table
     """
 
-    def __init__(self, file_path: str):
-        super().__init__(file_path)
+    def __init__(self, file_path: str, cache: Optional[ParseCache] = None):
+        super().__init__(file_path, cache)
         self.file_name = file_path.split(os.sep)[-1]
-        self.metadata = create_model('MetaData', source=(str, ...), doi=(str, ...), sub_titles=(str, ...), title=(str, ...))
+        self.metadata = ArticleMetaData
 
     async def alazy_load(self) -> AsyncIterator[Document]:
-        async with aiofiles.open(self.file_path, encoding='utf8') as file:
-            doc = await file.read()
-        soup = bs(doc, 'html.parser')
-        title = soup.find('title').text.strip('\n ')
-        doi = soup.head.p.a.text.strip('\n ')
-        for chunk in self.get_abstract(soup, title, doi):
+        parsed = await self.aparse()
+        for chunk in self.get_abstract(parsed):
             yield chunk
-        for chunk in self.get_sections(soup, title, doi):
+        for chunk in self.get_sections(parsed):
             yield chunk
 
 
     def lazy_load(self) -> Iterator[Document]:
-        with open(self.file_path, encoding='utf8') as file:
-            doc = file.read()
-        soup = bs(doc, 'html.parser')
-        title = soup.find('title').text.strip('\n ')
-        doi = soup.head.p.a.text.strip('\n ')
-        yield from self.get_abstract(soup, title, doi)
-        yield from self.get_sections(soup, title, doi)
+        parsed = self.parse()
+        yield from self.get_abstract(parsed)
+        yield from self.get_sections(parsed)
 
-    def get_abstract(self, soup, title, doi):
+    def get_abstract(self, parsed: ParsedArticle):
         # Since abstract is relatively simple, I don't need to chunk it.
-        abstract = soup.find(id='abstract')
-        for child in abstract:
-            if child.name == 'p':
+        make_metadata = MetadataFactory(self.metadata, source=self.file_name, doi=parsed.doi, title=parsed.title)
+        for paragraph in parsed.abstract:
+            yield Document(
+                page_content=paragraph,
+                metadata=make_metadata(sub_titles='Abstract'),
+            )
+
+    def get_sections(self, parsed: ParsedArticle):
+        make_metadata = MetadataFactory(self.metadata, source=self.file_name, doi=parsed.doi, title=parsed.title)
+        for sub_titles, content in parsed.sections:
+            if sub_titles == TB:
                 yield Document(
-                    page_content=child.text.strip('\n '),
-                    metadata=dict(self.metadata(source=self.file_name, doi=doi, sub_titles='Abstract', title=title)),
+                    page_content=content,
+                    metadata=make_metadata(sub_titles=TB)
                 )
-
-    def get_sections(self, soup: bs, title: str, doi: str):
-        title_hierarchy = ["" for _ in range(len(HEADING_TAGS))] # initialize correspond title for each heading tag
-        for child in soup.find(id='sections'):
-            if child.name in HEADING_TAGS:
-                title_index = HEADING_TAGS.index(child.name)
-                title_hierarchy[title_index] = child.text.strip('\n ')
-                title_hierarchy[title_index + 1:] = [""] * (len(HEADING_TAGS) - title_index - 1)
-            elif child.name == 'p':
-                sub_titles = '/'.join(filter(None, title_hierarchy))
-                chunks = self.chunk_text(child.text.strip('\n '))
-                for chunk in chunks:
-                    yield Document(
-                        page_content=chunk,
-                        metadata=dict(self.metadata(source=self.file_name, doi=doi, sub_titles=sub_titles, title=title))
-                    )
-            elif child.name == 'table':
-                table_content = parse_html_table_to_json(str(child))
+                continue
+            for chunk in self.chunk_text(content):
                 yield Document(
-                    page_content=table_content,
-                    metadata=dict(self.metadata(source=self.file_name, doi=doi, sub_titles=TB, title=title))
+                    page_content=chunk,
+                    metadata=make_metadata(sub_titles=sub_titles)
                 )
 
 
@@ -160,32 +241,7 @@ class ArticleLoader(Loader):
         Chunking the text more than 400 tokens, meanwhile, prevent generating small chunks less than 200 tokens.
         The range of tokens per chunk is 200 - 600.
         """
-        if len(encoding.encode(text)) <= 400:
-            return [text]
-        sentences = nltk.sent_tokenize(text)
-        token_per_sent = [len(encoding.encode(sent)) for sent in sentences]
-        chunked_texts = []
-        accumulate_token = 0
-        next_start_i = 0
-        for i, token in enumerate(token_per_sent):
-            if i == len(token_per_sent) - 1:
-                chunked_texts.append(' '.join(sentences[next_start_i:]))
-                break
-            accumulate_token += token
-            token_left = sum(
-                token_per_sent[i:]
-            )   # yes, I intend to keep this token in the result
-
-            if accumulate_token <= 400:
-                continue
-            if token_left >= 200:
-                chunked_texts.append(' '.join(sentences[next_start_i:i]))
-                next_start_i = i
-                accumulate_token = token
-            else:
-                chunked_texts.append(' '.join(sentences[next_start_i:]))
-                break
-        return chunked_texts
+        return chunker.sentence_chunks(text, max_tokens=400, min_tokens=200)
 
 
 class FullTextLoader(Loader):
@@ -193,74 +249,48 @@ class FullTextLoader(Loader):
     include_table = True
     max_token = 5000
 
-    def __init__(self, file_path: str):
-        super().__init__(file_path)
+    def __init__(self, file_path: str, cache: Optional[ParseCache] = None):
+        super().__init__(file_path, cache)
         self.file_name = file_path.split(os.sep)[-1]
         self.title = ''
-        self.metadata = create_model('MetaData', source=(str, ...), doi=(str, ...), title=(str, ...), type_=(str, ...))
+        self.metadata = FullTextMetaData
     
     def lazy_load(self) -> Iterator[Document]:
         """when I write this, I know I should write load function instead, but I want to keep the interface consistentency"""
-        with open(self.file_path, encoding='utf8') as file:
-            doc = file.read()
-        soup = bs(doc, 'html.parser')
-        title = soup.find('title').text.strip('\n ')
-        self.title = title
-        doi = soup.head.p.a.text.strip('\n ')
-
-        if self.include_table:
-            for tag in soup.find_all(TB):
-                table_content = parse_html_table_to_json(str(tag))                
-                yield Document(page_content=table_content, metadata=dict(self.metadata(source=self.file_name, doi=doi, title=title, type_=TB)))
-
-        tags = soup.find_all(TB)
-        if tags:
-            for tag in tags:
-                tag.decompose()
-
-        text = soup.body.get_text(separator='\n', strip=True)
-        chunks = self.ensure_safe_len(text)
-        for chunk in chunks:
-            yield Document(page_content=chunk, metadata=dict(self.metadata(source=self.file_name, doi=doi, title=title, type_='text')))
+        yield from self.get_documents(self.parse())
 
     async def alazy_load(self) -> AsyncIterator[Document]:
-        async with aiofiles.open(self.file_path, encoding='utf8') as file:
-            doc = await file.read()
-        soup = bs(doc, 'html.parser')
-        title = soup.find('title').text.strip('\n ')
-        self.title = title
-        doi = soup.head.p.a.text.strip('\n ')
+        for document in self.get_documents(await self.aparse()):
+            yield document
 
-        if self.include_table:
-            for tag in soup.find_all(TB):
-                table_content = parse_html_table_to_json(str(tag))
-                yield Document(page_content=table_content, metadata=dict(self.metadata(source=self.file_name, doi=doi, title=title, type_=TB)))
+    def get_documents(self, parsed: ParsedArticle) -> Iterator[Document]:
+        assert parsed.text is not None, f'no body in {self.file_path}'
+        self.title = parsed.title
+        make_metadata = MetadataFactory(self.metadata, source=self.file_name, doi=parsed.doi, title=parsed.title)
 
-        tags = soup.find_all(TB)
-        if tags:
-            for tag in tags:
-                tag.decompose()
+        if self.include_table:
+            for table_content in parsed.tables:
+                yield Document(page_content=table_content, metadata=make_metadata(type_=TB))
 
-        text = soup.body.get_text(separator='\n', strip=True)
-        chunks = self.ensure_safe_len(text)
+        chunks = self.ensure_safe_len(parsed.text)
         for chunk in chunks:
-            yield Document(page_content=chunk, metadata=dict(self.metadata(source=self.file_name, doi=doi, title=title, type_='text')))
+            yield Document(page_content=chunk, metadata=make_metadata(type_='text'))
     
     def ensure_safe_len(self, text):
         # TODO consolidate this to avoid of possibly context losing
-        text_encoding = encoding.encode(text)
-        next_start = 0
-        while True:
-            chunk = encoding.decode(text_encoding[next_start: next_start + self.max_token])
-            if len(encoding.encode(chunk)) < self.max_token:
-                yield self.add_title(chunk)
-                return
-            chunk_with_break = chunk.rsplit('\n', 1)[0]
-            chunk_with_b_len = len(encoding.encode(chunk_with_break))
-            next_start += chunk_with_b_len
-            yield self.add_title(chunk_with_break)
+        for chunk in chunker.line_chunks(text, self.max_token):
+            yield self.add_title(chunk)
     
     def add_title(self, text):
         return f'Title: {self.title}\n{text}'
 
+
+def choose_loader(file_path, full_text: bool, cache: Optional[ParseCache] = None) -> Loader:
+    """loader of an article, parsed once into `cache`, by default the one at `parse_cache.DEFAULT_CACHE_DIR`"""
+    # TODO: based on file name
+    cache = cache or get_parse_cache()
+    if full_text: # return full text loader
+        return FullTextLoader(file_path, cache)
+    return ArticleLoader(file_path, cache)
+
 # endregion
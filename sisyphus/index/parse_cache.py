@@ -0,0 +1,92 @@
+# -*- coding:utf-8 -*-
+'''
+@File    :   parse_cache.py
+@Time    :   2026/10/18 00:12:31
+@Author  :   soike
+@Version :   1.0
+@Contact :   luvusoike@icloud.com
+@License :   MIT Lisence
+@Desc    :   parse-once cache of processed articles, shared by the loaders so an article goes through BeautifulSoup once
+'''
+
+import functools
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import zlib
+from typing import NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.path.join('db', 'parse_cache')
+VERSION = 1 # bump when the extraction changes, older entries are parsed again
+
+
+class ParsedArticle(NamedTuple):
+    """what the loaders extract from a processed article, before chunking"""
+    title: str
+    doi: str
+    abstract: Optional[list[str]] # paragraphs, None if the article has no abstract
+    sections: Optional[list[tuple[str, str]]] # (sub_titles, paragraph) in order, tables as ('table', csv)
+    tables: list[str] # csv of every table of the article
+    text: Optional[str] # body text without tables, one line per element, None if the article has no body
+
+
+class ParseCache:
+    """
+    One zlib compressed json file per article, named by the hash of its absolute path and keyed by the mtime and size of
+    the article when it was parsed, so a modified article is parsed again and overwrites its entry.
+    Entries are written to a temporary file then renamed, processes can share the directory.
+    """
+
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(file_path: str) -> list:
+        stat = os.stat(file_path)
+        return [VERSION, stat.st_mtime_ns, stat.st_size]
+
+    def entry_path(self, file_path: str) -> str:
+        name = hashlib.blake2b(os.path.abspath(file_path).encode('utf-8'), digest_size=16).hexdigest()
+        return os.path.join(self.directory, name + '.json.z')
+
+    def get(self, file_path: str) -> Optional[ParsedArticle]:
+        try:
+            with open(self.entry_path(file_path), 'rb') as file:
+                entry = json.loads(zlib.decompress(file.read()))
+        except (OSError, ValueError, zlib.error): # missing or torn entry
+            self.misses += 1
+            return None
+        if entry['key'] != self.key(file_path) or entry['path'] != os.path.abspath(file_path):
+            self.misses += 1
+            return None
+        self.hits += 1
+        title, doi, abstract, sections, tables, text = entry['article']
+        return ParsedArticle(title, doi, abstract, [tuple(s) for s in sections] if sections is not None else None, tables, text)
+
+    def put(self, file_path: str, key: list, article: ParsedArticle):
+        """store `article` parsed from `file_path` whose key was taken before reading it"""
+        data = zlib.compress(json.dumps(
+            {'path': os.path.abspath(file_path), 'key': key, 'article': list(article)}, ensure_ascii=False
+        ).encode('utf-8'))
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(data)
+            os.replace(tmp_path, self.entry_path(file_path))
+        except OSError as e:
+            logger.warning(f'failed to cache {file_path}: {e}')
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+@functools.lru_cache(maxsize=None)
+def get_parse_cache(directory: str = DEFAULT_CACHE_DIR) -> ParseCache:
+    """cache shared by the loaders of this process"""
+    return ParseCache(directory)
@@ -0,0 +1,256 @@
+# -*- coding:utf-8 -*-
+'''
+@File    :   plaindb.py
+@Time    :   2026/10/17 23:10:12
+@Author  :   soike
+@Version :   1.0
+@Contact :   luvusoike@icloud.com
+@License :   MIT Lisence
+@Desc    :   build the plain text database, files are parsed by a process pool and their documents written in batches by the parent.
+             A hash of every indexed file is kept, so a re-run only re-indexes new or changed files and drops the rows of files removed from the folder.
+'''
+
+import hashlib
+import logging
+import multiprocessing
+import os
+from collections import Counter
+from typing import Optional, Sequence
+
+from sqlmodel import Field, select
+from sqlalchemy import delete, insert, inspect, text
+from tqdm import tqdm
+
+from sisyphus.chain.database import DocDB, MAX_VARIABLES, get_new_sql_base
+from .loader import choose_loader
+from .parse_cache import ParseCache
+
+logger = logging.getLogger(__name__)
+
+
+NewBase = get_new_sql_base()
+class IndexedFile(NewBase, table=True):
+    __tablename__ = 'indexed_files'
+    source: str = Field(..., primary_key=True) # file name, the source field of its documents
+    size: int
+    mtime_ns: int
+    sha256: str
+    full_text: bool # loader used, documents differ between the two
+    path: Optional[str] = None # absolute path, rows of removed files are only deleted under the folder indexed
+
+
+def file_digest(file_path: str, block_size: int = 1 << 20) -> str:
+    sha = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        while block := file.read(block_size):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def load_file(task: tuple[str, bool, Optional[str], Optional[ParseCache]]) -> dict:
+    """
+    hash and parse one file in a worker, parsing is skipped if the hash equals `known_sha256`
+
+    Returns a record for the parent, `items` are the (text, metadata) pairs of its documents
+    """
+    file_path, full_text, known_sha256, cache = task
+    stat = os.stat(file_path)
+    record = {
+        'source': os.path.basename(file_path), 'file_path': file_path, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+        'sha256': None, 'full_text': full_text, 'status': 'failed', 'items': [], 'error': None,
+    }
+    try:
+        record['sha256'] = file_digest(file_path)
+        if record['sha256'] == known_sha256: # touched but not modified
+            record['status'] = 'unchanged'
+            return record
+        loader = choose_loader(file_path, full_text, cache)
+        record['items'] = [(document.page_content, document.metadata) for document in loader.lazy_load()]
+        record['status'] = 'indexed'
+    except Exception as e:
+        record['error'] = f'{type(e).__name__}: {e}'
+    return record
+
+
+def file_record(record: dict) -> dict:
+    values = {key: record[key] for key in ('source', 'size', 'mtime_ns', 'sha256', 'full_text')}
+    values['path'] = os.path.abspath(record['file_path'])
+    return values
+
+
+def migrate_indexed_files(engine):
+    """add the path column to an `indexed_files` table created before it existed"""
+    columns = {column['name'] for column in inspect(engine).get_columns(IndexedFile.__tablename__)}
+    if 'path' not in columns:
+        with engine.begin() as conn:
+            conn.execute(text(f'ALTER TABLE {IndexedFile.__tablename__} ADD COLUMN path VARCHAR'))
+
+
+class PlainIndexer:
+    """
+    Parallel and incremental indexing of files into a `DocDB`
+
+    Parameters
+    ----------
+    db : DocDB
+        the database, `indexed_files` table is created next to its documents
+    full_text : bool, optional
+        use `FullTextLoader` instead of `ArticleLoader`, by default False
+    num_workers : int, optional
+        parsing processes, 1 parses in this process, by default 1
+    incremental : bool, optional
+        skip files unchanged since the last run, otherwise every file is re-indexed, by default True
+    batch_size : int, optional
+        documents written per transaction, by default 500
+    chunk_size : int, optional
+        files sent to a worker at a time, by default 8
+    cache : ParseCache, optional
+        parsed article cache of the loaders, by default the one at `parse_cache.DEFAULT_CACHE_DIR`
+    folder : str, optional
+        the folder `file_paths` are listed from, documents of files indexed from it before and gone now are deleted.
+        Nothing is deleted if not given, files of other folders are never touched
+    """
+
+    def __init__(
+        self,
+        db: DocDB,
+        full_text: bool = False,
+        num_workers: int = 1,
+        incremental: bool = True,
+        batch_size: int = 500,
+        chunk_size: int = 8,
+        cache: Optional[ParseCache] = None,
+        folder: Optional[str] = None,
+    ):
+        self.db = db
+        self.full_text = full_text
+        self.num_workers = num_workers
+        self.incremental = incremental
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+        self.cache = cache
+        self.folder = folder
+        self._conn = None
+        self._pending: list[dict] = []
+        self._pending_docs = 0
+
+    def create_schema(self):
+        self.db.create_db()
+        NewBase.metadata.create_all(self.db.engine)
+        migrate_indexed_files(self.db.engine)
+
+    def indexed_files(self) -> dict[str, IndexedFile]:
+        with self.db.engine.connect() as conn:
+            return {row.source: row for row in conn.execute(select(IndexedFile))}
+
+    def plan(self, file_paths: Sequence[str]) -> tuple[list[tuple], list[str], int]:
+        """tasks of the files to load, sources indexed from `folder` before but gone from it, and the number of skipped files"""
+        known = self.indexed_files()
+        tasks = []
+        skipped = 0
+        for file_path in file_paths:
+            record = known.get(os.path.basename(file_path))
+            if record is None or record.full_text != self.full_text or not self.incremental:
+                tasks.append((file_path, self.full_text, None, self.cache))
+                continue
+            stat = os.stat(file_path)
+            if (stat.st_size, stat.st_mtime_ns) == (record.size, record.mtime_ns):
+                skipped += 1
+            else:
+                tasks.append((file_path, self.full_text, record.sha256, self.cache))
+        stale = []
+        if self.folder is not None:
+            folder = os.path.abspath(self.folder)
+            current = {os.path.basename(file_path) for file_path in file_paths}
+            stale = [
+                source for source, record in known.items()
+                if source not in current and record.path is not None and os.path.dirname(record.path) == folder
+            ]
+        return tasks, stale, skipped
+
+    def delete(self, sources: Sequence[str]):
+        """drop documents and records of `sources`"""
+        sources = list(sources)
+        self.db.delete_sources(sources)
+        with self.db.engine.begin() as conn:
+            for i in range(0, len(sources), MAX_VARIABLES):
+                conn.execute(delete(IndexedFile.__table__).where(IndexedFile.__table__.c.source.in_(sources[i: i + MAX_VARIABLES])))
+
+    def add(self, record: dict):
+        self._pending.append(record)
+        self._pending_docs += len(record['items'])
+        if self._pending_docs >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """replace documents of the pending files, then update their records. A crash in between leaves the old
+        record, so the file is re-indexed by the next run"""
+        records, self._pending, self._pending_docs = self._pending, [], 0
+        if not records:
+            return
+        if self._conn is None:
+            self._conn = self.db.engine.connect()
+        indexed = [record for record in records if record['status'] == 'indexed']
+        self.db.replace_many(
+            [record['source'] for record in indexed],
+            [item for record in indexed for item in record['items']],
+            conn=self._conn,
+        )
+        with self._conn.begin():
+            self._conn.execute(
+                insert(IndexedFile.__table__).prefix_with('OR REPLACE'),
+                [file_record(record) for record in records],
+            )
+
+    def close(self):
+        self.flush()
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def run(self, file_paths: Sequence[str]) -> Counter:
+        """index `file_paths`, return the number of files per status"""
+        self.create_schema()
+        tasks, stale, skipped = self.plan(file_paths)
+        counts = Counter(skipped=skipped, removed=len(stale))
+        if stale:
+            self.delete(stale)
+        logger.info(f'{len(tasks)} files to index, {skipped} unchanged, {len(stale)} removed')
+
+        if self.num_workers > 1 and len(tasks) > 1:
+            pool = multiprocessing.Pool(self.num_workers)
+            records = pool.imap_unordered(load_file, tasks, chunksize=self.chunk_size)
+        else:
+            pool = None
+            records = map(load_file, tasks)
+        try:
+            for record in tqdm(records, total=len(tasks)):
+                counts[record['status']] += 1
+                if record['status'] == 'failed':
+                    logger.error(f"Failed to index {record['file_path']}, Error: {record['error']}")
+                    continue
+                self.add(record)
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+            self.close()
+        logger.info(dict(counts))
+        return counts
+
+
+def index_files(
+    file_paths: Sequence[str],
+    db: DocDB,
+    full_text: bool = False,
+    num_workers: int = 1,
+    incremental: bool = True,
+    batch_size: int = 500,
+    cache: Optional[ParseCache] = None,
+    folder: Optional[str] = None,
+) -> Counter:
+    indexer = PlainIndexer(
+        db, full_text=full_text, num_workers=num_workers, incremental=incremental, batch_size=batch_size, cache=cache,
+        folder=folder,
+    )
+    return indexer.run(file_paths)
@@ -1,13 +1,18 @@
 """
 main api: converter
 """
+import bisect
+import functools
 import json
 import os
 import re
-from typing import Generator
+from typing import Generator, Optional
 
+import numpy as np
 import tiktoken
 
+from sisyphus.index.chunker import token_byte_lengths
+
 
 tokenizer = tiktoken.get_encoding("cl100k_base")
 sci_notation = ["ca.", "calc.", "cal.", "no.", "e.g.", "i.e."]
@@ -22,23 +27,119 @@ def detect_sci_dot(after_dot: str, before_dot: str):
         return False
 
     
+# notations of sci_notation_pattern, all end with a dot, matched case insensitively on ascii bytes like re.I does
+SCI_NOTATIONS = [notation.encode() for notation in sci_notation]
+# non-ascii letters matching sci_notation_pattern under re.I, the bytes matching misses them
+CASE_FOLDED_I = (b'\xc4\xb0', b'\xc4\xb1')
+WORD_CHAR = re.compile(r"\w")
+
+
+@functools.lru_cache(maxsize=None)
+def token_starts_word(encoding: tiktoken.Encoding) -> np.ndarray:
+    """whether every token of the vocabulary decodes to a text starting with a word character, built once per encoding"""
+    starts = np.zeros(encoding.n_vocab, dtype=bool)
+    for token in range(encoding.n_vocab):
+        try:
+            data = encoding.decode_single_token_bytes(token)
+        except KeyError: # holes of the vocabulary
+            continue
+        if data and data[0] < 0x80:
+            starts[token] = data[:1].isalnum() or data[:1] == b'_'
+        elif data:
+            starts[token] = WORD_CHAR.match(data.decode('utf-8', errors='replace')) is not None
+    return starts
+
+
+def sci_notation_spans(data: bytes, dots: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """(starts, ends) byte spans of every notation in `data`, overlapping ones included, sorted by start"""
+    text = np.frombuffer(data, dtype=np.uint8)
+    dots = dots[dots >= 2]
+    # ascii case folding: a letter matches itself with the 0x20 bit set, every notation has a letter before its last dot
+    before = text[dots - 1] | 0x20
+    starts = []
+    for notation in SCI_NOTATIONS:
+        ends = dots[(before == notation[-2]) & (dots >= len(notation) - 1)] # index of the last dot of the notation
+        for i in range(2, len(notation)):
+            char = notation[-1 - i]
+            found = text[ends - i]
+            ends = ends[(found | 0x20) == char] if char != 46 else ends[found == char]
+        starts.append(ends - len(notation) + 1)
+    lengths = np.repeat([len(notation) for notation in SCI_NOTATIONS], [len(s) for s in starts])
+    starts = np.concatenate(starts)
+    order = np.argsort(starts, kind='stable')
+    return starts[order], (starts + lengths)[order]
+
+
+def sentence_end_tokens(tokens: list[int], data: Optional[bytes] = None) -> list[int]:
+    """
+    Every j for which `create_chunks` accepts tokens[i:j] as ending a sentence, in order.
+    It is the same test as decoding the chunk and calling `detect_sci_dot`, made with array operations over the text:
+    decoded text ends with '.' exactly when the last byte of token j-1 is '.', the token after it starts with a word
+    character by a table over the vocabulary, and the 4 tokens before j contain a scientific notation when a notation
+    span lies within their bytes. `data` is the utf-8 text of `tokens` if known, decoded otherwise.
+    """
+    if data is None:
+        data = tokenizer.decode_bytes(tokens)
+    token_ids = np.fromiter(tokens, dtype=np.int64, count=len(tokens))
+    offsets = np.concatenate(([0], np.cumsum(token_byte_lengths(tokenizer)[token_ids])))
+
+    # token boundaries right after a dot
+    dots = np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == 46)
+    candidates = np.searchsorted(offsets, dots + 1)
+    candidates = candidates[offsets[np.minimum(candidates, len(tokens))] == dots + 1]
+
+    if any(letter in data for letter in CASE_FOLDED_I):
+        return [j for j in candidates.tolist() if _is_sentence_end(tokens, j)]
+
+    inner = candidates < len(tokens) # the end of text is always accepted
+    keep = ~inner
+    checked = candidates[inner]
+    keep[inner] = ~token_starts_word(tokenizer)[token_ids[checked]]
+    # notation within the 4 tokens before j, starts of texts shorter than 4 tokens are decoded
+    starts, ends = sci_notation_spans(data, dots)
+    window = keep & inner & (candidates >= 4)
+    if len(starts) and window.any():
+        # smallest notation end among the spans starting in the window
+        min_ends = np.minimum.accumulate(np.append(ends, np.iinfo(np.int64).max)[::-1])[::-1]
+        first = np.searchsorted(starts, offsets[candidates[window] - 4], side='left')
+        keep[window] = min_ends[first] > offsets[candidates[window]]
+    short = np.flatnonzero(keep & inner & (candidates < 4))
+    for i in short.tolist():
+        keep[i] = _is_sentence_end(tokens, int(candidates[i]))
+    return candidates[keep].tolist()
+
+
+def _is_sentence_end(tokens: list[int], j: int) -> bool:
+    """the check `create_chunks` used to run on every backward step"""
+    if not tokenizer.decode(tokens[:j]).endswith('.'):
+        return False
+    return j == len(tokens) or not detect_sci_dot(tokenizer.decode(tokens[j:j+1]), tokenizer.decode(tokens[j-4: j]))
+
+
 # Split a text into smaller chunks of size n, preferably ending at the end of a sentence
 def create_chunks(text, n):
     """Returns successive n-sized chunks from provided text."""
     tokens = tokenizer.encode(text)
+    try:
+        data = text.encode('utf-8') # encoding is lossless, the text is the decoded tokens
+    except UnicodeEncodeError: # lone surrogates are replaced by the encoder
+        data = None
+    yield from chunk_tokens(tokens, n, data)
+
+
+def chunk_tokens(tokens: list[int], n: int, data: Optional[bytes] = None):
+    """`create_chunks` of encoded text, `data` is its utf-8 text if known"""
+    ends = sentence_end_tokens(tokens, data)
     i = 0
     while i < len(tokens):
         # Find the nearest end of sentence within a range of 0.5 * n and 1.5 * n tokens
         j = min(i + int(1.5 * n), len(tokens))
-        while j > i + int(0.5 * n):
-            # Decode the tokens and check for full stop or newline
-            chunk = tokenizer.decode(tokens[i:j])
-            dot_of_science = False if j == len(tokens) else detect_sci_dot(tokenizer.decode(tokens[j:j+1]), tokenizer.decode(tokens[j-4: j])) # judge whether the dot is the regular one. return False if it is. -4: comply with sci_notation_pattern.
-            if chunk.endswith('.') and not dot_of_science:
-                break
-            j -= 1
+        low = i + int(0.5 * n)
+        if j > low:
+            k = bisect.bisect_right(ends, j) - 1
+            j = ends[k] if k >= 0 and ends[k] > low else low
         # If no end of sentence found, use n tokens as the chunk size
-        if j == i + int(0.5 * n):
+        if j == low:
             j = min(i + n, len(tokens))
         yield tokens[i:j]
         i = j
@@ -1,4 +1,7 @@
 from .chat_patch import ChatOpenAIThrottle
+from .response_cache import ResponseCache
+from .batch_store import BatchStore, BatchPending
 from .embed_patch import OpenAIEmbeddingThrottle
+from .embedding_cache import EmbeddingCache, get_embedding_cache
 from .httpx_hooker import achat_httpx_client, aembed_httpx_client
 from .chroma_patch import AsyncChroma
\ No newline at end of file
@@ -0,0 +1,127 @@
+# -*- coding:utf-8 -*-
+'''
+@File    :   batch_store.py
+@Time    :   2026/10/17 15:02:18
+@Author  :   soike
+@Version :   1.0
+@Contact :   luvusoike@icloud.com
+@License :   MIT Lisence
+@Desc    :   requests waiting for the OpenAI Batch API and responses landed from it, backed by a local sqlite file
+'''
+
+import json
+import os
+import sqlite3
+import threading
+import logging
+from typing import Optional
+
+from openai.lib._parsing._completions import type_to_response_format_param
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STORE_PATH = os.path.join('db', 'batch_store.sqlite')
+
+
+class BatchPending(BaseException):
+    """
+    Raised by a chat model in batch mode when the response of a request has not landed yet.
+    Derived from BaseException so that `except Exception` inside chain functions does not swallow it,
+    the article is retried in the next round instead of being written with partial results.
+    """
+
+
+def to_batch_body(payload: dict) -> dict:
+    """json body of a batch request from the payload of chat model, pydantic `response_format` is converted to json schema"""
+    body = {k: v for k, v in payload.items() if k not in ('stream', 'stream_options')}
+    if isinstance(body.get('response_format'), type):
+        body['response_format'] = type_to_response_format_param(body['response_format'])
+    return body
+
+
+class BatchStore:
+    """
+    Requests are keyed by the same content hash as `ResponseCache`, so a re-run of the chain finds its responses.
+        - `requests`: body of each request, `batch_id` is set once submitted
+        - `responses`: response body (or error) of each request
+    """
+
+    def __init__(self, path: str = DEFAULT_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS requests ('
+            'key TEXT PRIMARY KEY, body TEXT NOT NULL, batch_id TEXT, attempts INTEGER NOT NULL DEFAULT 0)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS ix_requests_batch_id ON requests (batch_id)')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, body TEXT NOT NULL)')
+
+    def add_request(self, key: str, body: dict):
+        with self._lock:
+            self._conn.execute('INSERT OR IGNORE INTO requests (key, body) VALUES (?, ?)', (key, json.dumps(body, ensure_ascii=False)))
+
+    def get_response(self, key: str) -> Optional[dict]:
+        """response body, or {"error": ...} if the request failed after all attempts"""
+        with self._lock:
+            row = self._conn.execute('SELECT body FROM responses WHERE key = ?', (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def unsubmitted(self, limit: int) -> list[tuple[str, dict]]:
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT key, body FROM requests WHERE batch_id IS NULL '
+                'AND key NOT IN (SELECT key FROM responses) LIMIT ?', (limit,)
+            ).fetchall()
+        return [(key, json.loads(body)) for key, body in rows]
+
+    def _executemany(self, sql: str, rows: list[tuple]):
+        """one transaction for all rows, the connection is in autocommit mode"""
+        with self._lock:
+            self._conn.execute('BEGIN')
+            try:
+                self._conn.executemany(sql, rows)
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+
+    def mark_submitted(self, keys: list[str], batch_id: str):
+        self._executemany(
+            'UPDATE requests SET batch_id = ?, attempts = attempts + 1 WHERE key = ?',
+            [(batch_id, key) for key in keys]
+        )
+
+    def in_flight(self) -> list[str]:
+        """ids of submitted batches which still have requests without response, including those of previous runs"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT DISTINCT batch_id FROM requests WHERE batch_id IS NOT NULL '
+                'AND key NOT IN (SELECT key FROM responses)'
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def batch_keys(self, batch_id: str) -> list[str]:
+        with self._lock:
+            rows = self._conn.execute('SELECT key FROM requests WHERE batch_id = ?', (batch_id,)).fetchall()
+        return [row[0] for row in rows]
+
+    def attempts(self, key: str) -> int:
+        with self._lock:
+            row = self._conn.execute('SELECT attempts FROM requests WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else 0
+
+    def save_responses(self, responses: list[tuple[str, dict]]):
+        self._executemany(
+            'INSERT OR REPLACE INTO responses (key, body) VALUES (?, ?)',
+            [(key, json.dumps(body, ensure_ascii=False)) for key, body in responses]
+        )
+
+    def requeue(self, keys: list[str]):
+        """submit again in the next batch"""
+        self._executemany('UPDATE requests SET batch_id = NULL WHERE key = ?', [(key,) for key in keys])
+
+    def close(self):
+        self._conn.close()
@@ -10,23 +10,27 @@
 '''
 
 import os
+import asyncio
 import logging
 from typing import Any, Coroutine, List, Optional
 
+from openai import NOT_GIVEN
+from openai.types.chat import ChatCompletion
+from openai.lib._parsing._completions import parse_chat_completion
 from langchain_openai import ChatOpenAI
-from langchain_core.callbacks import AsyncCallbackManagerForLLMRun
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
 from langchain_core.messages import BaseMessage
 from langchain_core.outputs import ChatResult
 from langchain_core.outputs.chat_result import ChatResult
 from langchain_core.language_models.chat_models import agenerate_from_stream
 
 from sisyphus.patch.throttle import (
-    chat_throttler,
-    chat_waiter,
-    chat_throttler_4o,
-    chat_waiter_4o,
-    ChatThrottler
+    rate_scheduler,
+    model_waiter,
+    Reservation,
 )
+from sisyphus.patch.response_cache import ResponseCache, make_cache_key
+from sisyphus.patch.batch_store import BatchStore, BatchPending, to_batch_body
 
 logger = logging.getLogger(__name__)
 
@@ -37,6 +41,11 @@ class ChatOpenAIThrottle(ChatOpenAI):
     """
     max_retries: int = 0
     """set default retry to zero, making sure that every request was managed by waiter"""
+    response_cache: Optional[ResponseCache] = None
+    """set to a `ResponseCache` to reuse responses of identical requests, cache hits skip the waiter"""
+    batch_store: Optional[BatchStore] = None
+    """set to a `BatchStore` to run in batch mode: requests are recorded for the OpenAI Batch API instead of sent,
+    see `sisyphus.processor.batch_processor`"""
     # _chat_throttler: ChatThrottler = chat_throttler
     # _chat_throttler_4o: ChatThrottler = chat_throttler_4o
 
@@ -47,15 +56,90 @@ class ChatOpenAIThrottle(ChatOpenAI):
         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
         **kwargs: Any,
     ) -> ChatResult:
-        waiter = self.get_waiter()
-        async with waiter(consumed_tokens=self.get_num_tokens_from_messages(messages)):
-            return await super()._agenerate(messages, stop, run_manager, **kwargs)
-            
-    def get_waiter(self):
-        if self.model_name == 'gpt-3.5-turbo':
-            return chat_waiter
-        elif self.model_name == 'gpt-4o':
-            return chat_waiter_4o
-        else:
-            logger.info('model not belong to gpt-3.5-turbo/gpt-4o, fallback to gpt-3.5-turbo limit setting')
-            return chat_waiter # For compatible, treat other models as the same limiting as 3.5
+        if self.response_cache is None:
+            return await self._athrottled_generate(messages, stop, run_manager, **kwargs)
+        key = self.get_cache_key(messages, stop, **kwargs)
+        cached = await asyncio.to_thread(self.response_cache.lookup, key)
+        if cached is not None:
+            return cached
+        result = await self._athrottled_generate(messages, stop, run_manager, **kwargs)
+        await asyncio.to_thread(self.response_cache.update, key, result)
+        return result
+
+    async def _athrottled_generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        if self.batch_store is not None: # batch requests have their own limits, not throttled
+            return await asyncio.to_thread(self._batch_generate, messages, stop, **kwargs)
+        async with model_waiter(self.model_name, self.get_num_tokens_from_messages(messages)) as reservation:
+            result = await super()._agenerate(messages, stop, run_manager, **kwargs)
+        self.settle(reservation, result)
+        return result
+
+    def _throttled_generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        if self.batch_store is not None:
+            return self._batch_generate(messages, stop, **kwargs)
+        reservation = rate_scheduler.acquire(self.model_name, self.get_num_tokens_from_messages(messages))
+        try:
+            result = super()._generate(messages, stop, run_manager, **kwargs)
+        except Exception:
+            reservation.release()
+            raise
+        self.settle(reservation, result)
+        return result
+
+    def _batch_generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, **kwargs: Any) -> ChatResult:
+        """build the result from the landed batch response, or record the request and raise `BatchPending`"""
+        payload = self._get_request_payload(messages, stop=stop, **kwargs)
+        key = make_cache_key(payload)
+        body = self.batch_store.get_response(key)
+        if body is None:
+            self.batch_store.add_request(key, to_batch_body(payload))
+            raise BatchPending(key)
+        if body.get('error'):
+            raise ValueError(body['error'])
+        if 'response_format' in payload: # same as the `beta.chat.completions.parse` branch of langchain
+            body = parse_chat_completion(
+                response_format=payload['response_format'],
+                input_tools=NOT_GIVEN,
+                chat_completion=ChatCompletion.model_validate(body),
+            )
+        return self._create_chat_result(body)
+
+    @staticmethod
+    def settle(reservation: Reservation, result: ChatResult):
+        """correct the reserved tokens with the real usage, headers are handled by the httpx hook"""
+        usage = (result.llm_output or {}).get('token_usage')
+        reservation.settle(usage=usage)
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        if self.response_cache is None:
+            return self._throttled_generate(messages, stop, run_manager, **kwargs)
+        key = self.get_cache_key(messages, stop, **kwargs)
+        cached = self.response_cache.lookup(key)
+        if cached is not None:
+            return cached
+        result = self._throttled_generate(messages, stop, run_manager, **kwargs)
+        self.response_cache.update(key, result)
+        return result
+
+    def get_cache_key(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, **kwargs: Any) -> str:
+        """key on the request payload, which contains model, temperature, rendered messages and response_format/tools bound by `with_structured_output`"""
+        payload = self._get_request_payload(messages, stop=stop, **kwargs)
+        return make_cache_key(payload)
@@ -11,16 +11,14 @@
 
 import os
 import logging
-from typing import List
+from typing import List, Optional
 
 import tiktoken
+from pydantic import ConfigDict
 from langchain_openai import OpenAIEmbeddings
 
-from sisyphus.patch.throttle import (
-    embed_throttler,
-    embed_waiter,
-    EmbedThrottler
-)
+from sisyphus.patch.throttle import model_waiter
+from sisyphus.patch.embedding_cache import EmbeddingCache
 
 
 logger = logging.getLogger(__name__)
@@ -31,13 +29,53 @@ class OpenAIEmbeddingThrottle(OpenAIEmbeddings):
     """
     Patch langchain embedding, use anywhere else inside this project as substitution of `OpenAIEmbedding`.
     """
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
     max_retries: int = 0
-    # _embed_throttler: EmbedThrottler = embed_throttler
+    embedding_cache: Optional[EmbeddingCache] = None
+    """set to an `EmbeddingCache` to only send texts which have not been embedded by this model before,
+    only takes effect with `check_embedding_ctx_length=True` (default), as the throttle does"""
+    # _embed_throttler: ChatThrottler = embed_throttler
 
     async def _aget_len_safe_embeddings(self, texts: List[str], *, engine: str, chunk_size: int | None = None) -> List[List[float]]:
-        async with embed_waiter(consumed_tokens=self.get_num_tokens(texts)):
+        if self.embedding_cache is None:
+            return await self._athrottled_embeddings(texts, engine=engine, chunk_size=chunk_size)
+        vectors, missed = self.embedding_cache.split(self.cache_name, texts)
+        if not missed:
+            return vectors.tolist()
+        missed_texts = [texts[i] for i in missed]
+        missed_vectors = await self._athrottled_embeddings(missed_texts, engine=engine, chunk_size=chunk_size)
+        self.embedding_cache.add(self.cache_name, missed_texts, missed_vectors)
+        return self._fill_missed(vectors, missed, missed_vectors)
+
+    async def _athrottled_embeddings(self, texts: List[str], *, engine: str, chunk_size: int | None = None) -> List[List[float]]:
+        """the waiter only counts tokens of the texts actually sent"""
+        async with model_waiter(self.model, self.get_num_tokens(texts)):
             return await super()._aget_len_safe_embeddings(texts, engine=engine, chunk_size=chunk_size)
 
+    def _get_len_safe_embeddings(self, texts: List[str], *, engine: str, chunk_size: int | None = None) -> List[List[float]]:
+        if self.embedding_cache is None:
+            return super()._get_len_safe_embeddings(texts, engine=engine, chunk_size=chunk_size)
+        vectors, missed = self.embedding_cache.split(self.cache_name, texts)
+        if not missed:
+            return vectors.tolist()
+        missed_texts = [texts[i] for i in missed]
+        missed_vectors = super()._get_len_safe_embeddings(missed_texts, engine=engine, chunk_size=chunk_size)
+        self.embedding_cache.add(self.cache_name, missed_texts, missed_vectors)
+        return self._fill_missed(vectors, missed, missed_vectors)
+
+    @property
+    def cache_name(self) -> str:
+        """vectors differ with model and requested dimensions"""
+        return self.model if self.dimensions is None else f'{self.model}-{self.dimensions}'
+
+    @staticmethod
+    def _fill_missed(vectors, missed: List[int], missed_vectors: List[List[float]]) -> List[List[float]]:
+        if vectors is None: # nothing cached for this model before
+            return missed_vectors
+        vectors[missed] = missed_vectors
+        return vectors.tolist()
+
     def get_num_tokens(self, texts: List[str]):
         """
         Get the total tokens of input
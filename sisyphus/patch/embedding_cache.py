@@ -0,0 +1,211 @@
+# -*- coding:utf-8 -*-
+'''
+@File    :   embedding_cache.py
+@Time    :   2026/10/17 11:03:47
+@Author  :   soike
+@Version :   1.0
+@Contact :   luvusoike@icloud.com
+@License :   MIT Lisence
+@Desc    :   disk-backed embedding cache, vectors live in a memory-mapped float32 array
+'''
+
+import functools
+import hashlib
+import os
+import re
+import threading
+import logging
+from contextlib import contextmanager
+from typing import Optional, Sequence
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError: # windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.path.join('db', 'embedding_cache')
+KEY_SIZE = 16 # bytes of blake2b digest per text
+INIT_CAPACITY = 1024
+
+
+def text_key(text: str) -> bytes:
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=KEY_SIZE).digest()
+
+
+@contextmanager
+def file_lock(path: str):
+    """exclusive lock between processes and between instances of one process, a no-op where fcntl is unavailable"""
+    with open(path, 'a+b') as f:
+        if fcntl is None:
+            yield
+            return
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class VectorStore:
+    """
+    Vectors of one embedding model.
+        - `<name>.f32`: int32 dimension header then a float32 matrix, one row per text, grows by doubling
+        - `<name>.keys`: text hashes appended in row order, row i of the matrix belongs to key i
+        - `<name>.lock`: held while rows are appended, the store may be shared by processes and cache instances
+    Keys appended by other writers are picked up before every lookup and append.
+    """
+
+    def __init__(self, directory: str, name: str):
+        self.vector_path = os.path.join(directory, name + '.f32')
+        self.key_path = os.path.join(directory, name + '.keys')
+        self.lock_path = os.path.join(directory, name + '.lock')
+        self.dim: Optional[int] = None
+        self.capacity = 0
+        self.array: Optional[np.memmap] = None
+        self.index: dict[bytes, int] = {}
+        self.n_rows = 0 # keys in the key file, may be more than the index if a key was written twice
+        self._refresh()
+
+    def _refresh(self):
+        """index keys appended since the last read and map the vector file again if it has grown"""
+        try:
+            key_bytes = os.path.getsize(self.key_path)
+        except OSError:
+            return
+        n_rows = key_bytes // KEY_SIZE # a torn last key is ignored
+        if n_rows > self.n_rows:
+            with open(self.key_path, 'rb') as f:
+                f.seek(self.n_rows * KEY_SIZE)
+                keys = f.read((n_rows - self.n_rows) * KEY_SIZE)
+            for row in range(self.n_rows, n_rows):
+                i = row - self.n_rows
+                self.index.setdefault(keys[i * KEY_SIZE: (i + 1) * KEY_SIZE], row)
+            self.n_rows = n_rows
+        if not self.n_rows:
+            return
+        if self.dim is None:
+            self.dim = int(np.fromfile(self.vector_path, dtype=np.int32, count=1)[0])
+        capacity = (os.path.getsize(self.vector_path) - 4) // (4 * self.dim)
+        if capacity != self.capacity:
+            self.capacity = capacity
+            self.array = self._open_memmap()
+
+    def _open_memmap(self):
+        return np.memmap(self.vector_path, dtype=np.float32, mode='r+', offset=4, shape=(self.capacity, self.dim))
+
+    def _reserve(self, n_rows: int):
+        """make sure there are `n_rows` rows in vector file, called with the lock held"""
+        if n_rows <= self.capacity:
+            return
+        new_capacity = max(INIT_CAPACITY, self.capacity)
+        while new_capacity < n_rows:
+            new_capacity *= 2
+        if self.array is not None:
+            self.array.flush()
+            self.array = None
+        if not os.path.exists(self.vector_path) or os.path.getsize(self.vector_path) < 4:
+            with open(self.vector_path, 'wb') as f:
+                f.write(np.int32(self.dim).tobytes()) # header: vector dimension
+        with open(self.vector_path, 'r+b') as f:
+            f.truncate(4 + new_capacity * self.dim * 4)
+        self.capacity = new_capacity
+        self.array = self._open_memmap()
+
+    def gather(self, keys: Sequence[bytes]) -> tuple[np.ndarray, np.ndarray]:
+        """return (rows, found), rows is -1 for the keys not in cache"""
+        self._refresh()
+        rows = np.fromiter((self.index.get(key, -1) for key in keys), dtype=np.int64, count=len(keys))
+        return rows, rows >= 0
+
+    def add(self, keys: Sequence[bytes], vectors: np.ndarray):
+        with file_lock(self.lock_path):
+            self._refresh() # rows appended by other writers are taken
+            new = {}
+            for key, vector in zip(keys, vectors):
+                if key not in self.index:
+                    new[key] = vector # duplicated texts in one batch only stored once
+            if not new:
+                return
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+            start = self.n_rows
+            self._reserve(start + len(new))
+            self.array[start: start + len(new)] = np.asarray(list(new.values()), dtype=np.float32)
+            self.array.flush()
+            # vectors are flushed before keys, a crash in between leaves unindexed rows which are overwritten later
+            with open(self.key_path, 'ab') as f:
+                f.truncate(start * KEY_SIZE) # drop a torn key of an interrupted writer
+                f.write(b''.join(new.keys()))
+            for i, key in enumerate(new, start):
+                self.index[key] = i
+            self.n_rows = start + len(new)
+
+
+class EmbeddingCache:
+    """
+    Embedding cache keyed by model name plus text hash, shared by every `OpenAIEmbeddingThrottle` which holds it.
+    Look up a batch with `split`, then write vectors of the missed texts back with `add`.
+    """
+
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        self._stores: dict[str, VectorStore] = {}
+        self._lock = threading.Lock()
+
+    def _store(self, model: str) -> VectorStore:
+        if model not in self._stores:
+            self._stores[model] = VectorStore(self.directory, re.sub(r'[^\w.-]', '_', model))
+        return self._stores[model]
+
+    def split(self, model: str, texts: Sequence[str]) -> tuple[Optional[np.ndarray], list[int]]:
+        """
+        Look up texts in one vectorized gather.
+
+        Returns
+        -------
+        tuple[Optional[np.ndarray], list[int]]
+            float32 matrix in the order of `texts` (rows of missed texts are left empty, None if nothing cached yet),
+            and indices of the missed texts
+        """
+        keys = [text_key(text) for text in texts]
+        with self._lock:
+            store = self._store(model)
+            rows, found = store.gather(keys)
+            missed = np.flatnonzero(~found).tolist()
+            self.hits += len(texts) - len(missed)
+            self.misses += len(missed)
+            if store.dim is None:
+                return None, missed
+            vectors = np.empty((len(texts), store.dim), dtype=np.float32)
+            vectors[found] = store.array[rows[found]]
+        return vectors, missed
+
+    def add(self, model: str, texts: Sequence[str], vectors: Sequence[Sequence[float]]):
+        keys = [text_key(text) for text in texts]
+        with self._lock:
+            self._store(model).add(keys, np.asarray(vectors, dtype=np.float32))
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+
+@functools.lru_cache(maxsize=None)
+def _shared_cache(directory: str) -> EmbeddingCache:
+    return EmbeddingCache(directory)
+
+
+def get_embedding_cache(directory: str = DEFAULT_CACHE_DIR) -> EmbeddingCache:
+    """one cache per directory in a process, share it instead of building `EmbeddingCache` at every use"""
+    return _shared_cache(os.path.abspath(directory))
@@ -9,18 +9,22 @@
 @Desc    :   None
 '''
 
-import asyncio
 import functools
+import json
 
 import httpx
 
-from sisyphus.patch.throttle import ChatThrottler, chat_throttler
+from sisyphus.patch.throttle import RateScheduler, rate_scheduler
 
 
-async def httpx_response_hooker(throtter: ChatThrottler, response: httpx.Response):
-    assert "x-ratelimit-limit-requests" in response.headers # for test
-    left_tokens = int(response.headers.get("x-ratelimit-remaining-tokens", None))
-    await asyncio.to_thread(throtter.setter, left_tokens)
+async def httpx_response_hooker(scheduler: RateScheduler, response: httpx.Response):
+    """feed `x-ratelimit-*` headers to the throttler of the requested model"""
+    try:
+        model = json.loads(response.request.content).get('model')
+    except (ValueError, AttributeError, httpx.RequestNotRead):
+        return
+    if model:
+        scheduler.update_from_headers(model, response.headers)
     
 timeout = httpx.Timeout(10.0, connect=60.0, pool=30.0, read=30.0)
 limits = httpx.Limits(max_keepalive_connections=None, max_connections=None)
@@ -28,11 +32,12 @@ achat_httpx_client = httpx.AsyncClient(
     timeout=timeout,
     limits=limits,
     verify=False,
-    event_hooks={"response": [functools.partial(httpx_response_hooker, chat_throttler)]}
+    event_hooks={"response": [functools.partial(httpx_response_hooker, rate_scheduler)]}
 )
 
 aembed_httpx_client = httpx.AsyncClient(
     timeout=timeout,
     limits=limits,
-    verify=False
+    verify=False,
+    event_hooks={"response": [functools.partial(httpx_response_hooker, rate_scheduler)]}
 )
@@ -0,0 +1,62 @@
+# -*- coding:utf-8 -*-
+'''
+@File    :   lm_patch.py
+@Time    :   2026/10/17 14:20:05
+@Author  :   soike
+@Version :   1.0
+@Contact :   luvusoike@icloud.com
+@License :   MIT Lisence
+@Desc    :   patch dspy LM, calls share the model keyed rate scheduler with langchain models
+'''
+
+import logging
+
+import dspy
+import tiktoken
+
+from sisyphus.patch.throttle import rate_scheduler
+
+
+logger = logging.getLogger(__name__)
+
+
+def num_tokens_from_messages(model: str, messages: list[dict]) -> int:
+    """estimate prompt tokens, same counting rule as `parallel_processor.num_tokens_consumed_from_request`"""
+    try:
+        encoding = tiktoken.encoding_for_model(model.rsplit('/', 1)[-1])
+    except KeyError:
+        encoding = tiktoken.get_encoding('o200k_base')
+    num_tokens = 2
+    for message in messages:
+        num_tokens += 4
+        for value in message.values():
+            if isinstance(value, str):
+                num_tokens += len(encoding.encode(value))
+    return num_tokens
+
+
+class LMThrottle(dspy.LM):
+    """
+    Patch dspy LM, use it instead of `dspy.LM` so that dspy calls are throttled as well.
+    - calls block the calling thread until the throttler of the model has capacity
+    - reservation is settled with the usage and `x-ratelimit-*` headers recorded in `history`,
+    under concurrent calls the last entry may belong to another call of similar size, which keeps the bucket balanced
+    - reservation is given back if the call fails or is answered by dspy cache
+    """
+
+    def __call__(self, prompt=None, messages=None, **kwargs):
+        prompt_messages = messages or [{"role": "user", "content": prompt}]
+        reservation = rate_scheduler.acquire(self.model, num_tokens_from_messages(self.model, prompt_messages))
+        try:
+            outputs = super().__call__(prompt=prompt, messages=messages, **kwargs)
+        except Exception:
+            reservation.release()
+            raise
+        entry = self.history[-1] if self.history else {}
+        response = entry.get('response')
+        hidden_params = getattr(response, '_hidden_params', None) or {}
+        if getattr(response, 'cache_hit', False) or hidden_params.get('cache_hit') or not entry.get('usage'):
+            reservation.release() # answered by cache, no request went out
+            return outputs
+        reservation.settle(usage=entry.get('usage'), headers=hidden_params.get('additional_headers'))
+        return outputs
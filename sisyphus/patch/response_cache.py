@@ -0,0 +1,138 @@
+# -*- coding:utf-8 -*-
+'''
+@File    :   response_cache.py
+@Time    :   2026/10/17 10:12:31
+@Author  :   soike
+@Version :   1.0
+@Contact :   luvusoike@icloud.com
+@License :   MIT Lisence
+@Desc    :   content-addressed cache for chat responses, backed by a local sqlite file
+'''
+
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import logging
+from typing import Any, Optional
+
+from pydantic import BaseModel
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = os.path.join('db', 'llm_response_cache.sqlite')
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3 # 2 GB
+NOT_HASHED_KEYS = ('stream', 'stream_options')
+"""request payload keys which do not change the response content"""
+
+
+def _jsonable(obj: Any):
+    """fallback for json.dumps, pydantic schema class (from `with_structured_output`) is hashed by its json schema"""
+    if isinstance(obj, type) and issubclass(obj, BaseModel):
+        return {'title': obj.__name__, 'schema': obj.model_json_schema()}
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode='json')
+    return repr(obj)
+
+
+def make_cache_key(payload: dict) -> str:
+    """hash the rendered request payload (model, temperature, messages, response_format/tools...) into a key"""
+    to_hash = {k: v for k, v in payload.items() if k not in NOT_HASHED_KEYS}
+    serialized = json.dumps(to_hash, sort_keys=True, ensure_ascii=False, default=_jsonable)
+    return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """
+    Persistent cache for chat model responses.
+        - key is the sha256 of the rendered request, see `make_cache_key`
+        - when the file grows larger than `max_bytes`, least recently used responses are evicted
+        - `hits` and `misses` counts the lookups since instantiation, read them after a run with `stats()`
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            'key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS ix_responses_last_access ON responses (last_access)')
+        self._total_bytes = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+    def lookup(self, key: str) -> Optional[Any]:
+        """return cached response or None, a response failed to be unpickled is dropped and treated as miss"""
+        with self._lock:
+            row = self._conn.execute('SELECT value FROM responses WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            try:
+                value = pickle.loads(row[0])
+            except Exception as e:
+                logger.warning('drop unreadable cached response %s: %s', key, e)
+                self._delete(key)
+                self.misses += 1
+                return None
+            self._conn.execute('UPDATE responses SET last_access = ? WHERE key = ?', (time.time(), key))
+            self.hits += 1
+            return value
+
+    def update(self, key: str, value: Any):
+        """store a response, evict the least recently used ones if exceeds `max_bytes`"""
+        blob = pickle.dumps(value)
+        with self._lock:
+            old = self._conn.execute('SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+            self._conn.execute(
+                'INSERT OR REPLACE INTO responses (key, value, size, last_access) VALUES (?, ?, ?, ?)',
+                (key, blob, len(blob), time.time())
+            )
+            self._total_bytes += len(blob) - (old[0] if old else 0)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _delete(self, key: str):
+        row = self._conn.execute('SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+        if row:
+            self._conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+            self._total_bytes -= row[0]
+
+    def _evict(self):
+        excess = self._total_bytes - self.max_bytes
+        freed = 0
+        to_delete = []
+        for key, size in self._conn.execute('SELECT key, size FROM responses ORDER BY last_access'):
+            if freed >= excess:
+                break
+            to_delete.append((key,))
+            freed += size
+        self._conn.executemany('DELETE FROM responses WHERE key = ?', to_delete)
+        self._total_bytes -= freed
+        logger.info('evict %d cached responses, freed %d bytes', len(to_delete), freed)
+
+    def stats(self) -> dict:
+        """hit/miss counter of this process"""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'size_bytes': self._total_bytes,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute('DELETE FROM responses')
+            self._total_bytes = 0
+
+    def close(self):
+        self._conn.close()
@@ -10,14 +10,18 @@
 '''
 
 import asyncio
+import contextlib
 import json
+import math
 import os
 import time
 import threading
 import logging
-from dataclasses import dataclass
+import weakref
+from collections import deque
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Literal
+from typing import Literal, Mapping, Optional
 from contextlib import asynccontextmanager
 
 
@@ -37,19 +41,33 @@ formatter = logging.Formatter('%(asctime)s - %(message)s')
 file_handler.setFormatter(formatter)
 logger.addHandler(file_handler)
 
+COMPLETION_EMA_WEIGHT = 0.2
+MIN_WAKE_INTERVAL = 0.001 # seconds, guards against float rounding of the computed waiting time
+
 # region chat
+class WaiterQueue:
+    """async waiters of one event loop, it keeps no reference to the loop once empty so the loop can be collected"""
+
+    def __init__(self):
+        self.waiters: deque[tuple[asyncio.Future, int]] = deque()
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
 @dataclass
 class ChatThrottler:
     """
-    Implementation of throttler
+    Implementation of throttler, a token bucket plus an optional request bucket
     - setter() is called after a httpx response
     - both instill() and setter() can change self.left_tokens
+    - `completion_tokens` is the estimated completion of a call, it is reserved before the call and
+    corrected with the real usage by `reconcile()`
     """
     max_tokens: int
     time_frame: Literal["s", "m"]
+    max_requests: Optional[int] = None
+    completion_tokens: float = 100
     last_check: float = None
-    a_lock: asyncio.Lock = asyncio.Lock()
-    t_lock: threading.Lock = threading.Lock()
+    t_lock: threading.Lock = field(default_factory=threading.Lock)
 
     cool_down_sentinel: bool = False
     cool_down_time: int = 10
@@ -58,48 +76,160 @@ class ChatThrottler:
     
     def __post_init__(self):
         self.left_tokens: float
-        self.instill_rate: float
+        self.left_requests: float
         self.left_tokens = self.max_tokens
-        self.reqeust_instill_rate: float
-        if self.time_frame == "m":
-            self.token_instill_rate = self.max_tokens / 60
-        else:
-            self.token_instill_rate = self.max_tokens
+        self.left_requests = self.max_requests if self.max_requests else math.inf
+        self.period = 60 if self.time_frame == "m" else 1
+        self.token_instill_rate = self.max_tokens / self.period
+        self.request_instill_rate = self.max_requests / self.period if self.max_requests else math.inf
+        # FIFO of async waiters per event loop, each woken by a single timer scheduled for the time its head fits
+        self._queues: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, WaiterQueue] = weakref.WeakKeyDictionary()
          
     def instill(self):
         with self.t_lock:
-            current = time.time()
-            elapsed = current - self.last_check
-            self.left_tokens = min(self.max_tokens, self.left_tokens + elapsed * self.token_instill_rate)
-            self.last_check = current
-    
-    async def ainstill(self):
-        await asyncio.to_thread(self.instill)
+            self._instill(time.time())
+
+    def _instill(self, current: float):
+        elapsed = current - (self.last_check or current)
+        self.left_tokens = min(self.max_tokens, self.left_tokens + elapsed * self.token_instill_rate)
+        if self.max_requests:
+            self.left_requests = min(self.max_requests, self.left_requests + elapsed * self.request_instill_rate)
+        self.last_check = current
 
-    async def wait_capacity(self, consumed_tokens: int, time_sleep=0.1):
+    def time_to_capacity(self, consumed_tokens: int) -> float:
+        """seconds until both buckets can admit the request, 0 if they can now, call after instill"""
+        tokens = min(consumed_tokens, self.max_tokens) # request larger than the bucket waits for a full bucket
+        wait = max(0.0, (tokens - self.left_tokens) / self.token_instill_rate)
+        if self.left_requests < 1:
+            wait = max(wait, (1 - self.left_requests) / self.request_instill_rate)
+        return wait
+
+    def has_capacity(self, consumed_tokens: int) -> bool:
+        return self.time_to_capacity(consumed_tokens) == 0
+
+    def _cool_down_left(self, current: float) -> float:
+        """seconds left of the cool down since last 429 error"""
+        if not self.cool_down_sentinel:
+            return 0
+        left = self.cool_down_start + self.cool_down_time - current
+        if left <= 0:
+            self.cool_down_sentinel = False
+            return 0
+        return left
+
+    async def wait_capacity(self, consumed_tokens: int) -> float:
         """
         Used for throttling.
         - Blocking until there is enough capacity, nonbloking when sufficiency.
+        - waiters are admitted in FIFO order, no polling: a timer wakes the queue when the head fits.
+        - return the reserved tokens, pass it to `reconcile()` after the response
         """
-        if not self.last_check:
-            self.last_check = time.time()
-        async with self.a_lock:
-            if self.cool_down_sentinel:
-                await self.cool_down()
-            # wait loop
-            enter_loop = False
-            while self.left_tokens - consumed_tokens < 0:
-                await asyncio.sleep(time_sleep)
-                await self.ainstill()
-                enter_loop = True
-            if not enter_loop:
-                await self.ainstill()
-    
-            self.consume(consumed_tokens)
+        loop = asyncio.get_running_loop()
+        with self.t_lock: # loops of other threads may share the throttler
+            queue = self._queues.get(loop)
+            if queue is None:
+                queue = self._queues[loop] = WaiterQueue()
+        if not queue.waiters:
+            reserved = self.try_consume(consumed_tokens)
+            if reserved is not None:
+                return reserved
+        future = loop.create_future()
+        queue.waiters.append((future, consumed_tokens))
+        if queue.timer is None:
+            self._wake(queue)
+        try:
+            return await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled(): # admitted right before cancelled, give back the tokens
+                self.reconcile(future.result(), total_tokens=0)
+            raise
+
+    def _wake(self, queue: WaiterQueue):
+        """admit waiters from the head of queue while there is capacity, then schedule next wake up, runs in the loop of queue"""
+        queue.timer = None
+        current = time.time()
+        with self.t_lock:
+            self._instill(current)
+            wait = self._cool_down_left(current)
+            while queue.waiters and not wait:
+                future, tokens = queue.waiters[0]
+                if future.cancelled():
+                    queue.waiters.popleft()
+                    continue
+                wait = self.time_to_capacity(tokens)
+                if not wait:
+                    queue.waiters.popleft()
+                    future.set_result(self.consume(tokens, lock=False))
+        if queue.waiters:
+            queue.timer = asyncio.get_running_loop().call_later(max(wait, MIN_WAKE_INTERVAL), self._wake, queue)
+
+    def _kick(self):
+        """capacity grew outside the timer (reconcile, headers), re-evaluate the head of queue of the running loop"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        queue = self._queues.get(loop)
+        if queue is not None and queue.waiters:
+            if queue.timer is not None:
+                queue.timer.cancel()
+            self._wake(queue)
 
-    def consume(self, tokens: int, completion_tokens=100): # set default completion for 50
+    def wait_capacity_sync(self, consumed_tokens: int) -> float:
+        """blocking version of `wait_capacity` for calls made from threads, e.g. dspy"""
+        while True:
+            current = time.time()
+            with self.t_lock:
+                self._instill(current)
+                wait = self._cool_down_left(current) or self.time_to_capacity(consumed_tokens)
+                if not wait:
+                    return self.consume(consumed_tokens, lock=False)
+            time.sleep(max(wait, MIN_WAKE_INTERVAL))
+
+    def try_consume(self, consumed_tokens: int, completion_tokens=None) -> Optional[float]:
+        """reserve without waiting, return None if there is no capacity"""
+        current = time.time()
+        with self.t_lock:
+            self._instill(current)
+            if self._cool_down_left(current) or not self.has_capacity(consumed_tokens):
+                return None
+            return self.consume(consumed_tokens, completion_tokens, lock=False)
+
+    def consume(self, tokens: int, completion_tokens=None, lock=True) -> float:
+        """reserve tokens of prompt plus estimated completion, return the reserved tokens"""
+        reserved = tokens + (self.completion_tokens if completion_tokens is None else completion_tokens)
+        with self.t_lock if lock else contextlib.nullcontext():
+            self.left_tokens -= reserved
+            self.left_requests -= 1
+        return reserved
+
+    def reconcile(self, reserved: float, total_tokens: Optional[int] = None, completion_tokens: Optional[int] = None):
+        """
+        Correct the reservation with the real usage of a response.
+        - the difference between reserved and used tokens is given back (or taken)
+        - completion estimate follows the real completions with an exponential moving average
+        """
         with self.t_lock:
-            self.left_tokens -= (tokens + completion_tokens)
+            if total_tokens is not None:
+                self.left_tokens = min(self.max_tokens, self.left_tokens + reserved - total_tokens)
+            if completion_tokens is not None and self.completion_tokens:
+                self.completion_tokens += COMPLETION_EMA_WEIGHT * (completion_tokens - self.completion_tokens)
+        self._kick()
+
+    def update_from_headers(self, headers: Mapping[str, str]):
+        """
+        Tighten the buckets with `x-ratelimit-*` headers, the remaining quota reported by server also counts
+        traffic we do not see (other processes sharing the key).
+        """
+        limits = parse_ratelimit_headers(headers)
+        with self.t_lock:
+            if 'limit-tokens' in limits and limits['limit-tokens'] < self.max_tokens:
+                self.max_tokens = limits['limit-tokens']
+                self.token_instill_rate = self.max_tokens / self.period
+            if 'remaining-tokens' in limits:
+                self.left_tokens = min(self.left_tokens, limits['remaining-tokens'])
+            if 'remaining-requests' in limits and self.max_requests:
+                self.left_requests = min(self.left_requests, limits['remaining-requests'])
     
     def setter(self, left_tokens):
         """
@@ -118,18 +248,112 @@ class ChatThrottler:
         
         logger.info('%s', retry_state.outcome.exception())
 
-    async def cool_down(self):
-        """cool down for `cool_down_time` since last hit error"""
-        while True:
-            since_cool_down = time.time() - self.cool_down_start
-            if since_cool_down >= self.cool_down_time:
-                self.cool_down_sentinel = False
+
+def parse_ratelimit_headers(headers: Mapping[str, str]) -> dict[str, int]:
+    """read `x-ratelimit-{limit,remaining}-{requests,tokens}`, litellm prefixes provider headers with `llm_provider-`"""
+    limits = {}
+    for key in ('limit-requests', 'limit-tokens', 'remaining-requests', 'remaining-tokens'):
+        for name in (f'x-ratelimit-{key}', f'llm_provider-x-ratelimit-{key}'):
+            value = headers.get(name)
+            if value is not None:
+                try:
+                    limits[key] = int(value)
+                except ValueError:
+                    pass
                 break
-            await asyncio.sleep(0.1)
+    return limits
 
 
-chat_throttler = ChatThrottler(CONFIG["chat"]["max_tokens"], CONFIG["chat"]["time_frame"])
-chat_throttler_4o = ChatThrottler(CONFIG["chat_4o"]["max_tokens"], CONFIG["chat"]["time_frame"])
+@dataclass
+class Reservation:
+    """capacity taken from a throttler for one request, settle it with the response"""
+    throttler: ChatThrottler
+    tokens: float
+
+    def settle(self, usage: Optional[Mapping] = None, headers: Optional[Mapping[str, str]] = None):
+        """
+        Parameters
+        ----------
+        usage : Mapping, optional
+            openai usage, e.g. {"prompt_tokens": 437, "completion_tokens": 20, "total_tokens": 457}
+        headers : Mapping[str, str], optional
+            response headers, only `x-ratelimit-*` are used
+        """
+        if usage:
+            self.throttler.reconcile(self.tokens, usage.get('total_tokens'), usage.get('completion_tokens'))
+        if headers:
+            self.throttler.update_from_headers(headers)
+
+    def release(self):
+        """request failed before consuming tokens, give back the reserved tokens"""
+        self.throttler.reconcile(self.tokens, total_tokens=0)
+
+
+class RateScheduler:
+    """
+    Model keyed throttlers shared by langchain models, dspy `LMThrottle` and `parallel_processor`.
+    Limits are read from `models` of throttle config, model name is matched by longest prefix
+    (`openai/gpt-4.1-mini-2025-04-14` -> `gpt-4.1-mini`), unknown models share the `default` limit.
+    """
+
+    def __init__(self, limits: dict[str, dict], default: str = 'default'):
+        self.limits = limits
+        self.default = default
+        self._throttlers: dict[str, ChatThrottler] = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, model: str) -> str:
+        name = model.rsplit('/', 1)[-1]
+        matched = [key for key in self.limits if name.startswith(key)]
+        return max(matched, key=len) if matched else self.default
+
+    def get(self, model: str) -> ChatThrottler:
+        key = self.resolve(model)
+        with self._lock:
+            if key not in self._throttlers:
+                self._throttlers[key] = ChatThrottler(**self.limits[key])
+            return self._throttlers[key]
+
+    async def aacquire(self, model: str, consumed_tokens: int) -> Reservation:
+        throttler = self.get(model)
+        return Reservation(throttler, await throttler.wait_capacity(consumed_tokens))
+
+    def acquire(self, model: str, consumed_tokens: int) -> Reservation:
+        throttler = self.get(model)
+        return Reservation(throttler, throttler.wait_capacity_sync(consumed_tokens))
+
+    def try_acquire(self, model: str, consumed_tokens: int, completion_tokens: Optional[float] = None) -> Optional[Reservation]:
+        """non-blocking acquire, pass `completion_tokens=0` if `consumed_tokens` already counts the completion"""
+        throttler = self.get(model)
+        reserved = throttler.try_consume(consumed_tokens, completion_tokens)
+        return None if reserved is None else Reservation(throttler, reserved)
+
+    def update_from_headers(self, model: str, headers: Mapping[str, str]):
+        self.get(model).update_from_headers(headers)
+
+    def retry_callback(self, retry_state):
+        """callback for tenacity retry when hit 429 rate error, only the throttler of the model in the failed request cools down"""
+        model = request_model(retry_state.outcome.exception())
+        if model is not None:
+            self.get(model).retry_callback(retry_state)
+            return
+        logger.warning('model of the rate limited request is unknown, every model cools down')
+        for throttler in list(self._throttlers.values()):
+            throttler.retry_callback(retry_state)
+
+
+def request_model(error: Optional[BaseException]) -> Optional[str]:
+    """model of the request an openai `APIStatusError` answers, read from the request body"""
+    try:
+        return json.loads(error.response.request.content)['model']
+    except (AttributeError, KeyError, TypeError, ValueError, RuntimeError): # RuntimeError: streamed body not read
+        return None
+
+
+rate_scheduler = RateScheduler(CONFIG["models"])
+
+chat_throttler = rate_scheduler.get('gpt-3.5-turbo')
+chat_throttler_4o = rate_scheduler.get('gpt-4o')
 
 @asynccontextmanager
 async def chat_waiter(consumed_tokens: int):
@@ -142,17 +366,20 @@ async def chat_waiter_4o(consumed_tokens: int):
     await chat_throttler_4o.wait_capacity(consumed_tokens)
     yield
 
+@asynccontextmanager
+async def model_waiter(model: str, consumed_tokens: int):
+    """wait for capacity of `model`, yield the `Reservation` to settle with usage and headers of response,
+    the reservation is given back if the request raises"""
+    reservation = await rate_scheduler.aacquire(model, consumed_tokens)
+    try:
+        yield reservation
+    except Exception:
+        reservation.release()
+        raise
 
-# region embed
-class EmbedThrottler(ChatThrottler):
-    """
-    Implementation specific to embedding
-    - no need to use setter due to the accurate token counting.
-    """
-    def consume(self, tokens: int, completion_tokens=0):
-        return super().consume(tokens, completion_tokens)
 
-embed_throttler = EmbedThrottler(CONFIG["embed"]["max_tokens"], CONFIG["embed"]["time_frame"])
+# region embed
+embed_throttler = rate_scheduler.get('text-embedding') # embeddings have no completion, its completion_tokens is 0 in the config
 
 @asynccontextmanager
 async def embed_waiter(consumed_tokens: int):
@@ -161,4 +388,4 @@ async def embed_waiter(consumed_tokens: int):
     yield
     # some clean steps...
 
-# endregion
\ No newline at end of file
+# endregion
@@ -0,0 +1,129 @@
+# -*- coding:utf-8 -*-
+'''
+@File    :   batch_processor.py
+@Time    :   2026/10/17 15:30:42
+@Author  :   soike
+@Version :   1.0
+@Contact :   luvusoike@icloud.com
+@License :   MIT Lisence
+@Desc    :   submit recorded requests to the OpenAI Batch API, poll, and save the responses back to the batch store
+'''
+
+import json
+import os
+import time
+import logging
+
+from openai import OpenAI
+from openai.types import Batch
+
+from sisyphus.patch.batch_store import BatchStore
+
+
+logger = logging.getLogger(__name__)
+
+BATCH_DIR = os.path.join('record', 'batches')
+FINISHED_STATUS = ('completed', 'failed', 'expired', 'cancelled')
+
+
+class BatchRunner:
+    """
+    Drive the requests recorded in a `BatchStore` through the Batch API.
+        - `submit()`: compile unsubmitted requests to JSONL files and create batches
+        - `wait()`: poll batches until they finish
+        - `collect()`: save responses, failed requests are submitted again until `max_attempts`
+    Batches submitted by a previous process are picked up by `run()`, so an interrupted run loses nothing.
+    """
+
+    def __init__(
+        self,
+        client: OpenAI,
+        store: BatchStore,
+        endpoint: str = '/v1/chat/completions',
+        completion_window: str = '24h',
+        poll_interval: float = 60,
+        max_batch_requests: int = 50000,
+        max_attempts: int = 2,
+        batch_dir: str = BATCH_DIR,
+    ):
+        self.client = client
+        self.store = store
+        self.endpoint = endpoint
+        self.completion_window = completion_window
+        self.poll_interval = poll_interval
+        self.max_batch_requests = max_batch_requests
+        self.max_attempts = max_attempts
+        self.batch_dir = batch_dir
+
+    def compile(self, requests: list[tuple[str, dict]], path: str):
+        """write requests into the JSONL input format of Batch API"""
+        with open(path, 'w', encoding='utf-8') as f:
+            for key, body in requests:
+                line = {'custom_id': key, 'method': 'POST', 'url': self.endpoint, 'body': body}
+                f.write(json.dumps(line, ensure_ascii=False) + '\n')
+
+    def submit(self) -> list[str]:
+        """create a batch for every `max_batch_requests` unsubmitted requests, return the batch ids"""
+        os.makedirs(self.batch_dir, exist_ok=True)
+        batch_ids = []
+        while requests := self.store.unsubmitted(self.max_batch_requests):
+            path = os.path.join(self.batch_dir, f'input_{time.time_ns()}.jsonl')
+            self.compile(requests, path)
+            with open(path, 'rb') as f:
+                input_file = self.client.files.create(file=f, purpose='batch')
+            batch = self.client.batches.create(
+                input_file_id=input_file.id,
+                endpoint=self.endpoint,
+                completion_window=self.completion_window,
+            )
+            self.store.mark_submitted([key for key, _ in requests], batch.id)
+            logger.info('submit batch %s with %d requests', batch.id, len(requests))
+            batch_ids.append(batch.id)
+        return batch_ids
+
+    def wait(self, batch_id: str) -> Batch:
+        while True:
+            batch = self.client.batches.retrieve(batch_id)
+            if batch.status in FINISHED_STATUS:
+                return batch
+            logger.debug('batch %s: %s %s', batch_id, batch.status, batch.request_counts)
+            time.sleep(self.poll_interval)
+
+    def collect(self, batch: Batch) -> int:
+        """save responses of a finished batch, return the number of landed responses"""
+        responses = []
+        failed = {}
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            for line in self.client.files.content(file_id).text.splitlines():
+                if not line.strip():
+                    continue
+                output = json.loads(line)
+                response = output.get('response') or {}
+                if response.get('status_code') == 200:
+                    responses.append((output['custom_id'], response['body']))
+                else:
+                    failed[output['custom_id']] = output.get('error') or response.get('body')
+        landed = {key for key, _ in responses}
+        # requests without output (expired or cancelled batch) count as failed
+        for key in self.store.batch_keys(batch.id):
+            if key not in landed and key not in failed:
+                failed[key] = {'message': f'no output, batch {batch.status}'}
+        retry = {key for key in failed if self.store.attempts(key) < self.max_attempts}
+        given_up = [(key, {'error': failed[key]}) for key in failed if key not in retry]
+        self.store.save_responses(responses + given_up)
+        self.store.requeue(list(retry))
+        logger.info('batch %s %s: %d landed, %d to retry, %d failed', batch.id, batch.status, len(responses), len(retry), len(given_up))
+        return len(responses)
+
+    def run(self) -> int:
+        """submit pending requests and wait for every batch in flight, return the number of landed responses"""
+        self.submit()
+        landed = 0
+        for batch_id in self.store.in_flight():
+            landed += self.collect(self.wait(batch_id))
+        return landed
+
+    def has_work(self) -> bool:
+        return bool(self.store.in_flight() or self.store.unsubmitted(1))
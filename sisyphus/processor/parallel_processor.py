@@ -40,6 +40,7 @@ Inputs:
     - path to the file where the results will be saved
     - file will be a jsonl file, where each line is an array with the original request plus the API response
     - e.g., [{"model": "text-embedding-ada-002", "input": "embed me"}, {...}]
+    - completed task ids are indexed in {save_filepath}.done, a restarted job skips them without reading the results
     - if omitted, results will be saved to {requests_filename}_results.jsonl
 - request_url : str, optional
     - URL of the API endpoint to call
@@ -83,9 +84,10 @@ The script is structured as follows:
     - Define dataclasses
         - StatusTracker (stores script metadata counters; only one instance is created)
         - APIRequest (stores API inputs, outputs, metadata; one method to call API)
+        - ResultWriter (single buffered writer of results file and its index of completed task ids)
     - Define functions
         - api_endpoint_from_url (extracts API endpoint from request URL)
-        - append_to_jsonl (writes to results file)
+        - append_to_jsonl (writes to results file, when no writer is given)
         - num_tokens_consumed_from_request (bigger function to infer token usage from request)
         - task_id_generator_function (yields 1, 2, 3, ...)
     - Run main()
@@ -99,12 +101,13 @@ import json  # for saving results to a jsonl file
 import os  # for reading API key
 import re  # for matching endpoint from request URL
 import time  # for sleeping after rate limit is hit
+from array import array  # for the compact index of completed task ids
 from dataclasses import (
     dataclass,
     field,
 )  # for storing API inputs, outputs, and metadata
 from logging import Logger
-from typing import Generator, IO, Literal, Optional
+from typing import Generator, IO, Literal, Optional, TYPE_CHECKING
 
 import httpx  # for making API calls concurrently
 import openai
@@ -115,6 +118,9 @@ from pydantic import BaseModel
 
 from ..utils.utilities import log # for logging rate limit warnings and other messages
 
+if TYPE_CHECKING:
+    from ..patch.throttle import RateScheduler, Reservation
+
 # pydantic models
 #from mof_absorb_pydantic import Compounds
 
@@ -128,9 +134,16 @@ class ProcessRequest:
     max_attempts: int
     token_encoding_name: str = "cl100k_base"
     logging_level: int = 10 # for debug
+    scheduler: Optional["RateScheduler"] = None
+    """share rate limits with langchain/dspy calls in this process, the `bucket` is ignored when set"""
+    fsync_interval: float = 1.0
+    """seconds between two fsync of the results file and its index"""
+    resume: bool = True
+    """skip requests completed by a previous run writing to the same `save_filepath`"""
     
     def __post_init__(self):
         self.logger = log(logging_level=self.logging_level)
+        self._task_ids = {} # save_filepath -> task id generator, probe and rest phases continue the same numbering
 
     async def _process_request(self, requests_generator: Generator, save_filepath: str, mode: Literal["embeddings", "completions"], bucket: "Bucket", requests_rate: float = 0.001, probe_size: int = 0, completion_tokens: int = 15, record_usage: bool = False, pydantic_model: BaseModel = None):
         """Process requests parallelly. For completion task, set probe_size to get average token consumption. for simple request, set record_usage to False (note that it only returns the remain token, not sleep to pause execution)"""
@@ -143,8 +156,12 @@ class ProcessRequest:
         self.logger.debug(f"Logging initialized at level {self.logging_level}")
 
         queue_of_requests_to_retry = asyncio.Queue()
-        task_id_generator = self.task_id_generator()
+        # only the first phase of a run may start a fresh index, later phases append to it
+        resume = self.resume or save_filepath in self._task_ids
+        task_id_generator = self._task_ids.setdefault(save_filepath, self.task_id_generator())
         status_tracker = StatusTracker()
+        writer = ResultWriter(save_filepath, fsync_interval=self.fsync_interval, resume=resume)
+        await writer.start()
         completion_token_usage = TokenUsage() if record_usage or probe_size else None
         next_request = None
         file_not_finished = True
@@ -175,13 +192,17 @@ class ProcessRequest:
                 if file_not_finished:
                     try:
                         next_g = next(requests_generator)
+                        task_id = next(task_id_generator)
+                        if writer.is_completed(task_id):
+                            status_tracker.num_tasks_skipped += 1
+                            continue
                         if isinstance(next_g, dict):
                             request_info = next_g
                         else:
                             request_info = json.loads(next_g) # the raw json according with openai request format, can include metadata field.
                         token_consumption = num_tokens_consumed_from_request(request_info, mode, self.token_encoding_name, max_tokens=completion_tokens)
                         next_request = APIRequest(
-                            task_id=next(task_id_generator),
+                            task_id=task_id,
                             request_json=request_info,
                             token_consumption=token_consumption,
                             attempts_left=self.max_attempts,
@@ -208,17 +229,27 @@ class ProcessRequest:
             bucket.update_capacity()
 
             if next_request:
-                if bucket.has_capacity(next_request.token_consumption):
+                reservation = None
+                if self.scheduler is not None:
+                    # token_consumption already counts the completion
+                    reservation = self.scheduler.try_acquire(next_request.request_json["model"], next_request.token_consumption, completion_tokens=0)
+                    has_capacity = reservation is not None
+                else:
+                    has_capacity = bucket.has_capacity(next_request.token_consumption)
+                if has_capacity:
                     asyncio.create_task(
                         next_request.call_api(
                             client=self.client,
                             mode=mode,
                             retry_queue=queue_of_requests_to_retry,
                             save_filepath=save_filepath,
-                            status_tracker=status_tracker
+                            status_tracker=status_tracker,
+                            reservation=reservation,
+                            writer=writer,
                         )
                     )
-                    bucket.set_capacity(next_request.token_consumption)
+                    if reservation is None: # the scheduler holds the capacity otherwise
+                        bucket.set_capacity(next_request.token_consumption)
                     next_request.attempts_left -= 1
                     next_request = None
             
@@ -229,10 +260,15 @@ class ProcessRequest:
             # sleep in main loop so that task can run
             await asyncio.sleep(requests_rate)
 
+        await writer.close()
         # after finishing, log final status
         self.logger.info(
             f"""Parallel processing complete. Results saved to {save_filepath}"""
         )
+        if status_tracker.num_tasks_skipped > 0:
+            self.logger.info(
+                f"{status_tracker.num_tasks_skipped} requests skipped, completed by a previous run."
+            )
         if status_tracker.num_tasks_failed > 0:
             self.logger.warning(
                 f"{status_tracker.num_tasks_failed} / {status_tracker.num_tasks_started} requests failed."
@@ -246,6 +282,12 @@ class ProcessRequest:
                 f"{status_tracker.num_task_validate_errors} / {status_tracker.num_tasks_started} requests failed with validation."
             )
 
+        if completion_token_usage is not None and not completion_token_usage.completion_tokens:
+            # every request was skipped, keep the local estimate and bucket capacity
+            remain_requests, remain_tokens = bucket.get_capacities()
+            last_time_stamp = bucket.get_last_update_time()
+            return (last_time_stamp, remain_requests, remain_tokens, completion_tokens) if probe_size else (last_time_stamp, remain_requests, remain_tokens)
+
         if completion_token_usage:
             # assert len(completion_token_usage.completion_tokens) == probe_size, f'something went wrong, {completion_token_usage.completion_tokens}'
             completion_tokens_average = sum(completion_token_usage.completion_tokens) / len(completion_token_usage.completion_tokens) # the average token in completion
@@ -386,6 +428,7 @@ class StatusTracker:
     num_tasks_in_progress: int = 0  # script ends when this reaches 0
     num_tasks_succeeded: int = 0
     num_tasks_failed: int = 0
+    num_tasks_skipped: int = 0  # completed by a previous run
     num_rate_limit_errors: int = 0
     num_api_errors: int = 0  # excluding rate limit errors, counted above
     num_task_validate_errors: int = 0 # pydantic validation errors
@@ -426,10 +469,13 @@ class APIRequest:
         retry_queue: asyncio.Queue,
         save_filepath: str,
         status_tracker: StatusTracker,
+        reservation: Optional["Reservation"] = None,
+        writer: Optional["ResultWriter"] = None,
     ):
-        """Calls the OpenAI API and saves results."""
+        """Calls the OpenAI API and saves results through `writer`, settle the `reservation` of rate scheduler with usage and headers."""
         self.logger.info(f"Starting request #{self.task_id}")
         error = None
+        response = raw_response = None
         try:                                                                                                                                                                                                         
             if mode == 'embeddings':
                 response = await client.embeddings.create(**self.request_json) # note that json metadata filed has been poped out
@@ -477,6 +523,12 @@ class APIRequest:
             status_tracker.num_other_errors += 1
             error = e
 
+        if reservation is not None:
+            if response is None: # request failed, nothing consumed
+                reservation.release()
+            else:
+                reservation.settle(usage=response.usage.model_dump(), headers=raw_response.headers if raw_response else None)
+
         if error:
             self.result.append(error)
             if self.attempts_left:
@@ -490,7 +542,7 @@ class APIRequest:
                     if self.metadata
                     else [self.request_json, "Failed"]
                 )
-                self.append_to_jsonl(data, save_filepath)
+                self.save(data, save_filepath, writer, completed=False)
                 status_tracker.num_tasks_in_progress -= 1
                 status_tracker.num_tasks_failed += 1
                 
@@ -508,12 +560,19 @@ class APIRequest:
                 if self.metadata
                 else [self.request_json, llm_result]
             )
-            self.append_to_jsonl(data, save_filepath)
+            self.save(data, save_filepath, writer, completed=True)
 
             status_tracker.num_tasks_in_progress -= 1
             status_tracker.num_tasks_succeeded += 1
             self.logger.debug(f"Request {self.task_id} saved to {save_filepath}")
 
+    def save(self, data, filename: str, writer: Optional["ResultWriter"], completed: bool) -> None:
+        """Hand the result to the writer, failed requests are saved but not indexed so that a restart retries them."""
+        if writer is None:
+            self.append_to_jsonl(data, filename)
+        else:
+            writer.put(self.task_id, data, completed=completed)
+
     def append_to_jsonl(self, data, filename: str) -> None:
         """Append a json payload to the end of a jsonl file."""
         json_string = json.dumps(data)
@@ -521,6 +580,87 @@ class APIRequest:
             f.write(json_string + "\n")
 
 
+class ResultWriter:
+    """
+    The only writer of a results file, fed by an asyncio queue.
+        - lines are buffered and the file is fsynced every `fsync_interval` seconds, and on `close()`
+        - ids of completed tasks go to a sidecar `{save_filepath}.done` of packed uint32, written after the results they index are synced
+    On restart the sidecar is loaded into a set, completed requests are skipped without scanning the results file.
+    """
+
+    def __init__(self, save_filepath: str, fsync_interval: float = 1.0, resume: bool = True):
+        self.save_filepath = save_filepath
+        self.index_filepath = save_filepath + ".done"
+        self.fsync_interval = fsync_interval
+        # the index is meaningless without the results it points to
+        self.resume = resume and os.path.exists(save_filepath)
+        self.completed = self.load_index() if self.resume else set()
+        self._queue = asyncio.Queue()
+        self._task = None
+
+    def load_index(self) -> set[int]:
+        ids = array("I")
+        if os.path.exists(self.index_filepath):
+            with open(self.index_filepath, "rb") as f:
+                data = f.read()
+            ids.frombytes(data[:len(data) - len(data) % ids.itemsize]) # drop a torn tail
+        return set(ids)
+
+    def is_completed(self, task_id: int) -> bool:
+        return task_id in self.completed
+
+    def put(self, task_id: int, data, completed: bool = True):
+        self._queue.put_nowait((task_id, json.dumps(data), completed))
+
+    async def start(self):
+        results = open(self.save_filepath, "a", buffering=1 << 16)
+        index = open(self.index_filepath, "ab" if self.resume else "wb")
+        self._task = asyncio.create_task(self._run(results, index))
+
+    async def close(self):
+        """write everything queued, sync and close the files"""
+        self._queue.put_nowait(None)
+        await self._task
+
+    async def _run(self, results: IO, index: IO):
+        pending = array("I") # completed ids whose results are not synced yet
+        dirty = False
+        deadline = 0.0
+        try:
+            while True:
+                timeout = max(0.0, deadline - time.monotonic()) if dirty else None
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    await asyncio.to_thread(self._sync, results, index, pending)
+                    dirty = False
+                    continue
+                if item is None:
+                    break
+                task_id, line, completed = item
+                results.write(line + "\n")
+                if completed:
+                    pending.append(task_id)
+                    self.completed.add(task_id)
+                if not dirty:
+                    dirty = True
+                    deadline = time.monotonic() + self.fsync_interval
+            self._sync(results, index, pending)
+        finally:
+            results.close()
+            index.close()
+
+    @staticmethod
+    def _sync(results: IO, index: IO, pending: array):
+        results.flush()
+        os.fsync(results.fileno())
+        if pending:
+            index.write(pending.tobytes())
+            index.flush()
+            os.fsync(index.fileno())
+            del pending[:]
+
+
 def num_tokens_consumed_from_request(
     request_json: dict,
     mode: str,
@@ -10,6 +10,8 @@ Schema:
     - track the state of the tasks, include #start taks, #in progress tasks, #failed tasks. In progress task drop to 0 then main loop exit
 - Main loop
     - Dispatch tasks and re-dispatch failed ones.
+    - Sleeps until the next deadline (bucket refill, error pause) or the next finished task, never polls.
+    - At most `most_concurrent_task_num` tasks are in flight, the iterator is not read ahead of them.
 """
 
 import asyncio
@@ -17,7 +19,7 @@ import time
 from abc import ABC, abstractmethod
 from collections import defaultdict
 from dataclasses import dataclass, field
-from typing import Generator, Optional
+from typing import Any, Generator, Optional
 
 from sisyphus.utils.utilities import log
 
@@ -51,6 +53,15 @@ class Bucket:
     def has_capacity(self, consumption) -> bool:
         return bool(self.present_capacity >= consumption)
 
+    def time_to_capacity(self, consumption: float) -> float:
+        """seconds until `consumption` is available, as of the last update"""
+        lack = consumption - self.present_capacity
+        if lack <= 0:
+            return 0.0
+        if consumption > self.maximum_capacity or self.recovery_rate <= 0:
+            raise ValueError(f"consumption {consumption} can never be satisfied by the bucket")
+        return lack / self.recovery_rate
+
 @dataclass
 class Tracker:
     task_start_num: int = 0
@@ -84,51 +95,70 @@ class AsyncControler(ABC):
         redo_queue: asyncio.Queue = asyncio.Queue()
         sema = asyncio.Semaphore(most_concurrent_task_num)
         redo_times_d: defaultdict = defaultdict(int)
-        iterator_run_out = False
-        next_task = None
         task_id_d = {}
         task_id_gen = self.task_id_gen()
-        while True:
-            if (elapsed:=time.time() - tracker.error_last_hit_time) < self.sleep_after_hit_error:
-                # sleep_time = self.sleep_after_hit_error - elapsed
-                self.logger.info(f"Error hit, execution pause for {self.sleep_after_hit_error}s")
-                await asyncio.sleep(self.sleep_after_hit_error)
-            if not next_task:
-                if not iterator_run_out:
-                    try:
-                        next_element = next(iterator)
-                        redo_times = redo_times_d[next_element]
-                        task_id = next(task_id_gen)
-                        task_id_d[next_element] = task_id
-
-                        next_task = self.implement(next_element, tracker=tracker, sema=sema, redo_queue=redo_queue, redo_times=redo_times, task_id=task_id_d[next_element])
-                        tracker.task_start_num += 1
-                        tracker.task_in_progress_num += 1
-
-                    except StopIteration:
-                        iterator_run_out = True
-
-                elif not redo_queue.empty():
-                    next_element = redo_queue.get_nowait()
-                    redo_times = redo_times_d[next_element] + 1
-
-                    next_task = self.implement(next_element, tracker=tracker, sema=sema, redo_queue=redo_queue, redo_times=redo_times, task_id=task_id_d[next_element])
-                    tracker.task_start_num += 1
-            
-            bucket.update()
-
-            if next_task:
-                consumption = self.task_consumption(next_element)
-                if bucket.has_capacity(consumption):
-                    
-                    asyncio.create_task(next_task)
-                    bucket.consume(consumption=consumption)
-                    next_task = None
-
-            if tracker.task_in_progress_num == 0:
-                break
+        running: set[asyncio.Task] = set()
+        iterator_run_out = False
+        next_element: Any = None
+        has_next = False
+
+        def done(task: asyncio.Task, element):
+            running.discard(task)
+            if task.cancelled():
+                return
+            if (e := task.exception()) is not None: # escaped from implement, nothing will redo it
+                self.logger.warning(f"{task_id_d[element]} failed with unhandled {e!r}")
+                tracker.task_failed += 1
+                tracker.task_failed_ls.append(element)
+
+        try:
+            while True:
+                if (pause := tracker.error_last_hit_time + self.sleep_after_hit_error - time.time()) > 0:
+                    self.logger.info(f"Error hit, execution pause for {pause:.1f}s")
+                    await asyncio.sleep(pause)
+                    continue
+
+                if not has_next:
+                    if not redo_queue.empty():
+                        next_element = redo_queue.get_nowait()
+                        redo_times_d[next_element] += 1
+                        has_next = True
+                    elif not iterator_run_out and len(running) < most_concurrent_task_num:
+                        try:
+                            next_element = next(iterator)
+                            task_id_d[next_element] = next(task_id_gen)
+                            tracker.task_in_progress_num += 1
+                            has_next = True
+                        except StopIteration:
+                            iterator_run_out = True
+                            continue
+
+                if not has_next or len(running) >= most_concurrent_task_num:
+                    if not running:
+                        break # iterator exhausted, nothing to redo and nothing in flight
+                    # a finished task frees a worker or puts its request into the redo queue
+                    await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                    continue
 
-            await asyncio.sleep(0.001) # brief sleep so that coroutines can run
+                consumption = self.task_consumption(next_element)
+                bucket.update()
+                if not bucket.has_capacity(consumption):
+                    await asyncio.sleep(bucket.time_to_capacity(consumption))
+                    continue
+
+                bucket.consume(consumption=consumption)
+                tracker.task_start_num += 1
+                coro = self.implement(next_element, tracker=tracker, sema=sema, redo_queue=redo_queue, redo_times=redo_times_d[next_element], task_id=task_id_d[next_element])
+                task = asyncio.create_task(coro)
+                running.add(task)
+                task.add_done_callback(lambda t, element=next_element: done(t, element))
+                has_next = False
+        finally:
+            # cancelled or failed: do not leave orphan tasks behind
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
         
         if len(tracker.task_failed_ls):
             with open(self.error_savefile_path, 'w', encoding='utf-8') as file:
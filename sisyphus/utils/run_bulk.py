@@ -10,8 +10,9 @@
 """
 import asyncio
 import logging
-from itertools import islice
-from typing import Sequence, Callable
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable, Optional, Sequence
 
 import tqdm
 
@@ -19,26 +20,108 @@ import tqdm
 logger = logging.getLogger()
 
 
-def future_gen(
-    task_producer: Sequence,
-    batch_size: int,
-    runnable: Callable,
-    call_with_para=True,
-):
-    iter_ = iter(task_producer)
+@dataclass
+class WindowStats:
+    """progress of `sliding_window`"""
+    total: Optional[int] = None
+    started: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    timed_out: int = 0
+    in_flight: int = 0
+    start_time: float = field(default_factory=time.monotonic)
+
+    @property
+    def finished(self) -> int:
+        return self.succeeded + self.failed + self.timed_out
+
+    @property
+    def throughput(self) -> float:
+        """finished tasks per second"""
+        return self.finished / max(time.monotonic() - self.start_time, 1e-9)
+
+    @property
+    def queue_depth(self) -> Optional[int]:
+        """inputs not started yet, None if the number of inputs is unknown"""
+        return None if self.total is None else self.total - self.started
+
+    def __str__(self):
+        queued = '?' if self.queue_depth is None else self.queue_depth
+        return (
+            f'{self.finished} finished ({self.succeeded} ok, {self.failed} failed, {self.timed_out} timed out), '
+            f'{self.in_flight} in flight, {queued} queued, {self.throughput:.2f} tasks/s'
+        )
 
-    def slice_iter():
-        while True:
-            chunk = list(islice(iter_, batch_size))
-            if not chunk:
-                return
-            yield chunk
 
-    for chunk in slice_iter():
-        if call_with_para:
-            yield from asyncio.as_completed(map(runnable, chunk))
-        else:
-            yield from asyncio.as_completed([runnable() for _ in chunk])
+async def sliding_window(
+    inputs: Iterable,
+    runnable: Callable,
+    concurrency: int,
+    timeout: Optional[float] = None,
+    ignore_errors: bool = False,
+    report_interval: float = 60,
+) -> WindowStats:
+    """
+    Keep `concurrency` calls of `runnable(input)` in flight, a new one starts as soon as any finishes.
+    Inputs are read lazily. A call longer than `timeout` seconds is cancelled and counted as timed out.
+    The first failed call raises its exception and cancels the calls in flight, with `ignore_errors` failed calls
+    are logged and counted instead. Cancelling the runner cancels the calls in flight.
+    Progress is logged every `report_interval` seconds.
+    """
+    stats = WindowStats(total=len(inputs) if isinstance(inputs, Sequence) else None)
+    iter_ = iter(inputs)
+    running: dict[asyncio.Task, Any] = {}
+    bar = tqdm.tqdm(total=stats.total) if logger.level > 20 else None # higher than INFO
+
+    def refill():
+        while len(running) < concurrency:
+            try:
+                input_ = next(iter_)
+            except StopIteration:
+                break
+            coro = runnable(input_)
+            if timeout is not None:
+                coro = asyncio.wait_for(coro, timeout)
+            running[asyncio.create_task(coro)] = input_
+            stats.started += 1
+        stats.in_flight = len(running)
+
+    next_report = time.monotonic() + report_interval
+    try:
+        refill()
+        while running:
+            done, _ = await asyncio.wait(
+                running, timeout=max(0.0, next_report - time.monotonic()), return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                input_ = running.pop(task)
+                error = task.exception()
+                if error is None:
+                    stats.succeeded += 1
+                elif isinstance(error, asyncio.TimeoutError):
+                    stats.timed_out += 1
+                    logger.warning('%s timed out after %s s', input_, timeout)
+                else:
+                    stats.failed += 1
+                    if not ignore_errors:
+                        raise error
+                    logger.error('%s failed', input_, exc_info=error)
+                if bar is not None:
+                    bar.update()
+            refill()
+            if time.monotonic() >= next_report:
+                logger.info(stats)
+                next_report = time.monotonic() + report_interval
+    finally:
+        for task in running:
+            task.cancel()
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)
+        stats.in_flight = 0
+        if bar is not None:
+            bar.close()
+    logger.info(stats)
+    return stats
 
 
 async def bulk_runner(
@@ -46,25 +129,16 @@ async def bulk_runner(
     task_producer: Sequence | None,
     repeat_times: int | None = None,
     batch_size: int,
-    runnable: Callable
-):
-    """run runnable in bulk asynchronously, show task bar depending on log level.
+    runnable: Callable,
+    timeout: Optional[float] = None,
+) -> WindowStats:
+    """run runnable in bulk asynchronously with `batch_size` calls in flight, show task bar depending on log level.
 
     provide task_producer or repeat_times, not both!
     """
     if task_producer:
-        future_iter = future_gen(task_producer, batch_size, runnable)
-        if logger.level > 20:   # higher than INFO
-            future_iter = tqdm.tqdm(future_iter, total=len(task_producer))
-    else:
-        future_iter = future_gen(
-            range(repeat_times), batch_size, runnable, call_with_para=False
-        )
-        if logger.level > 20:   # higher than INFO
-            future_iter = tqdm.tqdm(future_iter, total=repeat_times)
-
-    for f in future_iter:
-        await f
+        return await sliding_window(task_producer, runnable, batch_size, timeout=timeout)
+    return await sliding_window(range(repeat_times), lambda _: runnable(), batch_size, timeout=timeout)
 
 
 # test
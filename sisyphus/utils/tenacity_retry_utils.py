@@ -20,7 +20,7 @@ from tenacity import (
 from pydantic import ValidationError
 from openai import RateLimitError
 
-from sisyphus.patch.throttle import chat_throttler
+from sisyphus.patch.throttle import rate_scheduler
 
 
 TOTAL_TIMES = 2
@@ -31,7 +31,7 @@ def callback_logger(retry_state):
 openai_429_retry_wraps = retry(
     retry=retry_if_exception_type(RateLimitError),
     wait=wait_exponential(2, 10),
-    after=chat_throttler.retry_callback,
+    after=rate_scheduler.retry_callback,
 )
 pydantic_validate_retry_wraps = retry(
     retry=retry_if_exception_type(ValidationError),
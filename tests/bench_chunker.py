@@ -0,0 +1,118 @@
+"""
+Benchmark of token aware chunking, run from the repo root: `python -m tests.bench_chunker`
+
+Compares `TokenChunker` against the previous `ArticleLoader.chunk_text` (sum over the remaining sentences
+for every sentence) and `FullTextLoader.ensure_safe_len` (decode and re-encode every window) on synthetic
+papers: long paragraphs for the sentence chunker, a full text of many lines for the line chunker.
+Reports time per paper and how many chunks agree with the previous implementation. Sentence token counts
+now come from the encoding of the whole paragraph, so a boundary can move where a sentence encodes to a
+different count alone than inside the paragraph.
+"""
+
+import argparse
+import random
+import re
+import time
+
+import nltk
+
+from sisyphus.index.chunker import TokenChunker
+
+WORDS = (
+    'the sample was annealed at K under argon and the lattice parameter of MgSiAs2 increased with '
+    'temperature while Fig. 2 shows XRD patterns of e.g. Cu-doped films with a band gap of eV measured by UV-vis'
+).split()
+
+
+def simple_sent_tokenize(text):
+    return [sent for sent in re.split(r'(?<=[.!?])\s+(?=[A-Z])', text) if sent]
+
+
+def sentence(rng):
+    words = [rng.choice(WORDS) if rng.random() > 0.1 else f'{rng.uniform(0, 1000):.2f}' for _ in range(rng.randint(12, 40))]
+    return words[0].capitalize() + ' ' + ' '.join(words[1:]) + '.'
+
+
+def old_chunk_text(encoding, sent_tokenize, text):
+    if len(encoding.encode(text)) <= 400:
+        return [text]
+    sentences = sent_tokenize(text)
+    token_per_sent = [len(encoding.encode(sent)) for sent in sentences]
+    chunked_texts = []
+    accumulate_token = 0
+    next_start_i = 0
+    for i, token in enumerate(token_per_sent):
+        if i == len(token_per_sent) - 1:
+            chunked_texts.append(' '.join(sentences[next_start_i:]))
+            break
+        accumulate_token += token
+        token_left = sum(token_per_sent[i:])
+        if accumulate_token <= 400:
+            continue
+        if token_left >= 200:
+            chunked_texts.append(' '.join(sentences[next_start_i:i]))
+            next_start_i = i
+            accumulate_token = token
+        else:
+            chunked_texts.append(' '.join(sentences[next_start_i:]))
+            break
+    return chunked_texts
+
+
+def old_ensure_safe_len(encoding, text, max_token):
+    text_encoding = encoding.encode(text)
+    next_start = 0
+    while True:
+        chunk = encoding.decode(text_encoding[next_start: next_start + max_token])
+        if len(encoding.encode(chunk)) < max_token:
+            yield chunk
+            return
+        chunk_with_break = chunk.rsplit('\n', 1)[0]
+        next_start += len(encoding.encode(chunk_with_break))
+        yield chunk_with_break
+
+
+def timed(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--paragraph_sentences', type=int, nargs='+', default=[20, 100, 400])
+    parser.add_argument('--full_text_lines', type=int, nargs='+', default=[200, 1000, 4000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    try:
+        nltk.sent_tokenize('Punkt is installed.')
+        sent_tokenize = nltk.sent_tokenize
+    except LookupError:
+        sent_tokenize = simple_sent_tokenize
+    chunker = TokenChunker(sent_tokenize=sent_tokenize)
+    encoding = chunker.encoding
+
+    print(f'{"sentence chunks":<24}{"tokens":>8}{"old (ms)":>10}{"new (ms)":>10}{"speedup":>9}{"same chunks":>13}')
+    for n in args.paragraph_sentences:
+        text = ' '.join(sentence(rng) for _ in range(n))
+        t_old, old = timed(lambda: old_chunk_text(encoding, sent_tokenize, text), args.repeat)
+        t_new, new = timed(lambda: chunker.sentence_chunks(text), args.repeat)
+        same = sum(a == b for a, b in zip(old, new))
+        print(f'{f"{n} sentences":<24}{len(encoding.encode(text)):>8}{t_old * 1e3:>10.1f}{t_new * 1e3:>10.1f}{t_old / t_new:>9.1f}{f"{same}/{len(old)}":>13}')
+
+    print(f'\n{"line chunks":<24}{"tokens":>8}{"old (ms)":>10}{"new (ms)":>10}{"speedup":>9}{"same chunks":>13}')
+    for n in args.full_text_lines:
+        text = '\n'.join(' '.join(sentence(rng) for _ in range(rng.randint(1, 6))) for _ in range(n))
+        t_old, old = timed(lambda: list(old_ensure_safe_len(encoding, text, 5000)), args.repeat)
+        t_new, new = timed(lambda: list(chunker.line_chunks(text, 5000)), args.repeat)
+        same = sum(a == b for a, b in zip(old, new))
+        print(f'{f"{n} lines":<24}{len(encoding.encode(text)):>8}{t_old * 1e3:>10.1f}{t_new * 1e3:>10.1f}{t_old / t_new:>9.1f}{f"{same}/{len(old)}":>13}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Benchmark of `jsonl_constructor.create_chunks`, run from the repo root: `python -m tests.bench_create_chunks`
+
+The previous implementation decoded tokens[i:j] and a 4-token window on every backward step, which is
+quadratic in the chunk size. Synthetic papers of the given token sizes, with scientific abbreviations,
+decimals and non-ascii characters, are chunked by both; chunks must be identical. Old cost grows with
+the distance walked back to a sentence end, so text with few sentence ends is the worst case.
+Both encode the text first, so times are also reported after encoding (`chunk_tokens`). The vocabulary tables
+are built once per process before timing, their build time is reported apart.
+"""
+
+import argparse
+import itertools
+import random
+import time
+
+from sisyphus.index.chunker import token_byte_lengths
+from sisyphus.manipulator.jsonl_constructor import chunk_tokens, create_chunks, detect_sci_dot, token_starts_word, tokenizer
+
+WORDS = (
+    'the films were annealed at ca. 500 K , i.e. well below the melting point of MgSiAs₂ and e.g. Cu '
+    'doped samples show no. 3 peak at 2.35 Å with calc. gap of 1.5 eV while Fig. 2 compares μ-XRD data'
+).split()
+
+
+def old_create_chunks(text, n):
+    yield from old_chunk_tokens(tokenizer.encode(text), n)
+
+
+def old_chunk_tokens(tokens, n):
+    i = 0
+    while i < len(tokens):
+        j = min(i + int(1.5 * n), len(tokens))
+        while j > i + int(0.5 * n):
+            chunk = tokenizer.decode(tokens[i:j])
+            dot_of_science = False if j == len(tokens) else detect_sci_dot(tokenizer.decode(tokens[j:j+1]), tokenizer.decode(tokens[j-4: j]))
+            if chunk.endswith('.') and not dot_of_science:
+                break
+            j -= 1
+        if j == i + int(0.5 * n):
+            j = min(i + n, len(tokens))
+        yield tokens[i:j]
+        i = j
+
+
+def paper(rng, n_tokens, endings):
+    sentences = []
+    tokens = 0
+    while tokens < n_tokens:
+        words = [rng.choice(WORDS) for _ in range(rng.randint(5, 60))]
+        sentences.append(words[0].capitalize() + ' ' + ' '.join(words[1:]) + rng.choice(endings))
+        tokens += len(tokenizer.encode(sentences[-1]))
+    return ' '.join(sentences)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tokens', type=int, nargs='+', default=[2000, 20000])
+    parser.add_argument('--chunk_sizes', type=int, nargs='+', default=[300, 1000])
+    parser.add_argument('--papers', type=int, default=5)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    token_byte_lengths(tokenizer)
+    token_starts_word(tokenizer)
+    print(f'vocabulary tables built in {(time.perf_counter() - start) * 1e3:.0f} ms, once per process\n')
+
+    rng = random.Random(0)
+    # prose, and text with few sentence ends such as tables, reference lists and equations
+    corpora = {'prose': ['.', '.', '.', '.\n', ''], 'sparse dots': ['.'] + [';', ',', '\n', ''] * 5}
+    print(f'{"":<38}{"end to end":^29}{"after encoding":^29}')
+    print(f'{"corpus":<14}{"paper tokens":>12}{"chunk size":>12}' + f'{"old (ms)":>10}{"new (ms)":>10}{"speedup":>9}' * 2)
+    for (corpus, endings), n_tokens in itertools.product(corpora.items(), args.tokens):
+        papers = [paper(rng, n_tokens, endings) for _ in range(args.papers)]
+        encoded = [(tokenizer.encode(text), text.encode('utf-8')) for text in papers]
+        for chunk_size in args.chunk_sizes:
+            t_old = t_new = t_old_tokens = t_new_tokens = 0
+            for text, (tokens, data) in zip(papers, encoded):
+                start = time.perf_counter()
+                old = list(old_create_chunks(text, chunk_size))
+                t_old += time.perf_counter() - start
+                start = time.perf_counter()
+                new = list(create_chunks(text, chunk_size))
+                t_new += time.perf_counter() - start
+                assert old == new
+                start = time.perf_counter()
+                list(old_chunk_tokens(tokens, chunk_size))
+                t_old_tokens += time.perf_counter() - start
+                start = time.perf_counter()
+                list(chunk_tokens(tokens, chunk_size, data))
+                t_new_tokens += time.perf_counter() - start
+            columns = ''.join(
+                f'{a / len(papers) * 1e3:>10.1f}{b / len(papers) * 1e3:>10.1f}{a / b:>9.1f}'
+                for a, b in ((t_old, t_new), (t_old_tokens, t_new_tokens))
+            )
+            print(f'{corpus:<14}{n_tokens:>12}{chunk_size:>12}{columns}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""
+Benchmark of document metadata in the loaders, run from the repo root: `python -m tests.bench_loader_metadata`
+
+Previously every loader instance built its pydantic model with `create_model` and every document ran
+`dict(self.metadata(...))`. Now the models are built once at import and `MetadataFactory` validates the first
+document of an article, later documents copy that dict. Reports paragraphs/s of the metadata alone and of
+`ArticleLoader.lazy_load` on synthetic articles of short paragraphs, where parsing html is the rest of the cost.
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from langchain_core.documents import Document
+from pydantic import create_model
+
+from sisyphus.index.loader import TB, ArticleLoader, MetadataFactory
+
+WORDS = 'the films were annealed at 500 K and the band gap of MgSiAs2 was measured by UV-vis'.split()
+
+
+class OldArticleLoader(ArticleLoader):
+    """metadata as built before"""
+
+    def __init__(self, file_path: str):
+        super().__init__(file_path)
+        self.metadata = create_model('MetaData', source=(str, ...), doi=(str, ...), sub_titles=(str, ...), title=(str, ...))
+
+    def get_abstract(self, parsed):
+        for paragraph in parsed.abstract:
+            yield Document(
+                page_content=paragraph,
+                metadata=dict(self.metadata(source=self.file_name, doi=parsed.doi, sub_titles='Abstract', title=parsed.title)),
+            )
+
+    def get_sections(self, parsed):
+        for sub_titles, content in parsed.sections:
+            chunks = [content] if sub_titles == TB else self.chunk_text(content)
+            for chunk in chunks:
+                yield Document(
+                    page_content=chunk,
+                    metadata=dict(self.metadata(source=self.file_name, doi=parsed.doi, sub_titles=sub_titles, title=parsed.title))
+                )
+
+
+def article(rng, i, n_paragraphs):
+    sentence = lambda: ' '.join(rng.choice(WORDS) for _ in range(rng.randint(8, 30))).capitalize() + '.'
+    sections = []
+    for j in range(n_paragraphs):
+        if j % 5 == 0:
+            sections.append(f'<h2>Section {j // 5}</h2>')
+        sections.append(f'<p>{sentence()}</p>')
+    return (
+        f'<html><head><title>Article {i}</title><p><a>10.1000/{i}</a></p></head><body>'
+        f'<div id="abstract"><p>{sentence()}</p></div><div id="sections">{"".join(sections)}</div></body></html>'
+    )
+
+
+def old_metadata(n_articles, n_paragraphs):
+    for i in range(n_articles):
+        model = create_model('MetaData', source=(str, ...), doi=(str, ...), sub_titles=(str, ...), title=(str, ...))
+        for j in range(n_paragraphs):
+            dict(model(source=f'{i}.html', doi=f'10.1000/{i}', sub_titles=f'Section {j // 5}', title=f'Article {i}'))
+
+
+def new_metadata(n_articles, n_paragraphs):
+    for i in range(n_articles):
+        make_metadata = MetadataFactory(ArticleLoader('').metadata, source=f'{i}.html', doi=f'10.1000/{i}', title=f'Article {i}')
+        for j in range(n_paragraphs):
+            make_metadata(sub_titles=f'Section {j // 5}')
+
+
+def load_all(loader_cls, file_paths):
+    return [document for file_path in file_paths for document in loader_cls(file_path).lazy_load()]
+
+
+def timed(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--articles', type=int, default=200)
+    parser.add_argument('--paragraphs', type=int, nargs='+', default=[10, 50, 200])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    print(f'{"paragraphs/article":<20}{"":<12}{"old (para/s)":>14}{"new (para/s)":>14}{"speedup":>9}')
+    with tempfile.TemporaryDirectory() as folder:
+        for n in args.paragraphs:
+            total = args.articles * n
+            t_old, _ = timed(lambda: old_metadata(args.articles, n), args.repeat)
+            t_new, _ = timed(lambda: new_metadata(args.articles, n), args.repeat)
+            print(f'{n:<20}{"metadata":<12}{total / t_old:>14.0f}{total / t_new:>14.0f}{t_old / t_new:>9.1f}')
+
+            file_paths = []
+            for i in range(args.articles):
+                file_paths.append(os.path.join(folder, f'{n}-{i}.html'))
+                with open(file_paths[-1], 'w', encoding='utf-8') as file:
+                    file.write(article(rng, i, n))
+            t_old, old = timed(lambda: load_all(OldArticleLoader, file_paths), args.repeat)
+            t_new, new = timed(lambda: load_all(ArticleLoader, file_paths), args.repeat)
+            assert old == new
+            print(f'{"":<20}{"lazy_load":<12}{len(new) / t_old:>14.0f}{len(new) / t_new:>14.0f}{t_old / t_new:>9.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Benchmark of publisher detection and tree building in `chempp.parse_html`, run from the repo root: `python -m tests.bench_parse_html`
+
+The body of every page in `test_file` is wrapped into synthetic publisher pages (elsevier, rsc, wiley, acs)
+with realistic heads, then repeated up to the size of a full-text article. For each page reports the time of
+- before: html.parser soup to find publisher and doi, then a second html5lib soup for elsevier and rsc
+- after: regex scan of the head, then a single soup (html5lib or lxml for elsevier and rsc)
+and checks both find the same publisher and doi.
+"""
+
+import argparse
+import glob
+import os
+import time
+
+from bs4 import BeautifulSoup
+
+from chempp.article_constr import scan_html_doi_publisher, search_html_doi_publisher
+
+try:
+    import lxml # noqa: F401
+    BUILDERS = ['html5lib', 'lxml']
+except ImportError:
+    BUILDERS = ['html5lib']
+
+
+HEAD_SCRIPT = '<script type="text/javascript">' + 'window.dataLayer.push({"event": "pageview"});\n' * 400 + '</script>'
+
+
+def synthetic_pages(body: str, doi: str) -> dict[str, str]:
+    """pages of each publisher carrying `body`, with the markup their doi search expects"""
+    doi_url = f'https://doi.org/{doi}'
+    return {
+        'elsevier': (
+            f'<html><head><title>Synthetic article - ScienceDirect</title>'
+            f'<meta name="citation_doi" content="{doi}">{HEAD_SCRIPT}</head>'
+            f'<body><a class="doi" href="{doi_url}">{doi_url}</a><div id="body"><p>{body}<p>nested</p></p></div></body></html>'
+        ),
+        'rsc': (
+            f'<html xmlns:rsc="urn:rsc.org"><head><title>Synthetic article</title>'
+            f'<meta name="DC.publisher" content="The Royal Society of Chemistry">{HEAD_SCRIPT}</head>'
+            f'<body><div class="article_info"><a href="{doi_url}">{doi_url}</a></div><span><span>{body}</span></span></body></html>'
+        ),
+        'wiley': (
+            f'<html><head><title>Synthetic article</title>'
+            f'<meta name="citation_publisher" content="John Wiley &amp; Sons, Ltd">{HEAD_SCRIPT}</head>'
+            f'<body><a class="epub-doi" href="{doi_url}">{doi_url}</a>{body}</body></html>'
+        ),
+        'acs': (
+            f'<html><head><title>Synthetic article</title>'
+            f'<meta name="dc.Publisher" content="American Chemical Society">{HEAD_SCRIPT}</head>'
+            f'<body><div class="article_header-doiurl">{doi_url}</div>{body}</body></html>'
+        ),
+    }
+
+
+def before(contents: str):
+    soup = BeautifulSoup(contents, 'html.parser')
+    doi, publisher = search_html_doi_publisher(soup)
+    if publisher in ['elsevier', 'rsc']:
+        soup = BeautifulSoup(contents, 'html5lib')
+    return doi, publisher
+
+
+def after(contents: str, builder: str):
+    _, publisher = scan_html_doi_publisher(contents)
+    soup = BeautifulSoup(contents, builder if publisher in ['elsevier', 'rsc'] else 'html.parser')
+    doi, publisher = search_html_doi_publisher(soup, publisher)
+    return doi, publisher
+
+
+def timeit(func, *args, repeat: int):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--directory', default='test_file')
+    parser.add_argument('--size', type=int, default=400_000, help='characters of a synthetic page')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    for file_path in sorted(glob.glob(os.path.join(args.directory, '*.html'))):
+        with open(file_path, encoding='utf-8') as f:
+            body = str(BeautifulSoup(f.read(), 'html.parser').body)
+        body = body * max(1, args.size // len(body))
+        doi = os.path.basename(file_path)[:-len('.html')].replace('&sol;', '/')
+        print(f'{os.path.basename(file_path)}, pages of {args.size // 1000}k characters')
+        print(f'{"publisher":<10}{"before (s)":>12}' + ''.join(f'{"after " + b + " (s)":>20}' for b in BUILDERS))
+        for publisher, page in synthetic_pages(body, doi).items():
+            t_before, expected = timeit(before, page, repeat=args.repeat)
+            assert expected == (doi, publisher), expected
+            row = f'{publisher:<10}{t_before:>12.3f}'
+            for builder in BUILDERS:
+                t_after, found = timeit(after, page, builder, repeat=args.repeat)
+                assert found == expected, (builder, found)
+                row += f'{t_after:>20.3f}'
+            print(row)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Microbenchmark of throttler admission, run from the repo root: `python -m tests.bench_throttler`
+
+N concurrent waiters ask for the same amount of tokens from an empty bucket refilled at a fixed rate,
+so the ideal admission time of the i-th waiter is known. Reports admitted requests/sec and
+the p50/p99 lag between actual and ideal admission, for the event driven `ChatThrottler`
+and the previous lock + 100 ms polling implementation.
+"""
+
+import argparse
+import asyncio
+import threading
+import time
+
+import numpy as np
+
+from sisyphus.patch.throttle import ChatThrottler
+
+
+class PollingThrottler:
+    """the previous implementation: global lock, 100 ms polling, instill offloaded to a thread"""
+
+    def __init__(self, max_tokens, time_frame):
+        self.max_tokens = max_tokens
+        self.token_instill_rate = max_tokens / (60 if time_frame == 'm' else 1)
+        self.left_tokens = 0
+        self.last_check = time.time()
+        self.a_lock = asyncio.Lock()
+        self.t_lock = threading.Lock()
+
+    def instill(self):
+        with self.t_lock:
+            current = time.time()
+            self.left_tokens = min(self.max_tokens, self.left_tokens + (current - self.last_check) * self.token_instill_rate)
+            self.last_check = current
+
+    async def wait_capacity(self, consumed_tokens, time_sleep=0.1):
+        async with self.a_lock:
+            enter_loop = False
+            while self.left_tokens - consumed_tokens < 0:
+                await asyncio.sleep(time_sleep)
+                await asyncio.to_thread(self.instill)
+                enter_loop = True
+            if not enter_loop:
+                await asyncio.to_thread(self.instill)
+            self.left_tokens -= consumed_tokens
+
+
+async def run(throttler, waiters: int, tokens: int, rate: float):
+    start = time.time()
+    throttler.left_tokens = 0 # start with an empty bucket so every waiter has to wait
+    throttler.last_check = start
+    admitted = [0.0] * waiters
+
+    async def waiter(i):
+        await throttler.wait_capacity(tokens)
+        admitted[i] = time.time()
+
+    await asyncio.gather(*[waiter(i) for i in range(waiters)])
+    elapsed = max(admitted) - start
+    ideal = start + np.arange(1, waiters + 1) * tokens / rate
+    lag = np.sort(np.array(admitted)) - ideal
+    return waiters / elapsed, np.percentile(lag, 50), np.percentile(lag, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--waiters', type=int, default=1000)
+    parser.add_argument('--tokens', type=int, default=100, help='tokens per request')
+    parser.add_argument('--rate', type=float, default=50000, help='tokens refilled per second')
+    args = parser.parse_args()
+
+    ideal_rps = args.rate / args.tokens
+    print(f'{args.waiters} waiters, ideal {ideal_rps:.0f} req/s')
+    event_driven = ChatThrottler(max_tokens=int(args.rate), time_frame='s', completion_tokens=0)
+    for name, throttler in [('event driven', event_driven), ('polling', PollingThrottler(int(args.rate), 's'))]:
+        rps, p50, p99 = asyncio.run(run(throttler, args.waiters, args.tokens, args.rate))
+        print(f'{name:>12}: {rps:8.1f} req/s, admission lag p50 {p50 * 1000:7.2f} ms, p99 {p99 * 1000:7.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
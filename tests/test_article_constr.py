@@ -0,0 +1,31 @@
+import pytest
+from bs4 import BeautifulSoup
+
+from chempp.article_constr import check_html_publisher, scan_html_doi_publisher
+
+
+PAGES = {
+    'rsc': '<html xmlns:rsc="urn:rsc.org"><head><title>t</title><meta name="viewport" content="x"></head><body></body></html>',
+    'wiley': "<html><head><META content='John Wiley &amp; Sons, Ltd' NAME=citation_publisher><meta name='citation_doi' content='10.1002/X'></head></html>",
+    'acs': '<html><head>\n<meta\nname="dc.Publisher" content=" American Chemical Society "/></head><body></body></html>',
+    'cjps': '<html><head><meta name="dc.publisher" content="World Scientific Publishing Company"><meta name="author"></head><body></body></html>',
+    'springer': '<html><head><meta name="dc.publisher" content="World Scientific Publishing Company"><meta name="dc.publisher" content="Springer"></head></html>',
+    'elsevier': '<html><head><title>Nano &amp; X - ScienceDirect</title></head><body><p>text</p></body></html>',
+}
+
+
+@pytest.mark.parametrize('publisher', PAGES)
+def test_head_scan_agrees_with_soup(publisher):
+    page = PAGES[publisher]
+    assert check_html_publisher(BeautifulSoup(page, 'html.parser')) == publisher
+    doi, scanned = scan_html_doi_publisher(page)
+    assert scanned == publisher
+    assert doi == ('10.1002/x' if publisher == 'wiley' else None)
+
+
+def test_head_scan_leaves_undecided_pages_to_soup():
+    # a publisher meta tag in the body wins over the title
+    page = '<html><head><title>X - ScienceDirect</title></head><body><meta name="dc.publisher" content="Springer"></body></html>'
+    assert scan_html_doi_publisher(page) == (None, None)
+    assert check_html_publisher(BeautifulSoup(page, 'html.parser')) == 'springer'
+    assert scan_html_doi_publisher('<html><body><p>no head</p></body></html>') == (None, None)
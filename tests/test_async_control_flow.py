@@ -0,0 +1,61 @@
+import asyncio
+import time
+
+import pytest
+
+from sisyphus.utils.async_control_flow import AsyncControler, Bucket, Tracker
+
+
+class Flaky(AsyncControler):
+    """fails every request once, counts the peak concurrency"""
+
+    def __init__(self, tmp_path):
+        super().__init__(str(tmp_path / 'errors.txt'), max_redo_times=2, logging_level=40, sleep_after_hit_error=0)
+        self.seen = set()
+        self.done = []
+        self.active = self.peak = 0
+
+    def task_consumption(self, task):
+        return 1
+
+    def call_back(self, tracker):
+        pass
+
+    async def implement(self, request, tracker, sema, redo_queue, redo_times, task_id):
+        async with sema:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+            try:
+                await asyncio.sleep(0.01)
+                if request == 'boom':
+                    raise RuntimeError('not handled by implement')
+                if request not in self.seen:
+                    self.seen.add(request)
+                    redo_queue.put_nowait(request)
+                    return
+                self.done.append((request, redo_times))
+                tracker.task_in_progress_num -= 1
+            finally:
+                self.active -= 1
+
+
+def test_rate_concurrency_and_redo(tmp_path):
+    controler = Flaky(tmp_path)
+    tracker = Tracker()
+    bucket = Bucket(maximum_capacity=1, recovery_rate=200, init_capacity=0)
+    start = time.time()
+    asyncio.run(controler.control_flow(iter(range(10)), bucket, tracker, most_concurrent_task_num=3))
+    elapsed = time.time() - start
+    assert sorted(controler.done) == [(i, 1) for i in range(10)]
+    assert tracker.task_start_num == 20
+    assert controler.peak <= 3
+    assert elapsed == pytest.approx(20 / 200, abs=0.06) # bucket bound, no idle polling gaps
+
+
+def test_unhandled_error_recorded_and_flow_ends(tmp_path):
+    controler = Flaky(tmp_path)
+    tracker = Tracker()
+    asyncio.run(controler.control_flow(iter(['boom', 'ok']), Bucket(10, 10), tracker, most_concurrent_task_num=2))
+    assert tracker.task_failed_ls == ['boom']
+    assert controler.done == [('ok', 1)]
+    assert (tmp_path / 'errors.txt').read_text() == 'Failed:\nboom\n'
@@ -0,0 +1,127 @@
+import email
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from openai import OpenAI
+from pydantic import BaseModel
+from langchain_core.documents import Document
+from sqlmodel import create_engine
+
+from sisyphus.chain import chain_elements
+from sisyphus.chain.chain_elements import Chain, ChainElementLambda, Writer, run_chains_with_batch
+from sisyphus.chain.database import ResultDB, ExtractManager
+from sisyphus.chain.paragraph import Paragraph
+from sisyphus.patch import ChatOpenAIThrottle, BatchStore
+from sisyphus.processor.batch_processor import BatchRunner
+
+
+class Answer(BaseModel):
+    answer: str
+
+
+class FakeBatchHandler(BaseHTTPRequestHandler):
+    """files and batches endpoints of OpenAI, a batch is answered when created and reported finished on the second poll"""
+    files: dict = {}
+    batches: dict = {}
+
+    def _send(self, obj, raw: bytes = None):
+        body = raw if raw is not None else json.dumps(obj).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _file(self, content: bytes, purpose: str):
+        file_id = f'file-{len(self.files)}'
+        self.files[file_id] = content
+        return {'id': file_id, 'object': 'file', 'bytes': len(content), 'created_at': 0, 'filename': 'input.jsonl', 'purpose': purpose, 'status': 'processed'}
+
+    @staticmethod
+    def _answer(body: dict) -> dict:
+        last = body['messages'][-1]['content']
+        content = json.dumps({'answer': last.upper()}) if 'response_format' in body else f'summary of {last}'
+        return {
+            'id': 'chatcmpl-fake', 'object': 'chat.completion', 'created': 0, 'model': body['model'],
+            'choices': [{'index': 0, 'finish_reason': 'stop', 'message': {'role': 'assistant', 'content': content}}],
+            'usage': {'prompt_tokens': 10, 'completion_tokens': 5, 'total_tokens': 15},
+        }
+
+    def do_POST(self):
+        data = self.rfile.read(int(self.headers['Content-Length']))
+        if self.path == '/v1/files':
+            message = email.message_from_bytes(b'Content-Type: ' + self.headers['Content-Type'].encode() + b'\r\n\r\n' + data)
+            content = next(part.get_payload(decode=True) for part in message.get_payload() if part.get_filename())
+            return self._send(self._file(content, 'batch'))
+        request = json.loads(data)
+        outputs = []
+        for line in self.files[request['input_file_id']].decode().splitlines():
+            line = json.loads(line)
+            outputs.append({'id': 'out', 'custom_id': line['custom_id'], 'response': {'status_code': 200, 'body': self._answer(line['body'])}, 'error': None})
+        output_file = self._file('\n'.join(json.dumps(o) for o in outputs).encode(), 'batch_output')
+        batch = {
+            'id': f'batch-{len(self.batches)}', 'object': 'batch', 'endpoint': request['endpoint'], 'input_file_id': request['input_file_id'],
+            'completion_window': request['completion_window'], 'status': 'in_progress', 'created_at': 0, 'output_file_id': None,
+        }
+        self.batches[batch['id']] = (batch, output_file['id'])
+        self._send(batch)
+
+    def do_GET(self):
+        if self.path.startswith('/v1/batches/'):
+            batch, output_file_id = self.batches[self.path.rsplit('/', 1)[-1]]
+            if batch['status'] == 'in_progress':
+                batch['status'] = 'finalizing' # finished on next poll
+                return self._send(batch)
+            batch.update(status='completed', output_file_id=output_file_id)
+            return self._send(batch)
+        file_id = self.path.split('/')[-2]
+        self._send(None, raw=self.files[file_id])
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def fake_url():
+    FakeBatchHandler.files, FakeBatchHandler.batches = {}, {}
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeBatchHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_port}/v1'
+    server.shutdown()
+
+
+def test_chain_through_batch_api(fake_url, tmp_path, monkeypatch):
+    monkeypatch.setattr(chain_elements, 'RECORD_LOCATION', str(tmp_path))
+    store = BatchStore(str(tmp_path / 'batch.sqlite'))
+    model = ChatOpenAIThrottle(model='gpt-4.1', api_key='sk-fake', base_url=fake_url, batch_store=store)
+    runner = BatchRunner(OpenAI(api_key='sk-fake', base_url=fake_url), store, poll_interval=0, batch_dir=str(tmp_path))
+    result_db = ResultDB(create_engine(f'sqlite:///{tmp_path / "result.sqlite"}'))
+    result_db.create_db()
+
+    def load(file_name):
+        return [Paragraph(Document(page_content=f'text of {file_name}', metadata={'source': file_name}))]
+
+    def extract(paras):
+        try:
+            summary = model.invoke(paras[0].page_content).content # first round
+            answer = model.with_structured_output(Answer, method='json_schema').invoke(summary) # depends on the first
+        except Exception: # chain code often catches broadly, batch pending must get through
+            return
+        return [paras[0].set_data(answer)]
+
+    chain = Chain(ChainElementLambda(load), ChainElementLambda(extract), Writer(result_db))
+    names = ['a.html', 'b.html']
+    manager = ExtractManager('batch_test', db_url=f'sqlite:///{tmp_path / chain_elements.RECORD_NAME}')
+
+    run_chains_with_batch(chain, None, 'batch_test', runner, workers=2, max_rounds=1, given_names=names)
+    assert manager.exists(names) == [False, False] # requests recorded, nothing landed yet
+    assert result_db.load_as_json('Answer', '', '')[1:] == []
+
+    run_chains_with_batch(chain, None, 'batch_test', runner, workers=2, given_names=names)
+    assert manager.exists(names) == [True, True]
+    assert len(FakeBatchHandler.batches) == 2 # one batch per dependent call
+    results = sorted(r['Answer']['answer'] for r in result_db.load_as_json('Answer', '', '')[1:])
+    assert results == ['SUMMARY OF TEXT OF A.HTML', 'SUMMARY OF TEXT OF B.HTML']
@@ -0,0 +1,86 @@
+import asyncio
+import time
+
+import pytest
+
+from sisyphus.chain import chain_elements
+from langchain_core.documents import Document
+
+from sisyphus.chain.chain_elements import Chain, ChainElementLambda, Writer, run_chains_pipelined
+from sisyphus.chain.constants import FAILED
+from sisyphus.chain.database import ExtractManager
+from sisyphus.chain.paragraph import Paragraph
+
+
+def make_chain(log):
+    async def locate(name):
+        await asyncio.sleep(0.01) # db read
+        return [] if name == 'empty' else [name]
+
+    async def extract(docs):
+        await asyncio.sleep(0.05) # llm call
+        if docs[0] == 'bad':
+            raise ValueError('llm output not valid')
+        return [doc.upper() for doc in docs]
+
+    async def write(results):
+        await asyncio.sleep(0.01)
+        log.extend(results)
+        return results
+
+    return Chain(ChainElementLambda(locate), ChainElementLambda(extract), ChainElementLambda(write))
+
+
+def test_stages_overlap_and_finish_per_article():
+    log, done = [], {}
+    names = [f'{i}.html' for i in range(20)] + ['empty', 'bad']
+    pipeline = make_chain(log).pipeline(concurrency=(2, 10, 1), queue_size=4)
+
+    start = time.monotonic()
+    counts = asyncio.run(pipeline.arun(names, on_done=lambda name, output: done.setdefault(name, output)))
+    elapsed = time.monotonic() - start
+
+    assert counts == {'finished': 20, 'written': 0, 'empty': 1, 'failed': 1}
+    assert sorted(log) == sorted(name.upper() for name in names[:20])
+    assert done['empty'] is None and done['bad'] == FAILED and done['3.html'] == ['3.HTML']
+    # in sequence the 21 articles reaching the llm stage would take 21 * 0.07 s
+    assert elapsed < 0.5
+
+
+def test_pipelined_runner_records_articles(tmp_path, monkeypatch):
+    monkeypatch.setattr(chain_elements, 'RECORD_LOCATION', str(tmp_path))
+    names = ['a.html', 'bad', 'empty']
+    counts = asyncio.run(run_chains_pipelined(make_chain([]), None, 'pipe', concurrency=(1, 2, 1), file_names=names))
+    assert counts['finished'] == 1
+    manager = ExtractManager('pipe', db_url=f'sqlite:///{tmp_path / chain_elements.RECORD_NAME}')
+    assert manager.exists(names) == [True, False, True]
+    with pytest.raises(ValueError):
+        asyncio.run(run_chains_pipelined(make_chain([]), None, 'pipe', concurrency=(1, 1, 1), file_names=['a.html', 'empty']))
+
+
+class RecordingDB:
+    def __init__(self):
+        self.batches = []
+
+    def save_many(self, items, conn=None):
+        time.sleep(0.02) # one commit
+        self.batches.append(items)
+
+
+def test_writer_stage_saves_queued_articles_together():
+    db = RecordingDB()
+
+    async def extract(name):
+        if name == 'empty':
+            return []
+        paragraph = Paragraph(Document(page_content=name, metadata={'source': name}))
+        paragraph.data = [name.upper()]
+        return [paragraph]
+
+    names = [f'{i}.html' for i in range(40)]
+    pipeline = Chain(ChainElementLambda(extract), Writer(db)).pipeline(concurrency=(8, 1), write_batch_size=16)
+    counts = asyncio.run(pipeline.arun(names + ['empty']))
+    assert counts == {'finished': 0, 'written': 40, 'empty': 1, 'failed': 0}
+    assert sorted(item[0] for batch in db.batches for item in batch) == sorted(names)
+    assert max(len(batch) for batch in db.batches) <= 16
+    assert len(db.batches) < len(names) # articles queued during a commit share the next one
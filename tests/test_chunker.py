@@ -0,0 +1,44 @@
+import re
+
+from sisyphus.index.chunker import TokenChunker
+
+
+def split_sents(text):
+    return re.split(r'(?<=\.) ', text)
+
+
+def test_sentence_chunks_bounds():
+    chunker = TokenChunker(sent_tokenize=split_sents)
+    assert chunker.sentence_chunks('Short paragraph.') == ['Short paragraph.']
+
+    sentences = [f'Sentence {i} reports a band gap of {i}.5 eV for the annealed sample' + ' word' * (i % 7) + '.' for i in range(120)]
+    text = ' '.join(sentences)
+    chunks = chunker.sentence_chunks(text, max_tokens=100, min_tokens=50)
+    assert ' '.join(chunks) == text
+    counts = [chunker.count_tokens(chunk) for chunk in chunks]
+    assert all(count <= 100 + 20 for count in counts[:-1]) # a chunk ends with the sentence crossing the limit
+    assert counts[-1] >= 50
+
+    long_first = 'x' * 300 + '. ' + text # one sentence over the limit never leaves an empty chunk
+    assert all(chunker.sentence_chunks(long_first, max_tokens=100, min_tokens=50))
+
+
+def test_line_chunks_partition_text():
+    chunker = TokenChunker()
+    text = '\n'.join(f'line {i} ' + 'μ-phase ' * (i % 13) for i in range(400)) + 'no break ' * 300
+    chunks = list(chunker.line_chunks(text, 200))
+    assert ''.join(chunks) == text
+    assert all(chunker.count_tokens(chunk) <= 200 for chunk in chunks)
+    # cut before a line break, or at the limit where the window has none
+    assert all(chunk.startswith('\n') or '\n' not in chunk for chunk in chunks[1:])
+    assert sum('\n' not in chunk for chunk in chunks) > 1
+
+
+def test_line_chunks_tail_of_max_tokens():
+    chunker = TokenChunker()
+    candidates = ('no break ' * 150 + tail for tail in ('', 'x', 'no', 'no break'))
+    text = next(text for text in candidates if chunker.count_tokens(text) % 2 == 0)
+    max_tokens = chunker.count_tokens(text) // 2 # the second window holds exactly max_tokens, without line break
+    chunks = list(chunker.line_chunks(text, max_tokens))
+    assert ''.join(chunks) == text
+    assert all(chunk and chunker.count_tokens(chunk) <= max_tokens for chunk in chunks)
@@ -0,0 +1,99 @@
+import asyncio
+import json
+import sqlite3
+
+from pydantic import BaseModel
+from sqlmodel import create_engine
+
+from sisyphus.chain.database import BatchWriter, DocDB, ExtractManager, ResultDB
+
+
+class Answer(BaseModel):
+    answer: str
+
+
+def test_old_db_migrated_and_indexed(tmp_path):
+    path = tmp_path / 'old.db'
+    conn = sqlite3.connect(path) # documents table without the indexed columns
+    conn.execute('CREATE TABLE documents (id INTEGER PRIMARY KEY, page_content VARCHAR NOT NULL, meta JSON)')
+    for i in range(3):
+        for sub_titles in ('Abstract', 'Introduction'):
+            meta = {'source': f'a{i}.html', 'sub_titles': sub_titles, 'doi': f'10.1/{i}'}
+            conn.execute('INSERT INTO documents (page_content, meta) VALUES (?, ?)', (f'{i} {sub_titles}', json.dumps(meta)))
+    conn.commit()
+
+    db = DocDB(create_engine(f'sqlite:///{path}'))
+    docs = db.get('a1.html', with_abstract=True)
+    assert [doc.page_content for doc in docs] == ['1 Abstract', '1 Introduction']
+    assert docs[1].metadata['abstract'] == '1 Abstract'
+    plan = conn.execute("EXPLAIN QUERY PLAN SELECT * FROM documents WHERE source = 'a1.html'").fetchall()
+    assert 'ix_documents_source' in plan[0][-1]
+
+    db.save_texts(['new'], [{'source': "it's.html", 'sub_titles': 'Abstract'}]) # quotes are bound, not formatted
+    assert db.get("it's.html")[0].page_content == 'new'
+    assert db.get('missing.html') is None
+
+    many = db.get_many(['a2.html', 'missing.html', 'a0.html'])
+    assert list(many) == ['a2.html', 'a0.html']
+    assert [doc.metadata['doi'] for doc in many['a0.html']] == ['10.1/0', '10.1/0']
+
+
+def test_batch_writer_group_commit(tmp_path):
+    result_db = ResultDB(create_engine(f'sqlite:///{tmp_path / "result.db"}'))
+    result_db.create_db()
+    writer = BatchWriter(result_db, batch_size=50)
+
+    async def chain(i):
+        items = [(f'text {i}-{j}', {'source': f'a{i}.html'}, [Answer(answer=f'{i}-{j}'), {'raw': j}]) for j in range(3)]
+        await writer.awrite(items) # returns once committed
+        assert len(result_db.get(f'a{i}.html')) == 3
+
+    async def main():
+        await asyncio.gather(*[chain(i) for i in range(40)])
+        await writer.aclose()
+
+    asyncio.run(main())
+    results = result_db.load_as_json('Answer', '', '', with_doi=False)[1:]
+    assert len(results) == 240
+    assert sum('Answer' in r for r in results) == 120
+    with sqlite3.connect(tmp_path / 'result.db') as conn:
+        assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        # every result points to the document of its own paragraph
+        rows = conn.execute(
+            "SELECT d.page_content, json_extract(r.result, '$.Answer.answer') FROM result r JOIN documents d ON r.document_id = d.id "
+            "WHERE json_extract(r.result, '$.Answer.answer') IS NOT NULL"
+        ).fetchall()
+    assert all(text == f'text {answer}' for text, answer in rows)
+
+
+def test_extract_manager_scales(tmp_path):
+    db_url = f'sqlite:///{tmp_path / "record.db"}'
+    conn = sqlite3.connect(tmp_path / 'record.db') # older record db with duplicated rows
+    conn.execute('CREATE TABLE extract_record (id INTEGER PRIMARY KEY, key VARCHAR NOT NULL, namespace VARCHAR NOT NULL)')
+    conn.executemany('INSERT INTO extract_record (key, namespace) VALUES (?, ?)', [('old', 'ns'), ('old', 'ns'), ('old', 'other')])
+    conn.commit()
+
+    manager = ExtractManager('ns', db_url, flush_size=1000, use_bloom=True)
+    manager.create_schema()
+    keys = [f'{i}.html' for i in range(5000)] # more than SQLite variables allowed in one statement
+    for key in keys[:2500]:
+        manager.add(key)
+    manager.add('0.html') # duplicate is ignored
+    manager.flush()
+    assert manager.exists(['old'] + keys) == [True] + [True] * 2500 + [False] * 2500
+    assert conn.execute("SELECT COUNT(*) FROM extract_record WHERE namespace = 'ns'").fetchone()[0] == 2501
+
+    manager.delete_namespace()
+    assert not any(manager.exists(keys[:10]))
+    assert conn.execute('SELECT namespace FROM extract_record').fetchall() == [('other',)]
+
+
+def test_extract_manager_dedupe_runs_once(tmp_path):
+    from sqlalchemy import event
+
+    manager = ExtractManager('ns', f'sqlite:///{tmp_path / "record.db"}')
+    manager.create_schema()
+    statements = []
+    event.listen(manager.engine, 'before_cursor_execute', lambda conn, cursor, statement, *args: statements.append(statement))
+    manager.create_schema() # unique index exists, no full table scan on startup
+    assert not any(statement.lstrip().upper().startswith('DELETE') for statement in statements)
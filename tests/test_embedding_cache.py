@@ -0,0 +1,71 @@
+import multiprocessing
+
+import numpy as np
+
+from sisyphus.patch.embedding_cache import EmbeddingCache, get_embedding_cache, text_key
+
+MODEL = 'text-embedding-3-large'
+
+
+def vector(text, dim=8):
+    return np.random.default_rng(int.from_bytes(text_key(text)[:4], 'little')).random(dim, dtype=np.float32)
+
+
+def embed(cache, texts):
+    """what `OpenAIEmbeddingThrottle` does, return vectors and the texts sent to the api"""
+    vectors, missed = cache.split(MODEL, texts)
+    missed_texts = [texts[i] for i in missed]
+    missed_vectors = [vector(text) for text in missed_texts]
+    if missed_texts:
+        cache.add(MODEL, missed_texts, missed_vectors)
+    if vectors is None:
+        return np.asarray(missed_vectors), missed_texts
+    if missed:
+        vectors[missed] = missed_vectors
+    return vectors, missed_texts
+
+
+def test_persist_reload_partial_hits_and_duplicates(tmp_path):
+    cache = EmbeddingCache(str(tmp_path))
+    texts = [f'text {i}' for i in range(1500)] # over the initial capacity
+    vectors, sent = embed(cache, texts + ['text 0'])
+    assert sent == texts + ['text 0'] # both copies missed, stored once
+    assert cache.stats()['hits'] == 0
+
+    reloaded = EmbeddingCache(str(tmp_path))
+    vectors, sent = embed(reloaded, ['new', 'text 7', 'new', 'text 1499'])
+    assert sent == ['new', 'new']
+    assert np.array_equal(vectors, np.stack([vector(t) for t in ['new', 'text 7', 'new', 'text 1499']]))
+    assert reloaded.stats() == {'hits': 2, 'misses': 2, 'hit_rate': 0.5}
+    assert reloaded._store(MODEL).n_rows == 1501
+    assert get_embedding_cache(str(tmp_path)) is get_embedding_cache(str(tmp_path / '.'))
+
+
+def test_two_writers_keep_rows_aligned(tmp_path):
+    first, second = EmbeddingCache(str(tmp_path)), EmbeddingCache(str(tmp_path))
+    embed(first, ['a', 'b'])
+    embed(second, ['c', 'a']) # second has never seen the rows of first
+    embed(first, ['d'])
+    embed(second, ['e', 'f'])
+    for cache in (first, second, EmbeddingCache(str(tmp_path))):
+        vectors, sent = embed(cache, list('abcdef'))
+        assert sent == []
+        assert np.array_equal(vectors, np.stack([vector(t) for t in 'abcdef']))
+
+
+def write_texts(args):
+    directory, worker = args
+    cache = EmbeddingCache(directory)
+    for i in range(20):
+        embed(cache, [f'{worker}-{i}', f'shared-{i}'])
+
+
+def test_writer_processes(tmp_path):
+    with multiprocessing.get_context('spawn').Pool(3) as pool:
+        pool.map(write_texts, [(str(tmp_path), worker) for worker in range(3)])
+    texts = [f'{worker}-{i}' for worker in range(3) for i in range(20)] + [f'shared-{i}' for i in range(20)]
+    cache = EmbeddingCache(str(tmp_path))
+    vectors, sent = embed(cache, texts)
+    assert sent == []
+    assert np.array_equal(vectors, np.stack([vector(t) for t in texts]))
+    assert cache._store(MODEL).n_rows == len(texts)
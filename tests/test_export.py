@@ -0,0 +1,62 @@
+from typing import Literal, Optional
+
+import pandas as pd
+import pytest
+from pydantic import BaseModel
+from sqlmodel import create_engine
+
+from sisyphus.chain.database import ResultDB
+from sisyphus.chain.export import export_parquet
+
+
+pa = pytest.importorskip('pyarrow')
+pq = pytest.importorskip('pyarrow.parquet')
+
+
+class Condition(BaseModel):
+    temperature: Optional[float] = None
+    atmosphere: Literal['air', 'argon'] = 'air'
+
+
+class Strength(BaseModel):
+    composition: str
+    value: float
+    phases: list[str]
+    condition: Condition
+    extra: dict
+
+
+class Other(BaseModel):
+    x: int
+
+
+def test_export_typed_columns_in_parts(tmp_path):
+    result_db = ResultDB(create_engine(f'sqlite:///{tmp_path / "result.db"}'))
+    result_db.create_db()
+    items = []
+    for i in range(25):
+        results = [Strength(composition=f'Al{i}', value=i / 2, phases=['FCC'] * (i % 3), condition=Condition(temperature=i or None), extra={'i': i})]
+        if i % 5 == 0:
+            results.append(Other(x=i)) # other models are not exported
+        items.append((f'text {i}', {'source': f'{i}.html', 'doi': f'10.1/{i}'}, results))
+    result_db.save_many(items)
+
+    paths = export_parquet(result_db, Strength, str(tmp_path / 'out'), row_group_size=4, rows_per_file=8)
+    assert len(paths) == 4 # 8 + 8 + 8 + 1
+    assert pq.ParquetFile(paths[0]).metadata.num_row_groups == 2
+    schema = pq.read_schema(paths[0])
+    assert schema.field('value').type == pa.float64()
+    assert schema.field('phases').type == pa.list_(pa.string())
+    assert schema.field('condition.temperature').type == pa.float64()
+    assert 'page_content' not in schema.names
+
+    df = pd.concat([pd.read_parquet(p) for p in paths], ignore_index=True)
+    assert len(df) == 25
+    row = df[df.source == '4.html'].iloc[0]
+    assert (row.composition, row.value, list(row.phases), row.doi) == ('Al4', 2.0, ['FCC'], '10.1/4')
+    assert row['condition.atmosphere'] == 'air' and row.extra == '{"i": 4}'
+    assert df[df.source == '0.html']['condition.temperature'].isna().all()
+
+    paths = export_parquet(result_db, Other, str(tmp_path / 'other'), with_text=True)
+    other = pd.read_parquet(paths[0])
+    assert list(other.x) == [0, 5, 10, 15, 20] and other.page_content[1] == 'text 5'
@@ -0,0 +1,212 @@
+import functools
+import hashlib
+import json
+from types import SimpleNamespace
+
+import dspy
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+from sisyphus.chain.paragraph import Paragraph
+from sisyphus.heas import embeddings, label, properties, synthesis
+from sisyphus.heas.embeddings import QUERY_PHASE, QUERY_STRENGTH, QUERY_SYN, ArticleIndex, QueryVectors
+
+
+DIM = 64
+
+
+def embed_text(text):
+    """bag of hashed words, unit norm like the OpenAI embeddings"""
+    vector = np.zeros(DIM)
+    for word in text.lower().split():
+        digest = hashlib.blake2b(word.encode('utf-8'), digest_size=8).digest()
+        vector[digest[0] % DIM] += 1 + digest[1] / 255
+    return (vector / (np.linalg.norm(vector) or 1)).tolist()
+
+
+class FakeEmbedding:
+    def __init__(self, model='text-embedding-3-large'):
+        self.model = model
+        self.queries = []
+        self.documents = []
+
+    def embed_query(self, text):
+        self.queries.append(text)
+        return embed_text(text)
+
+    def embed_documents(self, texts):
+        self.documents.append(list(texts))
+        return [embed_text(text) for text in texts]
+
+
+def test_query_vectors_persisted_and_reloaded(tmp_path):
+    path = str(tmp_path / 'db' / 'query_vectors.json')
+    embedding = FakeEmbedding()
+    vectors = QueryVectors(embedding, path)
+    vectors.register('phase', 'phases of the alloy')
+    vectors.register('strength', 'yield strength of the alloy')
+    assert vectors['phase'] == embed_text('phases of the alloy')
+    assert vectors['phase'] == embed_text('phases of the alloy')
+    assert embedding.queries == ['phases of the alloy'] # embedded once
+
+    with open(path, encoding='utf-8') as f:
+        stored = json.load(f)
+    assert list(stored) == ['phase'] and stored['phase']['vector'] == embed_text('phases of the alloy')
+
+    embedding = FakeEmbedding()
+    reloaded = QueryVectors(embedding, path)
+    reloaded.register('phase', 'phases of the alloy')
+    assert reloaded['phase'] == embed_text('phases of the alloy')
+    assert embedding.queries == [] # read from the file of the previous run
+
+
+def test_query_vectors_invalidated_by_model_or_text(tmp_path):
+    path = str(tmp_path / 'query_vectors.json')
+    vectors = QueryVectors(FakeEmbedding(), path)
+    vectors.register('phase', 'phases of the alloy')
+    vectors['phase']
+
+    embedding = FakeEmbedding(model='text-embedding-3-small')
+    other_model = QueryVectors(embedding, path)
+    other_model.register('phase', 'phases of the alloy')
+    other_model['phase']
+    assert embedding.queries == ['phases of the alloy']
+
+    embedding = FakeEmbedding(model='text-embedding-3-small')
+    edited = QueryVectors(embedding, path)
+    edited.register('phase', 'grain size and phases of the alloy')
+    assert edited['phase'] == embed_text('grain size and phases of the alloy')
+    assert embedding.queries == ['grain size and phases of the alloy']
+
+    embedding = FakeEmbedding(model='text-embedding-3-small')
+    unchanged = QueryVectors(embedding, path)
+    unchanged.register('phase', 'grain size and phases of the alloy')
+    unchanged['phase']
+    assert embedding.queries == [] # the re-embedded vector replaced the stale one on disk
+
+
+def test_query_vectors_interrupted_dump_keeps_file(tmp_path, monkeypatch):
+    path = tmp_path / 'query_vectors.json'
+    vectors = QueryVectors(FakeEmbedding(), str(path))
+    vectors.register('phase', 'phases of the alloy')
+    vectors.register('strength', 'yield strength of the alloy')
+    vectors['phase']
+    before = path.read_text(encoding='utf-8')
+
+    def interrupted_dump(obj, f):
+        f.write('{"phase": {"fingerprint"')
+        raise KeyboardInterrupt
+    monkeypatch.setattr(embeddings.json, 'dump', interrupted_dump)
+    with pytest.raises(KeyboardInterrupt):
+        vectors['strength']
+    monkeypatch.undo()
+
+    assert path.read_text(encoding='utf-8') == before
+    assert [p.name for p in tmp_path.iterdir()] == ['query_vectors.json'] # no temporary file left
+    embedding = FakeEmbedding()
+    reloaded = QueryVectors(embedding, str(path))
+    reloaded.register('phase', 'phases of the alloy')
+    assert reloaded['phase'] == embed_text('phases of the alloy') and embedding.queries == []
+
+
+def make_article(source):
+    sections = [
+        ('Abstract', 'A CoCrFeMnNi high entropy alloy with FCC structure shows yield strength of 500 MPa.'),
+        ('Introduction', 'High entropy alloys attract attention for strength and ductility.'),
+        ('Experimental procedure', 'The alloy was arc melted under argon, cast and cold rolled to 70% reduction.'),
+        ('Experimental procedure', 'Samples were annealed at 900 °C for 1 h then water quenched.'),
+        ('Experimental procedure', 'Tensile tests were carried out at a strain rate of 1e-3 s-1.'),
+        ('Results and discussion', 'XRD shows a single FCC phase, TEM reveals L12 precipitates at grain boundaries.'),
+        ('Results and discussion', 'The stress-strain curve gives yield strength of 620 MPa, tensile strength of 1100 MPa and elongation of 35%.'),
+        ('Results and discussion', 'The grain size decreases to 5 μm after annealing.'),
+        ('Results and discussion', 'Fracture surfaces show dimples typical of ductile failure.'),
+        ('Conclusions', 'Annealing improves strength while keeping the FCC phase.'),
+    ]
+    return [
+        Document(page_content=f'{text} ({source} {i})', metadata={'source': source, 'sub_titles': sub_titles})
+        for i, (sub_titles, text) in enumerate(sections)
+    ]
+
+
+def chroma_reference(collection, query_vector, source, sub_titles, k):
+    """what `retrieve` of the shared Chroma collection returned: l2 over unit vectors, filtered by source and sub_titles"""
+    candidates = [
+        doc for doc in collection
+        if doc.metadata['source'] == source and (not sub_titles or doc.metadata['sub_titles'] in sub_titles)
+    ]
+    query = np.asarray(query_vector)
+    distances = [np.sum((np.asarray(embed_text(doc.page_content)) - query) ** 2) for doc in candidates]
+    return [candidates[i] for i in np.argsort(distances, kind='stable')[:k]]
+
+
+@pytest.mark.parametrize('query', [QUERY_SYN, QUERY_STRENGTH, QUERY_PHASE])
+def test_article_index_matches_chroma_top_k(query):
+    articles = [make_article('a.html'), make_article('b.html')]
+    collection = [doc for docs in articles for doc in docs] # chroma held every article in one collection
+    query_vector = embed_text(query)
+    for docs in articles:
+        index = ArticleIndex(docs, embedding=FakeEmbedding())
+        for pattern in ('experiment', 'result', 'no such section'):
+            sub_titles = sorted({doc.metadata['sub_titles'] for doc in docs if pattern in doc.metadata['sub_titles'].lower()})
+            for k in (1, 3, 5, 20):
+                expected = chroma_reference(collection, query_vector, docs[0].metadata['source'], sub_titles, k)
+                assert index.similarity_search_by_vector(query_vector, k=k, sub_titles=sub_titles) == expected
+    assert ArticleIndex([], embedding=FakeEmbedding()).similarity_search_by_vector(query_vector) == []
+
+
+def test_article_index_matches_chroma_store():
+    langchain_chroma = pytest.importorskip('langchain_chroma')
+    articles = [make_article('a.html'), make_article('b.html')]
+    store = langchain_chroma.Chroma(collection_name='article_index_test', embedding_function=FakeEmbedding())
+    store.add_documents([doc for docs in articles for doc in docs])
+    try:
+        for docs in articles:
+            source = docs[0].metadata['source']
+            index = ArticleIndex(docs, embedding=FakeEmbedding())
+            sub_titles = ['Results and discussion']
+            for query in (QUERY_SYN, QUERY_STRENGTH, QUERY_PHASE):
+                expected = store.similarity_search(query, k=5, filter={'$and': [{'sub_titles': {'$in': sub_titles}}, {'source': source}]})
+                found = index.similarity_search_by_vector(embed_text(query), k=5, sub_titles=sub_titles)
+                assert [doc.page_content for doc in found] == [doc.page_content for doc in expected]
+    finally:
+        store.delete_collection()
+
+
+@pytest.fixture
+def fake_labelers(tmp_path, monkeypatch):
+    """offline embeddings and lm, returns the embedding whose `documents` records the articles embedded"""
+    embedding = FakeEmbedding()
+    vectors = QueryVectors(FakeEmbedding(), str(tmp_path / 'query_vectors.json'))
+    for name, query in (('synthesis', QUERY_SYN), ('strength', QUERY_STRENGTH), ('phase', QUERY_PHASE)):
+        vectors.register(name, query)
+    monkeypatch.setattr(embeddings, 'query_vectors', vectors)
+    index_class = functools.partial(ArticleIndex, embedding=embedding)
+    for module in (label, properties, synthesis):
+        monkeypatch.setattr(module, 'ArticleIndex', index_class)
+
+    def chain_of_thought(signature):
+        def predict(paragraph):
+            if signature is synthesis.ClassifySyn:
+                return SimpleNamespace(topic='synthesis' if 'melted' in paragraph or 'annealed' in paragraph else 'others')
+            return SimpleNamespace(relevant=True)
+        return predict
+    monkeypatch.setattr(dspy, 'ChainOfThought', chain_of_thought)
+    return embedding
+
+
+def test_one_index_shared_by_labelers(fake_labelers):
+    docs = make_article('a.html')
+    paras = label.label_paras(docs)
+    assert fake_labelers.documents == [[doc.page_content for doc in docs]] # embedded once per article
+
+    separate = [Paragraph(doc, id_) for id_, doc in enumerate(docs)]
+    synthesis.label_syn_paras(docs, separate) # each labeler builds its own index
+    properties.label_phase(docs, separate)
+    properties.label_strength(docs, separate)
+    assert len(fake_labelers.documents) == 4
+    assert [para.is_synthesis for para in paras] == [para.is_synthesis for para in separate]
+    for para, other in zip(paras, separate):
+        assert set(other.property_types) <= set(para.property_types)
+    assert any(para.is_synthesis for para in paras)
+    assert any('phase' in para.property_types for para in paras) and any('strength' in para.property_types for para in paras)
@@ -0,0 +1,36 @@
+import random
+
+import pytest
+
+from sisyphus.manipulator.jsonl_constructor import create_chunks, detect_sci_dot, tokenizer
+
+
+def reference_chunks(text, n):
+    """create_chunks before the single pass rewrite"""
+    tokens = tokenizer.encode(text)
+    i = 0
+    while i < len(tokens):
+        j = min(i + int(1.5 * n), len(tokens))
+        while j > i + int(0.5 * n):
+            chunk = tokenizer.decode(tokens[i:j])
+            dot_of_science = False if j == len(tokens) else detect_sci_dot(tokenizer.decode(tokens[j:j+1]), tokenizer.decode(tokens[j-4: j]))
+            if chunk.endswith('.') and not dot_of_science:
+                break
+            j -= 1
+        if j == i + int(0.5 * n):
+            j = min(i + n, len(tokens))
+        yield tokens[i:j]
+        i = j
+
+
+PIECES = ['Ca.', 'calc.', 'CAL.', 'No.', 'e.g.', 'i.e.g.', 'ı.e.', 'İ.E.', '2.5', 'Å.', 'μm.', 'end.', 'x', '\n', '. ', 'see Fig.', '.']
+
+
+@pytest.mark.parametrize('seed', range(6))
+@pytest.mark.parametrize('n', [3, 10, 40])
+def test_same_chunks_as_before(seed, n):
+    rng = random.Random(seed)
+    pieces = PIECES if seed % 2 else [p for p in PIECES if p not in ('ı.e.', 'İ.E.')]
+    text = ' '.join(rng.choice(pieces) for _ in range(300))
+    assert list(create_chunks(text, n)) == list(reference_chunks(text, n))
+    assert list(create_chunks('A.', n)) == list(reference_chunks('A.', n))
@@ -0,0 +1,54 @@
+from sisyphus.index.loader import ArticleLoader, ArticleMetaData, FullTextLoader, MetadataFactory
+
+
+def test_metadata_factory_matches_model():
+    make_metadata = MetadataFactory(ArticleMetaData, source='a.html', doi='10.1/a', title='A')
+    first = make_metadata(sub_titles='Abstract')
+    second = make_metadata(sub_titles=''.join(['Results/', 'Gaps']))
+    assert first == dict(ArticleMetaData(source='a.html', doi='10.1/a', sub_titles='Abstract', title='A'))
+    assert list(second) == ['source', 'doi', 'sub_titles', 'title']
+    assert second['sub_titles'] is make_metadata(sub_titles=''.join(['Results/', 'Gaps']))['sub_titles'] # interned
+    second['labels'] = {} # updated in place downstream
+    assert 'labels' not in make_metadata(sub_titles='x') and 'labels' not in first
+
+
+def test_loaders_build_metadata(tmp_path):
+    path = tmp_path / 'a.html'
+    path.write_text(
+        '<html><head><title>A</title><p><a>10.1/a</a></p></head><body><div id="abstract"><p>Abs.</p></div>'
+        '<div id="sections"><h2>Results</h2><h3>Gaps</h3><p>One.</p><h2>Methods</h2><p>Two.</p></div></body></html>',
+        encoding='utf-8',
+    )
+    docs = list(ArticleLoader(str(path)).lazy_load())
+    assert [doc.metadata['sub_titles'] for doc in docs] == ['Abstract', 'Results/Gaps', 'Methods']
+    assert all(doc.metadata['source'] == 'a.html' and doc.metadata['doi'] == '10.1/a' for doc in docs)
+    docs = list(FullTextLoader(str(path)).lazy_load())
+    assert [doc.metadata for doc in docs] == [{'source': 'a.html', 'doi': '10.1/a', 'title': 'A', 'type_': 'text'}]
+
+
+def test_parse_cache_shared_by_loaders(tmp_path, monkeypatch):
+    from sisyphus.index import loader
+    from sisyphus.index.parse_cache import ParseCache
+
+    path = tmp_path / 'a.html'
+    path.write_text(
+        '<html><head><title>A</title><p><a>10.1/a</a></p></head><body><div id="abstract"><p>Abs.</p></div>'
+        '<div id="sections"><h2>Results</h2><p>One.</p><table><tr><td>x</td></tr></table></div></body></html>',
+        encoding='utf-8',
+    )
+    cache = ParseCache(str(tmp_path / 'cache'))
+    article_docs = list(ArticleLoader(str(path), cache).lazy_load())
+    full_text_docs = list(FullTextLoader(str(path)).lazy_load())
+
+    def no_parse(*args, **kwargs):
+        raise AssertionError('parsed again')
+
+    with monkeypatch.context() as m:
+        m.setattr(loader, 'bs', no_parse)
+        assert list(ArticleLoader(str(path), cache).lazy_load()) == article_docs
+        assert list(FullTextLoader(str(path), cache).lazy_load()) == full_text_docs
+    assert [doc.metadata['sub_titles'] for doc in article_docs] == ['Abstract', 'Results', 'table']
+    assert (cache.hits, cache.misses) == (2, 1)
+
+    path.write_text(path.read_text(encoding='utf-8').replace('One.', 'Two, longer.'), encoding='utf-8')
+    assert list(ArticleLoader(str(path), cache).lazy_load())[1].page_content == 'Two, longer.'
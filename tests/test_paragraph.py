@@ -0,0 +1,43 @@
+import pickle
+
+import pytest
+
+from chempp.paragraph import DEFAULT_ANNO_SOURCE, Paragraph, Sentence
+
+
+def split_sents(text):
+    return [sent.strip() + '.' for sent in text.split('.') if sent.strip()]
+
+
+def test_tokens_and_sentence_lookup_are_lazy():
+    para = Paragraph('First one. Second sentence here. Third.', sent_tokenizer=split_sents)
+    assert [sent._tokens for sent in para.sentences] == [None, None, None]
+    assert not hasattr(para, '__dict__')
+
+    starts = [sent.start_idx for sent in para.sentences]
+    for char_idx, char in enumerate(para.text):
+        if char == ' ' and char_idx + 1 in starts:
+            with pytest.raises(KeyError): # between sentences
+                para.get_sentence_by_char_idx(char_idx)
+        else:
+            sent = para.get_sentence_by_char_idx(char_idx)
+            assert sent.start_idx <= char_idx < sent.end_idx
+
+    para.sentences[1]._word_tokenizer = str.split
+    assert para.sentences[1].tokens == ['Second', 'sentence', 'here.']
+
+
+def test_annotations_and_pickles():
+    anno = {(11, 17): 'ORD', (33, 38): 'ORD'}
+    para = Paragraph('First one. Second sentence here. Third.', anno=anno, sent_tokenizer=split_sents)
+    assert para[1].anno[DEFAULT_ANNO_SOURCE] == {(0, 6): 'ORD'}
+    assert para[2].anno[DEFAULT_ANNO_SOURCE] == {(0, 5): 'ORD'}
+
+    loaded = pickle.loads(pickle.dumps(para))
+    assert loaded.text == para.text and loaded.get_sentence_by_char_idx(12).text == 'Second sentence here.'
+
+    # state of a sentence pickled before __slots__
+    old = Sentence.__new__(Sentence)
+    old.__setstate__({'_text': 'Old one.', '_tokens': ['Old', 'one', '.'], '_anno': {DEFAULT_ANNO_SOURCE: {}},
+                      'start_idx': 0, 'end_idx': 8, 'grouped_anno': [], '_word_tokenizer': None})
+    assert old.tokens == ['Old', 'one', '.']
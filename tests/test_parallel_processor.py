@@ -0,0 +1,95 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+import pytest
+from openai import AsyncOpenAI
+
+from sisyphus.processor.parallel_processor import Bucket, CompletionRequest, ResultWriter
+from sisyphus.patch.throttle import RateScheduler
+from tests.test_rate_scheduler import LIMITS, StubHandler
+
+
+class CountingHandler(StubHandler):
+    calls = 0
+
+    def do_POST(self):
+        CountingHandler.calls += 1
+        super().do_POST()
+
+
+@pytest.fixture
+def stub_url():
+    CountingHandler.calls = 0
+    server = ThreadingHTTPServer(('127.0.0.1', 0), CountingHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_port}/v1'
+    server.shutdown()
+
+
+def requests(n):
+    return (
+        {'model': 'gpt-4.1', 'messages': [{'role': 'user', 'content': f'q{i}'}], 'metadata': {'i': i}}
+        for i in range(n)
+    )
+
+
+def run(url, save_filepath, n):
+    async def main():
+        async with AsyncOpenAI(api_key='sk-stub', base_url=url, max_retries=0) as client:
+            messenger = CompletionRequest(client=client, max_requests_per_minute=6000, max_tokens_per_minute=1e6, max_attempts=1, logging_level=40)
+            await messenger.completion_helper_with_no_probe(requests(n), str(save_filepath))
+    asyncio.run(main())
+
+
+def test_restart_skips_completed_requests(stub_url, tmp_path):
+    save_filepath = tmp_path / 'results.jsonl'
+    run(stub_url, save_filepath, 5)
+    assert CountingHandler.calls == 5
+    assert ResultWriter(str(save_filepath)).load_index() == set(range(5))
+
+    run(stub_url, save_filepath, 8) # restarted with the full job
+    assert CountingHandler.calls == 8
+    lines = [json.loads(line) for line in save_filepath.read_text().splitlines()]
+    assert sorted(line[2]['i'] for line in lines) == list(range(8))
+
+
+def test_torn_index_and_missing_results(tmp_path):
+    save_filepath = tmp_path / 'results.jsonl'
+    save_filepath.write_text('')
+    (tmp_path / 'results.jsonl.done').write_bytes(b'\x01\x00\x00\x00\x02\x00') # second id half written
+    assert ResultWriter(str(save_filepath)).completed == {1}
+    save_filepath.unlink()
+    assert ResultWriter(str(save_filepath)).completed == set()
+
+
+def test_probe_ids_kept_without_resume(stub_url, tmp_path):
+    save_filepath = tmp_path / 'results.jsonl'
+
+    async def main():
+        async with AsyncOpenAI(api_key='sk-stub', base_url=stub_url, max_retries=0) as client:
+            messenger = CompletionRequest(
+                client=client, max_requests_per_minute=6000, max_tokens_per_minute=1e6, max_attempts=1, logging_level=40, resume=False
+            )
+            await messenger.completion_helper(requests(5), str(save_filepath), probe_size=2)
+    asyncio.run(main())
+    assert CountingHandler.calls == 5
+    assert ResultWriter(str(save_filepath)).load_index() == set(range(5)) # rest phase did not truncate the probe ids
+
+
+def test_scheduler_leaves_local_bucket(stub_url, tmp_path):
+    scheduler = RateScheduler(LIMITS)
+    bucket = Bucket(last_update_time=time.time(), max_capacity_requests=60, max_capacity_tokens=1e6)
+
+    async def main():
+        async with AsyncOpenAI(api_key='sk-stub', base_url=stub_url, max_retries=0) as client:
+            messenger = CompletionRequest(
+                client=client, max_requests_per_minute=60, max_tokens_per_minute=1e6, max_attempts=1, logging_level=40, scheduler=scheduler
+            )
+            await messenger._process_request(requests(5), str(tmp_path / 'results.jsonl'), mode='completions', bucket=bucket)
+    asyncio.run(main())
+    assert CountingHandler.calls == 5
+    assert scheduler.get('gpt-4.1').left_requests < 97 # capacity was taken from the scheduler only
+    assert bucket.get_capacities() == (60, 1e6)
@@ -0,0 +1,79 @@
+import os
+import sqlite3
+
+from sqlmodel import create_engine
+
+from sisyphus.chain.database import DocDB
+from sisyphus.index.parse_cache import ParseCache
+from sisyphus.index.plaindb import index_files
+
+
+def write_article(path, doi, paragraphs):
+    body = ''.join(f'<p>{p}</p>' for p in paragraphs)
+    path.write_text(
+        f'<html><head><title>{doi}</title><p><a>{doi}</a></p></head><body>'
+        f'<div id="abstract"><p>Abstract of {doi}.</p></div><div id="sections"><h2>Results</h2>{body}</div></body></html>',
+        encoding='utf-8',
+    )
+
+
+def sources(db_path):
+    with sqlite3.connect(db_path) as conn:
+        return sorted(conn.execute('SELECT source, page_content FROM documents'))
+
+
+def test_rerun_only_indexes_changed_files(tmp_path):
+    folder = tmp_path / 'articles'
+    folder.mkdir()
+    for i in range(6):
+        write_article(folder / f'a{i}.html', f'10.1/{i}', [f'Paragraph {i}.'])
+    db_path = tmp_path / 'plain.db'
+    db = DocDB(create_engine(f'sqlite:///{db_path}'))
+    paths = lambda: sorted(str(p) for p in folder.iterdir())
+    cache = ParseCache(str(tmp_path / 'cache'))
+
+    counts = index_files(paths(), db, num_workers=2, batch_size=3, cache=cache, folder=str(folder))
+    assert counts['indexed'] == 6
+    first = sources(db_path)
+    assert len(first) == 12
+
+    counts = index_files(paths(), db, num_workers=2, cache=cache, folder=str(folder))
+    assert (counts['indexed'], counts['skipped']) == (0, 6)
+    assert sources(db_path) == first # no duplicates
+
+    write_article(folder / 'a1.html', '10.1/1', ['Changed.', 'Added.'])
+    os.utime(folder / 'a2.html', ns=(1, 1)) # touched, same content
+    (folder / 'a3.html').unlink()
+    counts = index_files(paths(), db, cache=cache, folder=str(folder))
+    assert (counts['indexed'], counts['unchanged'], counts['skipped'], counts['removed']) == (1, 1, 3, 1)
+    rows = sources(db_path)
+    assert ('a1.html', 'Added.') in rows and ('a1.html', 'Paragraph 1.') not in rows
+    assert not [row for row in rows if row[0] == 'a3.html']
+    assert len(rows) == 11
+
+    counts = index_files(paths(), db, incremental=False, cache=cache, folder=str(folder))
+    assert counts['indexed'] == 5
+    assert sources(db_path) == rows
+
+
+def test_other_folder_kept(tmp_path):
+    first, second = tmp_path / 'first', tmp_path / 'second'
+    for folder, names in ((first, 'ab'), (second, 'cd')):
+        folder.mkdir()
+        for name in names:
+            write_article(folder / f'{name}.html', f'10.1/{name}', [f'Paragraph {name}.'])
+    db_path = tmp_path / 'plain.db'
+    db = DocDB(create_engine(f'sqlite:///{db_path}'))
+    cache = ParseCache(str(tmp_path / 'cache'))
+    index = lambda folder, **kwargs: index_files(
+        sorted(str(p) for p in folder.iterdir()), db, cache=cache, folder=str(folder), **kwargs
+    )
+
+    index(first)
+    index(second)
+    index(second, incremental=False)
+    assert {source for source, _ in sources(db_path)} == {'a.html', 'b.html', 'c.html', 'd.html'}
+    (second / 'd.html').unlink()
+    assert index(second)['removed'] == 1
+    assert {source for source, _ in sources(db_path)} == {'a.html', 'b.html', 'c.html'}
+    assert index_files([], db, cache=cache)['removed'] == 0 # no folder, nothing deleted
@@ -0,0 +1,66 @@
+import json
+import os
+
+import pytest
+
+from script import process_articles as pa
+
+
+class FakeArticle:
+    doi = '10.1039/C9TA01234A'
+    publisher = 'RSC'
+
+    def save_html(self, save_path):
+        with open(save_path, 'w', encoding='utf-8') as f:
+            f.write('<html></html>')
+
+
+@pytest.fixture
+def fake_parse(monkeypatch):
+    def parse_html(file_path):
+        if 'broken' in file_path:
+            raise ValueError('no doi found')
+        return FakeArticle(), None
+    monkeypatch.setattr(pa, 'parse_html', parse_html)
+    pa._init_worker(set())
+
+
+def test_worker_records_outcome(tmp_path, fake_parse):
+    record = pa.process_article('a.html', str(tmp_path), 'html', resume=True)
+    assert record['status'] == 'saved' and record['publisher'] == 'RSC'
+    assert os.path.exists(record['save_path'])
+    assert pa.process_article('a.html', str(tmp_path), 'html', resume=True)['status'] == 'exists'
+    assert pa.process_article('a.html', str(tmp_path), 'html', resume=False)['status'] == 'saved'
+
+    pa._init_worker({FakeArticle.doi.lower()})
+    assert pa.process_article('a.html', str(tmp_path), 'html', resume=True)['status'] == 'skipped'
+
+    assert pa.process_article('a.pdf', str(tmp_path), 'html', resume=True)['error'] == 'Unsupported file type!'
+
+
+def test_worker_failure_carries_traceback(tmp_path, fake_parse):
+    record = pa.process_article('broken.html', str(tmp_path), 'html', resume=True)
+    assert record['status'] == 'failed'
+    assert record['error'] == 'ValueError: no doi found'
+    assert record['traceback'].startswith('Traceback') and 'in parse_html' in record['traceback']
+    json.dumps(record) # goes to the manifest
+
+
+def test_load_manifest_resume(tmp_path):
+    saved = tmp_path / 'saved.html'
+    saved.write_text('')
+    records = [
+        {'file_path': 'a.html', 'status': 'saved', 'doi': '10.1/A', 'save_path': str(saved)},
+        {'file_path': 'b.html', 'status': 'saved', 'doi': '10.1/B', 'save_path': str(tmp_path / 'deleted.html')},
+        {'file_path': 'c.html', 'status': 'skipped', 'doi': '10.1/C', 'save_path': None},
+        {'file_path': 'd.html', 'status': 'failed', 'doi': None, 'save_path': None},
+    ]
+    manifest_path = tmp_path / pa.MANIFEST_NAME
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record) + '\n')
+        f.write('{"file_path": "e.html", "stat') # torn last line of an interrupted run
+    done, dois = pa.load_manifest(str(manifest_path))
+    assert done == {'a.html', 'c.html'} # b is re-run since its output is gone, d failed
+    assert dois == {'10.1/a'}
+    assert pa.load_manifest(str(tmp_path / 'missing.jsonl')) == (set(), set())
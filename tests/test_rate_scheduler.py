@@ -0,0 +1,227 @@
+import asyncio
+import functools
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+from openai import AsyncOpenAI
+
+from sisyphus.patch.throttle import ChatThrottler, RateScheduler
+from sisyphus.patch.httpx_hooker import httpx_response_hooker
+from sisyphus.processor.parallel_processor import APIRequest, StatusTracker
+
+
+LIMITS = {
+    'default': {'max_requests': 100, 'max_tokens': 10000, 'time_frame': 'm'},
+    'gpt-4.1': {'max_requests': 100, 'max_tokens': 20000, 'time_frame': 'm'},
+    'gpt-4.1-mini': {'max_requests': 2, 'max_tokens': 40000, 'time_frame': 'm'},
+}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """answers chat completions with fixed usage and rate limit headers"""
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        body = json.dumps({
+            'id': 'chatcmpl-stub',
+            'object': 'chat.completion',
+            'created': 0,
+            'model': request['model'],
+            'choices': [{'index': 0, 'finish_reason': 'stop', 'message': {'role': 'assistant', 'content': '{"answer": 1}'}}],
+            'usage': {'prompt_tokens': 30, 'completion_tokens': 20, 'total_tokens': 50},
+        }).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('x-ratelimit-limit-tokens', '15000')
+        self.send_header('x-ratelimit-remaining-tokens', '12000')
+        self.send_header('x-ratelimit-remaining-requests', '99')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_url():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_port}/v1'
+    server.shutdown()
+
+
+def test_resolve_model_by_longest_prefix():
+    scheduler = RateScheduler(LIMITS)
+    assert scheduler.resolve('gpt-4.1') == 'gpt-4.1'
+    assert scheduler.resolve('openai/gpt-4.1-mini-2025-04-14') == 'gpt-4.1-mini'
+    assert scheduler.resolve('gpt-3.5-turbo') == 'default'
+    assert scheduler.get('openai/gpt-4.1') is scheduler.get('gpt-4.1-2025-04-14')
+
+
+def test_request_bucket_limits_admission():
+    scheduler = RateScheduler(LIMITS)
+    assert scheduler.try_acquire('gpt-4.1-mini', 10) is not None
+    assert scheduler.try_acquire('gpt-4.1-mini', 10) is not None
+    assert scheduler.try_acquire('gpt-4.1-mini', 10) is None # out of requests, tokens are plenty
+    assert scheduler.try_acquire('gpt-4.1', 10) is not None # other models are not affected
+
+
+def test_reservation_reconciled_with_usage():
+    scheduler = RateScheduler(LIMITS)
+    throttler = scheduler.get('gpt-4.1')
+    reservation = scheduler.try_acquire('gpt-4.1', 1000)
+    assert reservation.tokens == 1000 + 100 # prompt plus the default completion estimate
+    reservation.settle(usage={'prompt_tokens': 900, 'completion_tokens': 300, 'total_tokens': 1200})
+    assert throttler.left_tokens == pytest.approx(20000 - 1200, abs=5)
+    assert throttler.completion_tokens == pytest.approx(100 + 0.2 * (300 - 100))
+
+
+def test_stub_server_headers_and_usage(stub_url):
+    scheduler = RateScheduler(LIMITS)
+    throttler = scheduler.get('gpt-4.1')
+
+    async def main():
+        http_client = httpx.AsyncClient(event_hooks={'response': [functools.partial(httpx_response_hooker, scheduler)]})
+        client = AsyncOpenAI(api_key='sk-stub', base_url=stub_url, http_client=http_client)
+        request = APIRequest(
+            task_id=0,
+            request_json={'model': 'gpt-4.1', 'messages': [{'role': 'user', 'content': 'hi'}]},
+            token_consumption=1000,
+            attempts_left=1,
+            metadata=None,
+            logger=logging.getLogger(__name__),
+            pydantic_model=None,
+        )
+        status_tracker = StatusTracker(num_tasks_in_progress=1)
+        reservation = scheduler.try_acquire('gpt-4.1', request.token_consumption, completion_tokens=0)
+        await request.call_api(client, 'completions', asyncio.Queue(), '/dev/null', status_tracker, reservation=reservation)
+        await http_client.aclose()
+        return status_tracker
+
+    status_tracker = asyncio.run(main())
+    assert status_tracker.num_tasks_succeeded == 1
+    # headers cap the bucket: limit 15000 < configured 20000, remaining 12000 < 20000 - 1000
+    assert throttler.max_tokens == 15000
+    assert throttler.left_requests <= 99
+    # server remaining already counts the real usage, it wins over the local bucket given back 1000 - 50 tokens
+    assert throttler.left_tokens == pytest.approx(12000, abs=5)
+    assert throttler.completion_tokens == pytest.approx(100 + 0.2 * (20 - 100))
+
+
+def test_embedding_throttler_reserves_no_completion():
+    from sisyphus.patch.throttle import embed_throttler, rate_scheduler
+
+    assert rate_scheduler.get('text-embedding-3-large') is embed_throttler
+    assert embed_throttler.try_consume(1000) == 1000
+
+
+def test_failed_request_gives_back_reservation(monkeypatch):
+    from langchain_core.messages import HumanMessage
+    from sisyphus.patch import chat_patch, throttle
+    from sisyphus.patch.chat_patch import ChatOpenAIThrottle
+
+    scheduler = RateScheduler(LIMITS)
+    monkeypatch.setattr(throttle, 'rate_scheduler', scheduler)
+    monkeypatch.setattr(chat_patch, 'rate_scheduler', scheduler)
+    throttler = scheduler.get('gpt-4.1')
+    model = ChatOpenAIThrottle(api_key='sk-stub', model='gpt-4.1', base_url='http://127.0.0.1:9/v1', timeout=2) # nothing listens
+    messages = [HumanMessage('alloy ' * 8000)] # reserves about half of the bucket
+
+    with pytest.raises(Exception):
+        asyncio.run(model.ainvoke(messages))
+    assert throttler.left_tokens > 19000
+    with pytest.raises(Exception):
+        model.invoke(messages)
+    assert throttler.left_tokens > 19000
+
+
+def test_lm_cache_hit_gives_back_reservation(monkeypatch):
+    from types import SimpleNamespace
+    import dspy
+    from sisyphus.patch import lm_patch
+
+    scheduler = RateScheduler(LIMITS)
+    monkeypatch.setattr(lm_patch, 'rate_scheduler', scheduler)
+    throttler = scheduler.get('gpt-4.1')
+    entries = iter([
+        {'usage': {}, 'response': SimpleNamespace(cache_hit=True)},
+        {'usage': {'prompt_tokens': 8000, 'completion_tokens': 100, 'total_tokens': 8100}, 'response': SimpleNamespace()},
+    ])
+
+    def call(self, prompt=None, messages=None, **kwargs):
+        self.history.append(next(entries))
+        return ['{"answer": 1}']
+
+    monkeypatch.setattr(dspy.LM, '__call__', call)
+    lm = lm_patch.LMThrottle('openai/gpt-4.1')
+    lm.history = []
+    lm(messages=[{'role': 'user', 'content': 'alloy ' * 8000}])
+    assert throttler.left_tokens > 19000 # cached answer, the estimate is given back
+    lm(messages=[{'role': 'user', 'content': 'alloy ' * 8000}])
+    assert throttler.left_tokens == pytest.approx(20000 - 8100, abs=200)
+
+
+def test_rate_limit_cools_down_its_model_only():
+    from types import SimpleNamespace
+    from openai import RateLimitError
+
+    scheduler = RateScheduler(LIMITS)
+    request = httpx.Request('POST', 'https://api.openai.com/v1/chat/completions', json={'model': 'gpt-4.1-mini-2025-04-14', 'messages': []})
+    error = RateLimitError('rate limited', response=httpx.Response(429, request=request), body=None)
+    retry_state = SimpleNamespace(outcome=SimpleNamespace(exception=lambda: error))
+    for model in ('gpt-4.1', 'gpt-4.1-mini', 'text-embedding'):
+        scheduler.get(model)
+
+    scheduler.retry_callback(retry_state)
+    assert scheduler.get('gpt-4.1-mini').cool_down_sentinel
+    assert not scheduler.get('gpt-4.1').cool_down_sentinel and not scheduler.get('text-embedding').cool_down_sentinel
+
+
+def test_waiters_admitted_in_fifo_order():
+    throttler = ChatThrottler(max_tokens=1000, time_frame='s', completion_tokens=0)
+
+    async def main():
+        throttler.left_tokens = 0
+        order = []
+
+        async def waiter(i, tokens):
+            await throttler.wait_capacity(tokens)
+            order.append(i)
+
+        tasks = [asyncio.create_task(waiter(i, tokens)) for i, tokens in enumerate([50, 10, 50, 10])]
+        await asyncio.sleep(0)
+        tasks[2].cancel() # cancelled waiter does not block the queue
+        start = time.time()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        return order, time.time() - start
+
+    order, elapsed = asyncio.run(main())
+    assert order == [0, 1, 3] # small requests do not jump ahead of the large head
+    assert elapsed == pytest.approx(0.07, abs=0.03)
+
+
+def test_waiters_of_two_loops_admitted():
+    throttler = ChatThrottler(max_tokens=1000, time_frame='s', completion_tokens=0)
+    throttler.left_tokens = 0
+    admitted = []
+
+    def run_loop(name):
+        async def main():
+            await asyncio.wait_for(throttler.wait_capacity(100), timeout=2)
+            admitted.append(name)
+        asyncio.run(main())
+
+    threads = [threading.Thread(target=run_loop, args=(name,)) for name in ('a', 'b')]
+    threads[0].start()
+    time.sleep(0.02) # a is queued before b starts its loop
+    threads[1].start()
+    for thread in threads:
+        thread.join()
+    assert sorted(admitted) == ['a', 'b']
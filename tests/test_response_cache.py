@@ -0,0 +1,147 @@
+import asyncio
+import itertools
+import json
+import threading
+from contextlib import asynccontextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from langchain_core.messages import HumanMessage
+from pydantic import BaseModel
+
+from sisyphus.patch import chat_patch, response_cache
+from sisyphus.patch.chat_patch import ChatOpenAIThrottle
+from sisyphus.patch.response_cache import ResponseCache, make_cache_key
+
+
+class BandGap(BaseModel):
+    material: str
+    value: float
+
+
+class Uptake(BaseModel):
+    material: str
+    uptake: str
+
+
+MESSAGES = [HumanMessage('the band gap of MgSiAs2 is 1.5 eV')]
+
+
+class CountingHandler(BaseHTTPRequestHandler):
+    """answers chat completions with a fixed message and counts the requests"""
+    calls = 0
+
+    def do_POST(self):
+        CountingHandler.calls += 1
+        request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        body = json.dumps({
+            'id': 'chatcmpl-stub',
+            'object': 'chat.completion',
+            'created': 0,
+            'model': request['model'],
+            'choices': [{'index': 0, 'finish_reason': 'stop', 'message': {'role': 'assistant', 'content': '{"answer": 1}'}}],
+            'usage': {'prompt_tokens': 30, 'completion_tokens': 20, 'total_tokens': 50},
+        }).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_url():
+    CountingHandler.calls = 0
+    server = ThreadingHTTPServer(('127.0.0.1', 0), CountingHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_port}/v1'
+    server.shutdown()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    ticks = itertools.count(1)
+    monkeypatch.setattr(response_cache.time, 'time', lambda: float(next(ticks)))
+
+
+def make_model(**kwargs):
+    return ChatOpenAIThrottle(api_key='sk-stub', model='gpt-4.1', temperature=0, **kwargs)
+
+
+def test_key_stable_and_distinct():
+    payload = {'model': 'gpt-4.1', 'temperature': 0, 'messages': [{'role': 'user', 'content': 'hi'}], 'response_format': BandGap}
+    reordered = dict(reversed(list(payload.items())))
+    assert make_cache_key(payload) == make_cache_key(reordered) == make_cache_key({**payload, 'stream': False})
+    assert make_cache_key(payload) != make_cache_key({**payload, 'response_format': Uptake})
+    assert make_cache_key(payload) != make_cache_key({**payload, 'temperature': 0.7})
+    assert make_cache_key(payload) != make_cache_key({**payload, 'model': 'gpt-4.1-mini'})
+
+    # through the rendered request of the chat model
+    key = make_model().get_cache_key(MESSAGES, response_format=BandGap)
+    assert key == make_model().get_cache_key(MESSAGES, response_format=BandGap)
+    assert key != make_model().get_cache_key(MESSAGES, response_format=Uptake)
+    assert key != make_model().get_cache_key(MESSAGES)
+    assert make_model().get_cache_key(MESSAGES) != ChatOpenAIThrottle(api_key='sk-stub', model='gpt-4.1', temperature=0.7).get_cache_key(MESSAGES)
+
+
+def test_hit_skips_throttler_and_http(stub_url, tmp_path, monkeypatch):
+    waits = []
+    waiter = chat_patch.model_waiter
+
+    @asynccontextmanager
+    async def counting_waiter(model, consumed_tokens):
+        waits.append(model)
+        async with waiter(model, consumed_tokens) as reservation:
+            yield reservation
+
+    monkeypatch.setattr(chat_patch, 'model_waiter', counting_waiter)
+    cache = ResponseCache(str(tmp_path / 'cache.sqlite'))
+    model = make_model(base_url=stub_url, response_cache=cache)
+
+    first = asyncio.run(model.ainvoke(MESSAGES))
+    assert (CountingHandler.calls, len(waits)) == (1, 1)
+    second = asyncio.run(model.ainvoke(MESSAGES))
+    assert (CountingHandler.calls, len(waits)) == (1, 1)
+    assert second.content == first.content == '{"answer": 1}'
+    assert model.invoke(MESSAGES).content == first.content # sync path reads the same entry
+    assert CountingHandler.calls == 1
+
+    cache.close() # persisted for the next run
+    reopened = make_model(base_url=stub_url, response_cache=ResponseCache(str(tmp_path / 'cache.sqlite')))
+    assert asyncio.run(reopened.ainvoke(MESSAGES)).content == first.content
+    assert CountingHandler.calls == 1
+
+
+def test_lru_eviction_by_max_bytes(tmp_path, clock):
+    path = str(tmp_path / 'cache.sqlite')
+    value = 'x' * 1000
+    cache = ResponseCache(path, max_bytes=3500)
+    for key in 'abc':
+        cache.update(key, value)
+    assert cache.lookup('a') == value # a is now more recent than b
+    cache.update('d', value)
+    assert cache.lookup('b') is None
+    assert all(cache.lookup(key) == value for key in 'acd')
+    size = cache.stats()['size_bytes']
+    assert size <= 3500
+    cache.close()
+    assert ResponseCache(path, max_bytes=3500).stats()['size_bytes'] == size
+
+
+def test_stats_and_unreadable_entry(tmp_path):
+    cache = ResponseCache(str(tmp_path / 'cache.sqlite'))
+    assert cache.stats() == {'hits': 0, 'misses': 0, 'hit_rate': 0.0, 'size_bytes': 0}
+    cache.update('a', {'answer': 1})
+    cache.lookup('a')
+    cache.lookup('a')
+    cache.lookup('b')
+    cache._conn.execute("UPDATE responses SET value = X'00' WHERE key = 'a'") # torn or from an incompatible version
+    assert cache.lookup('a') is None
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['hit_rate']) == (2, 2, 0.5)
+    assert stats['size_bytes'] == 0 # the unreadable entry was dropped
+    cache.clear()
+    assert cache.lookup('a') is None
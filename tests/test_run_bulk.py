@@ -0,0 +1,72 @@
+import asyncio
+import time
+
+import pytest
+
+from sisyphus.utils.run_bulk import sliding_window
+
+
+def test_window_refills_without_waiting_for_stragglers():
+    in_flight = peak = 0
+
+    async def work(i):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        try:
+            await asyncio.sleep(0.3 if i == 0 else 0.01) # one slow article
+            if i == 5:
+                raise ValueError('bad article')
+        finally:
+            in_flight -= 1
+
+    start = time.monotonic()
+    stats = asyncio.run(sliding_window(range(40), work, concurrency=4, ignore_errors=True))
+    elapsed = time.monotonic() - start
+    assert peak == 4
+    assert (stats.succeeded, stats.failed, stats.in_flight, stats.queue_depth) == (39, 1, 0, 0)
+    # 39 fast tasks flow through 3 workers while the slow one runs, batches of 4 would take 10 * 0.01 + 0.3
+    assert elapsed == pytest.approx(0.3, abs=0.08)
+
+
+def test_error_propagates_and_cancels_in_flight():
+    cancelled = []
+
+    async def work(i):
+        try:
+            await asyncio.sleep(0.01 if i == 1 else 10)
+        except asyncio.CancelledError:
+            cancelled.append(i)
+            raise
+        raise ValueError('bad article')
+
+    with pytest.raises(ValueError, match='bad article'):
+        asyncio.run(sliding_window(range(10), work, concurrency=3))
+    assert sorted(cancelled) == [0, 2]
+
+
+def test_timeout_and_cancel():
+    async def work(i):
+        await asyncio.sleep(10 if i % 2 else 0)
+
+    stats = asyncio.run(sliding_window(iter(range(6)), work, concurrency=6, timeout=0.05))
+    assert (stats.succeeded, stats.timed_out, stats.total) == (3, 3, None)
+
+    cancelled = []
+
+    async def slow(i):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(i)
+            raise
+
+    async def main():
+        runner = asyncio.create_task(sliding_window(range(10), slow, concurrency=3))
+        await asyncio.sleep(0.05)
+        runner.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await runner
+
+    asyncio.run(main())
+    assert sorted(cancelled) == [0, 1, 2]
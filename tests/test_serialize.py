@@ -0,0 +1,75 @@
+import pickle
+
+from chempp.article import Article, ArticleElement, ArticleElementType
+from chempp.paragraph import Paragraph
+from chempp.serialize import ArticleReader
+from chempp.table import Table, TableCell, TableRow
+
+
+def split_sents(text):
+    return [sent.strip() + '.' for sent in text.split('.') if sent.strip()]
+
+
+def make_article():
+    abstract = Paragraph('MgSiAs2 is found. It has a band gap of 1.5 eV.', anno={(0, 7): 'MAT', (28, 36): 'PROP'}, sent_tokenizer=split_sents)
+    table = Table(label='Table 1', idx='tbl1', caption='Gaps – μ', footnotes=['a fit'],
+                  rows=[TableRow([TableCell('x', width=2)]), TableRow([TableCell('MgSiAs2'), TableCell('1.5')])])
+    sections = [
+        ArticleElement(ArticleElementType.SECTION_TITLE, 'Results'),
+        ArticleElement(ArticleElementType.PARAGRAPH, Paragraph('Crystals grow at 900 °C. They are red.', sent_tokenizer=split_sents)),
+        ArticleElement(ArticleElementType.TABLE, table),
+    ]
+    return Article(doi='10.1002/adfm.201801589', publisher='wiley', title='MgSiAs', abstract=abstract, sections=sections)
+
+
+def test_round_trip_and_lazy_sections(tmp_path):
+    article = make_article()
+    article.save_pt(tmp_path / 'a.pt')
+    loaded = Article().load_pt(tmp_path / 'a.pt')
+
+    assert (loaded.doi, loaded.publisher, loaded.title.text) == (article.doi, article.publisher, 'MgSiAs')
+    assert loaded.abstract.text == article.abstract.text
+    assert [(s.start_idx, s.end_idx) for s in loaded.abstract.sentences] == [(s.start_idx, s.end_idx) for s in article.abstract.sentences]
+    assert loaded.abstract.get_anno_by_value('PROP') == {(28, 36): 'PROP'}
+    assert loaded.abstract[1].anno == article.abstract[1].anno
+    assert [s.type for s in loaded.sections] == [s.type for s in article.sections]
+    assert loaded.sections[1].content.sentences[0].text == 'Crystals grow at 900 °C.'
+    assert loaded.sections[2].content.body_to_lists() == article.sections[2].content.body_to_lists()
+
+    with ArticleReader(tmp_path / 'a.pt') as reader:
+        assert len(reader) == 3
+        (table,) = reader.tables()
+        assert (table.label, table.caption, table.footnotes) == ('Table 1', 'Gaps – μ', ['a fit'])
+        assert reader.abstract.text == article.abstract.text
+
+
+def test_older_pickled_articles_still_load(tmp_path):
+    article = make_article()
+    with open(tmp_path / 'old.pt', 'wb') as handle:
+        pickle.dump(article, handle)
+    assert Article().load_pt(tmp_path / 'old.pt').abstract.text == article.abstract.text
+
+
+def test_sentence_anno_of_every_source_kept(tmp_path):
+    article = make_article()
+    article.abstract[0].anno = {'x': {(0, 3): 'Y'}}
+    article.abstract.anno['empty'] = {}
+    article.title.anno = {'src': {(0, 2): 'MAT'}}
+    article.save_pt(tmp_path / 'a.pt')
+    loaded = Article().load_pt(tmp_path / 'a.pt')
+
+    assert loaded.abstract[0].anno == {'x': {(0, 3): 'Y'}}
+    assert [s.anno for s in loaded.abstract.sentences] == [s.anno for s in article.abstract.sentences]
+    assert loaded.abstract.anno == article.abstract.anno
+    assert loaded.title.anno == {'src': {(0, 2): 'MAT'}}
+    assert [s.anno for s in loaded.sections[1].content.sentences] == [s.anno for s in article.sections[1].content.sentences]
+
+
+def test_grouped_anno_falls_back_to_pickle(tmp_path):
+    article = make_article()
+    article.sections[1].content[1].grouped_anno = [{'material': 'MgSiAs2', 'gap': '1.5 eV'}]
+    article.save_pt(tmp_path / 'a.pt')
+    with open(tmp_path / 'a.pt', 'rb') as handle:
+        assert isinstance(pickle.load(handle), Article)
+    loaded = Article().load_pt(tmp_path / 'a.pt')
+    assert loaded.sections[1].content[1].grouped_anno == [{'material': 'MgSiAs2', 'gap': '1.5 eV'}]
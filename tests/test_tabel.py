@@ -0,0 +1,54 @@
+from types import SimpleNamespace
+
+from langchain_core.documents import Document
+
+from sisyphus.chain.paragraph import Paragraph
+from sisyphus.heas import tabel
+from sisyphus.heas.tabel import TableLabels, label_pack, label_table, pack_tables
+
+
+def make_table(text):
+    return Paragraph(Document(page_content=text, metadata={'sub_titles': 'table', 'source': 'a.html'}))
+
+
+def test_guidelines_in_signature_docstrings():
+    for signature in (tabel.LabelTable, tabel.LabelTables):
+        assert 'Fracture strength' in signature.__doc__ and 'Shear strength' in signature.__doc__
+        assert 'only fabrication method is not sufficient' in signature.__doc__
+    single, packed = (signature.__doc__.split('\n', 1) for signature in (tabel.LabelTable, tabel.LabelTables))
+    assert single[1] == packed[1] and single[0] != packed[0] # same guidelines, own task line
+
+
+def test_pack_tables_groups_small_tables():
+    small = [make_table(f'alloy,YS\nA{i},500') for i in range(5)]
+    large = make_table('x' * tabel.SMALL_TABLE_CHARS)
+    assert pack_tables(small + [large], 1) == [[table] for table in small + [large]]
+    packs = pack_tables([small[0], large, *small[1:]], 2)
+    assert packs == [[large], [small[0], small[1]], [small[2], small[3]], [small[4]]]
+
+
+def test_label_pack_falls_back_per_table(monkeypatch):
+    pack = [make_table('alloy,YS\nA,500'), make_table('alloy,Al,Co\nA,10,20')]
+    calls = []
+
+    def tables_labeler(tables):
+        calls.append('pack')
+        return SimpleNamespace(labels=[TableLabels(composition=False, strength=True, processing_parameters=False)]) # one missing
+
+    def table_labeler(table):
+        calls.append('table')
+        return SimpleNamespace(composition='Al' in table, strength='YS' in table and 'Al' not in table, processing_parameters=False)
+
+    monkeypatch.setattr(tabel, 'tables_labeler', tables_labeler)
+    monkeypatch.setattr(tabel, 'table_labeler', table_labeler)
+    labels = label_pack(pack)
+    assert calls == ['pack', 'table', 'table']
+    assert [(label.composition, label.strength) for label in labels] == [(False, True), (True, False)]
+
+
+def test_phase_labeled_by_regex_only(monkeypatch):
+    tables = [make_table('alloy,structure\nA,FCC'), make_table('alloy,YS\nA,500')]
+    monkeypatch.setattr(tabel, 'table_labeler', lambda table: SimpleNamespace(composition=False, strength='YS' in table, processing_parameters=False))
+    label_table(tables)
+    assert tables[0].property_types == ['phase']
+    assert tables[1].property_types == ['strength']